@@ -1,8 +1,8 @@
 import json
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+
+# smtplib and email.mime are imported where a message is actually sent:
+# invalid requests and cold starts then skip loading them.
 
 # --- TEMPLATE DISPATCHER ---
 # This separates the 'Data' from the 'Logic'
@@ -56,12 +56,62 @@ TEMPLATES = {
             f"Time: {d.get('time')}\n\n"
             f"The slot is now Open for other Patients."
         )
+    },
+    "WAITLIST_BOOKED": {
+        "subject": "Appointment Booked from Waitlist",
+        "body": lambda d: (
+            f"Hello {d.get('patient_name')},\n\n"
+            f"A slot with Dr. {d.get('doctor_name')} opened up and has been Booked for you.\n\n"
+            f"Date: {d.get('date')}\n"
+            f"Time: {d.get('time')}\n\n"
+            f"If you can no longer attend, Please cancel it from your Dashboard.\n"
+            f"Mini HMS Team"
+        )
+    },
+    "WAITLIST_OFFER": {
+        "subject": "A Slot Opened Up",
+        "body": lambda d: (
+            f"Hello {d.get('patient_name')},\n\n"
+            f"A slot with Dr. {d.get('doctor_name')} is now Available.\n\n"
+            f"Date: {d.get('date')}\n"
+            f"Time: {d.get('time')}\n\n"
+            f"Book it from your Dashboard before someone else does.\n"
+            f"Mini HMS Team"
+        )
+    },
+    "BULK_CANCELLATION": {
+        "subject": "Appointments Cancelled",
+        "body": lambda d: (
+            f"Hello {d.get('name')},\n\n"
+            f"Dr. {d.get('doctor_name')} is unavailable, so the following Appointment(s) have been Cancelled:\n\n"
+            + "".join(f"Date: {a.get('date')}  Time: {a.get('time')}\n" for a in d.get('appointments', []))
+            + f"\nPlease book a New slot.\n"
+            f"Mini HMS Team"
+        )
+    },
+    "DOCTOR_BULK_CANCELLATION": {
+        "subject": "Schedule Cleared",
+        "body": lambda d: (
+            f"Hello Dr. {d.get('doctor_name')},\n\n"
+            f"Your schedule from {d.get('start')} to {d.get('end')} has been cleared "
+            f"({d.get('slots_removed')} slot(s) removed).\n\n"
+            f"Cancelled Appointments:\n"
+            + ("".join(
+                f"{a.get('date')} {a.get('time')} - {a.get('patient_name')}\n" for a in d.get('appointments', [])
+            ) or "None\n")
+            + f"\nEvery Patient has been notified."
+        )
     }
 }
 
 def send_email(event, context):
     try:
         body = json.loads(event.get('body', '{}'))
+
+        # --- BATCH MODE: {"messages": [{action, recipient_email, data}, ...]} ---
+        if 'messages' in body:
+            return _send_batch(body['messages'])
+
         action = body.get('action')
         recipient_email = body.get('recipient_email')
         data = body.get('data', {})
@@ -86,6 +136,95 @@ def send_email(event, context):
         print(f"Error sending email: {e}")
         return response(500, str(e))
 
+def _render(message):
+    """Returns (recipient, subject, body) or raises ValueError."""
+    action = message.get('action')
+    recipient_email = message.get('recipient_email')
+    template = TEMPLATES.get(action)
+    if not recipient_email or not template:
+        raise ValueError(f"Invalid message: {action} -> {recipient_email}")
+    return recipient_email, template["subject"], template["body"](message.get('data', {}))
+
+def _send_batch(messages):
+    rendered, failed = [], 0
+    for message in messages:
+        try:
+            rendered.append(_render(message))
+        except ValueError as e:
+            print(e)
+            failed += 1
+
+    refused = _send_many_via_smtp(rendered)
+    return response(
+        200,
+        f"Batch processed: {len(rendered) - len(refused)} sent, {failed} invalid, {len(refused)} refused",
+        failed=refused,
+    )
+
+def _smtp_config():
+    return (
+        os.environ.get('SMTP_SERVER'),
+        int(os.environ.get('SMTP_PORT', 587)),
+        os.environ.get('SENDER_EMAIL'),
+        os.environ.get('SENDER_PASSWORD'),
+    )
+
+def _build_message(sender_email, to_email, subject, body_text):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body_text, 'plain'))
+    return msg
+
+def _smtp_login(smtp_server, smtp_port, sender_email, sender_password):
+    import smtplib
+    server = smtplib.SMTP(smtp_server, smtp_port)
+    server.starttls()
+    server.login(sender_email, sender_password)
+    return server
+
+def _send_many_via_smtp(rendered):
+    """
+    One login for the whole batch instead of one connection per email.
+    A message the server refuses is skipped, not the rest of the batch;
+    returns the recipients that failed.
+    """
+    smtp_server, smtp_port, sender_email, sender_password = _smtp_config()
+
+    if not sender_email or "your-email" in sender_email:
+        for to_email, subject, _ in rendered:
+            print(f"[MOCK EMAIL] To: {to_email} | Subject: {subject}")
+        return []
+
+    import smtplib
+    failed = []
+    # A failed login fails the whole request: nothing could be sent
+    server = _smtp_login(smtp_server, smtp_port, sender_email, sender_password)
+    try:
+        for to_email, subject, body_text in rendered:
+            try:
+                if server is None:
+                    server = _smtp_login(smtp_server, smtp_port, sender_email, sender_password)
+                server.send_message(_build_message(sender_email, to_email, subject, body_text))
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"SMTP Error for {to_email}: {e}")
+                failed.append(to_email)
+                if isinstance(e, (smtplib.SMTPServerDisconnected, OSError)):
+                    # Reconnect for the next message
+                    server = None
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+    print(f"Batch of {len(rendered) - len(failed)} email(s) sent, {len(failed)} failed")
+    return failed
+
 def _send_via_smtp(to_email, subject, body_text):
     smtp_server = os.environ.get('SMTP_SERVER')
     smtp_port = int(os.environ.get('SMTP_PORT', 587))
@@ -97,12 +236,9 @@ def _send_via_smtp(to_email, subject, body_text):
         print(f"[MOCK BODY] {body_text}")
         return
 
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body_text, 'plain'))
+    msg = _build_message(sender_email, to_email, subject, body_text)
 
+    import smtplib
     try:
         with smtplib.SMTP(smtp_server, smtp_port) as server:
             server.starttls()
@@ -113,8 +249,8 @@ def _send_via_smtp(to_email, subject, body_text):
         print(f"SMTP Error: {e}")
         raise e
 
-def response(status, message):
+def response(status, message, **extra):
     return {
         "statusCode": status,
-        "body": json.dumps({"message": message})
+        "body": json.dumps({"message": message, **extra})
     }
\ No newline at end of file
@@ -1,8 +1,63 @@
 from django.contrib import admin
-from .models import AppointmentSlot
+from django.contrib.auth.models import User
+from django.db.models import Q
+from mini_HMS.changelist import CalendarDatesQuerySet, EstimatedCountPaginator, prefix_filter
+from .models import AppointmentSlot, AppointmentArchive, DoctorDailyStats, WaitlistEntry
+
+# The slot table is the big one: pages join their users in the same query,
+# counts and date drill-downs avoid full scans (mini_HMS.changelist),
+# search only does indexed prefix matches, and user fields are plain id
+# inputs rather than a <select> of every account.
 
 @admin.register(AppointmentSlot)
 class AppointmentSlotAdmin(admin.ModelAdmin):
     list_display = ('doctor', 'date', 'start_time', 'end_time', 'is_booked', 'patient')
-    list_filter = ('is_booked', 'date')
-    search_fields = ('doctor__username', 'patient__username')
\ No newline at end of file
+    list_select_related = ('doctor', 'patient')
+    list_filter = ('is_booked',)
+    date_hierarchy = 'date'
+    ordering = ('-date', '-start_time')
+    raw_id_fields = ('doctor', 'patient')
+    # Declared so the search box shows; get_search_results does the matching
+    search_fields = ('doctor__username', 'patient__username')
+    search_help_text = "Start of the doctor's or patient's mobile number."
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return CalendarDatesQuerySet.wrap(super().get_queryset(request))
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        # Two index seeks (username range, then doctor_id / patient_id)
+        # instead of LIKE on both joined user rows
+        users = User.objects.filter(prefix_filter('username', term)).values('pk')
+        return queryset.filter(Q(doctor__in=users) | Q(patient__in=users)), False
+
+@admin.register(AppointmentArchive)
+class AppointmentArchiveAdmin(admin.ModelAdmin):
+    list_display = ('doctor_name', 'patient_name', 'date', 'start_time', 'end_time', 'outcome')
+    list_filter = ('outcome',)
+    search_fields = ('doctor_name', 'patient_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'earliest_date', 'latest_date', 'auto_book', 'status', 'offer_expires_at', 'created_at')
+    list_select_related = ('patient', 'doctor')
+    list_filter = ('status', 'auto_book')
+    raw_id_fields = ('patient', 'doctor', 'slot')
+
+@admin.register(DoctorDailyStats)
+class DoctorDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'date', 'slots_offered', 'slots_booked', 'cancel_requests', 'cancellations', 'slots_expired')
+    list_select_related = ('doctor',)
+    date_hierarchy = 'date'
+    raw_id_fields = ('doctor',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return CalendarDatesQuerySet.wrap(super().get_queryset(request))
@@ -0,0 +1,147 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth.decorators import login_required
+from django.db.models import Q
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET
+from .models import AppointmentSlot
+from .changes import get_stamp
+from .events import get_broker
+
+# Read-only JSON for polling clients. Rows are sent as arrays under a
+# shared "fields" header instead of one object per row.
+
+COMPACT = {'separators': (',', ':')}
+SLOT_FIELDS = ['id', 'doctor_id', 'doctor_name', 'date', 'start_time', 'end_time']
+BOOKING_FIELDS = SLOT_FIELDS + ['cancel_request_by']
+BUCKET_MINUTES = 30
+
+# --- HELPERS ---
+
+def _booking_cutoff():
+    """Slots starting before this are too soon to book (see is_slot_too_soon)."""
+    return datetime.now() + timedelta(hours=1)
+
+def _cutoff_bucket():
+    """
+    Availability also changes as time passes and slots fall inside the
+    1 hour window. Slots start on the half hour, so the cutoff is rounded
+    to that grid and folded into the validators.
+    """
+    cutoff = _booking_cutoff()
+    return cutoff.replace(minute=cutoff.minute - cutoff.minute % BUCKET_MINUTES, second=0, microsecond=0)
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+def _slots_scope(request):
+    doctor_id = request.GET.get('doctor')
+    return f"doctor:{doctor_id}" if doctor_id and doctor_id.isdigit() else 'all'
+
+def _http_time(stamp):
+    return datetime.fromtimestamp(stamp.changed, tz=timezone.utc)
+
+# --- CONDITIONAL GET VALIDATORS ---
+
+def slots_etag(request):
+    scope = _slots_scope(request)
+    raw = f"{scope}|{get_stamp(scope)!r}|{_cutoff_bucket():%Y%m%d%H%M}|{request.GET.urlencode()}"
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+def slots_last_modified(request):
+    # The bucket was entered 1 hour before the cutoff it is named after
+    bucket_entered = (_cutoff_bucket() - timedelta(hours=1)).astimezone(timezone.utc)
+    return max(_http_time(get_stamp(_slots_scope(request))), bucket_entered)
+
+def bookings_etag(request):
+    return f"patient:{request.user.id}-{get_stamp(f'patient:{request.user.id}')!r}"
+
+def bookings_last_modified(request):
+    return _http_time(get_stamp(f"patient:{request.user.id}"))
+
+# --- VIEWS ---
+
+@require_GET
+@login_required
+@condition(etag_func=slots_etag, last_modified_func=slots_last_modified)
+def available_slots(request):
+    """?doctor=<id>&start=YYYY-MM-DD&end=YYYY-MM-DD (dates default to the next 7 days)"""
+    cutoff = _booking_cutoff()
+    try:
+        start = _parse_date(request.GET.get('start'), cutoff.date())
+        end = _parse_date(request.GET.get('end'), start + timedelta(days=7))
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+
+    slots = AppointmentSlot.objects.filter(
+        Q(date__gt=cutoff.date()) | Q(date=cutoff.date(), start_time__gte=cutoff.time()),
+        is_booked=False,
+        is_blocked=False,
+        date__gte=start,
+        date__lte=end,
+    )
+    scope = _slots_scope(request)
+    if scope != 'all':
+        slots = slots.filter(doctor_id=scope.split(':')[1])
+
+    rows = slots.values_list('id', 'doctor_id', 'doctor__first_name', 'date', 'start_time', 'end_time')
+    return JsonResponse({
+        'fields': SLOT_FIELDS,
+        'slots': [
+            [pk, doctor_id, name, str(day), st.strftime('%H:%M'), et.strftime('%H:%M')]
+            for pk, doctor_id, name, day, st, et in rows
+        ],
+    }, json_dumps_params=COMPACT)
+
+
+@require_GET
+@login_required
+@condition(etag_func=bookings_etag, last_modified_func=bookings_last_modified)
+def my_bookings(request):
+    rows = AppointmentSlot.objects.filter(patient=request.user).values_list(
+        'id', 'doctor_id', 'doctor__first_name', 'date', 'start_time', 'end_time', 'cancel_request_by'
+    )
+    return JsonResponse({
+        'fields': BOOKING_FIELDS,
+        'bookings': [
+            [pk, doctor_id, name, str(day), st.strftime('%H:%M'), et.strftime('%H:%M'), cancel_by]
+            for pk, doctor_id, name, day, st, et, cancel_by in rows
+        ],
+    }, json_dumps_params=COMPACT)
+
+
+@login_required
+async def slot_events(request):
+    """
+    Server-Sent Events for ?doctors=<id>,<id>. Each open stream is an idle
+    coroutine waiting on its queue, so serve it through mini_HMS.asgi; under
+    WSGI every connected client would pin a worker thread.
+    """
+    doctor_ids = {int(i) for i in request.GET.get('doctors', '').split(',') if i.isdigit()}
+    if not doctor_ids:
+        return JsonResponse({'error': 'Pass ?doctors=<id>,<id>.'}, status=400)
+    if len(doctor_ids) > settings.SLOT_EVENT_MAX_DOCTORS:
+        return JsonResponse({'error': 'Too many doctors.'}, status=400)
+
+    async def stream():
+        subscription = get_broker().subscribe(doctor_ids)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscription.next(settings.SLOT_EVENT_HEARTBEAT)
+                if event is None:
+                    # Comment line keeps proxies from closing the idle connection
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, **COMPACT)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('slots/', api.available_slots, name='api_available_slots'),
+    path('my-bookings/', api.my_bookings, name='api_my_bookings'),
+    path('events/slots/', api.slot_events, name='api_slot_events'),
+]
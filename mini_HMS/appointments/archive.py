@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .changes import touch_many
+from .models import AppointmentSlot, AppointmentArchive
+
+# Booked slots are never deleted by cleanup_stale_slots, so without this
+# the live table keeps every appointment ever made. Rows are copied into
+# AppointmentArchive and removed from AppointmentSlot one chunk per
+# transaction; slot_id is unique, so a run interrupted between the two
+# steps can simply be repeated.
+
+
+def archivable(older_than_days):
+    cutoff = timezone.localdate() - timedelta(days=older_than_days)
+    return AppointmentSlot.objects.filter(is_booked=True, date__lt=cutoff)
+
+
+def _archive_row(slot):
+    return AppointmentArchive(
+        slot_id=slot.id,
+        doctor_id=slot.doctor_id,
+        doctor_name=slot.doctor.first_name,
+        patient_id=slot.patient_id,
+        patient_name=slot.patient.first_name if slot.patient else '',
+        date=slot.date,
+        start_time=slot.start_time,
+        end_time=slot.end_time,
+        outcome=AppointmentArchive.CANCEL_PENDING if slot.cancel_request_by else AppointmentArchive.COMPLETED,
+    )
+
+
+def archive_chunk(ids):
+    """Moves the given slots; returns how many were archived."""
+    with transaction.atomic():
+        slots = list(AppointmentSlot.objects.filter(pk__in=ids).select_related('doctor', 'patient'))
+        AppointmentArchive.objects.bulk_create([_archive_row(slot) for slot in slots], ignore_conflicts=True)
+        AppointmentSlot.objects.filter(pk__in=[slot.id for slot in slots]).delete()
+        # The bookings API lists these rows, so its ETags must change
+        touch_many({slot.doctor_id for slot in slots}, {slot.patient_id for slot in slots})
+    return len(slots)
+
+
+def archive_appointments(older_than_days, chunk_size=1000, progress=None):
+    """Archives every booked slot older than `older_than_days`; returns the count."""
+    moved = 0
+    queryset = archivable(older_than_days).order_by('pk').values_list('pk', flat=True)
+    # Each chunk is deleted once moved, so the next one is again at the front
+    while ids := list(queryset[:chunk_size]):
+        moved += archive_chunk(ids)
+        if progress:
+            progress(moved)
+    return moved
+
+
+def history_for(user, limit):
+    """Most recent archived appointments where `user` was doctor or patient."""
+    if user.profile.role == 'doctor':
+        return AppointmentArchive.objects.filter(doctor_id=user.id)[:limit]
+    return AppointmentArchive.objects.filter(patient_id=user.id)[:limit]
@@ -0,0 +1,126 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection, transaction
+from calendar_integration.utils import delete_events
+from mini_HMS.utils import trigger_bulk_email
+from . import stats
+from .changes import touch_many
+from .events import publish_slot_event, SLOT_DELETED
+from .models import AppointmentSlot
+from .waitlist import reopen_offers
+
+logger = logging.getLogger(__name__)
+
+# A doctor taking days off. Unlike cancel_appointment there is no
+# handshake: every slot in the range is removed in one transaction, then
+# calendar events are deleted in batch requests (one batch per calendar
+# owner) and each patient gets a single email listing everything they
+# lost, plus one summary for the doctor.
+
+DELETE_CHUNK_SIZE = 500
+
+
+class BulkCancelResult:
+    def __init__(self):
+        self.slots_removed = 0
+        self.appointments_cancelled = 0
+        self.patients_notified = 0
+        self.calendar_events_deleted = 0
+
+
+def _appointment(slot):
+    return {"date": str(slot.date), "time": slot.get_time_range()}
+
+
+def _delete_in_thread(user, event_ids):
+    try:
+        return delete_events(user, event_ids)
+    finally:
+        connection.close()
+
+
+def cancel_range(doctor, start, end, progress=None):
+    """
+    Removes all of `doctor`'s slots dated start..end (inclusive), booked
+    or not. `progress(stage, done, total)` is called as each stage advances.
+    """
+    result = BulkCancelResult()
+    report = progress or (lambda stage, done, total: None)
+
+    with transaction.atomic():
+        slots = list(
+            AppointmentSlot.objects.select_for_update()
+            .filter(doctor=doctor, date__range=(start, end))
+            .select_related('patient')
+            .order_by('date', 'start_time')
+        )
+        booked = [slot for slot in slots if slot.is_booked and slot.patient_id]
+        reopen_offers([slot.pk for slot in slots])
+
+        for i in range(0, len(slots), DELETE_CHUNK_SIZE):
+            chunk = slots[i:i + DELETE_CHUNK_SIZE]
+            for slot in chunk:
+                publish_slot_event(SLOT_DELETED, slot)
+            AppointmentSlot.objects.filter(pk__in=[slot.pk for slot in chunk]).delete()
+            report('slots', i + len(chunk), len(slots))
+
+        touch_many([doctor.id], {slot.patient_id for slot in booked})
+        stats.slots_removed(slots)
+
+    result.slots_removed = len(slots)
+    result.appointments_cancelled = len(booked)
+
+    # --- CALENDAR: after commit, so a rollback never loses real events ---
+    by_owner = defaultdict(list)
+    by_owner[doctor] = [slot.doctor_google_event_id for slot in booked if slot.doctor_google_event_id]
+    patients = {slot.patient_id: slot.patient for slot in booked}
+    for slot in booked:
+        if slot.patient_google_event_id:
+            by_owner[patients[slot.patient_id]].append(slot.patient_google_event_id)
+    owners = [(user, ids) for user, ids in by_owner.items() if ids]
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=settings.CALENDAR_SYNC_WORKERS) as pool:
+        for deleted in pool.map(lambda owner: _delete_in_thread(*owner), owners):
+            result.calendar_events_deleted += deleted
+            done += 1
+            report('calendar', done, len(owners))
+
+    # --- EMAIL: one per patient, one summary for the doctor ---
+    lost = defaultdict(list)
+    for slot in booked:
+        lost[slot.patient_id].append(_appointment(slot))
+
+    messages = [
+        {
+            "action": "BULK_CANCELLATION",
+            "recipient_email": patients[patient_id].email,
+            "data": {
+                "name": patients[patient_id].first_name,
+                "doctor_name": doctor.first_name,
+                "appointments": appointments,
+            },
+        }
+        for patient_id, appointments in lost.items()
+        if patients[patient_id].email
+    ]
+    messages.append({
+        "action": "DOCTOR_BULK_CANCELLATION",
+        "recipient_email": doctor.email,
+        "data": {
+            "doctor_name": doctor.first_name,
+            "start": str(start),
+            "end": str(end),
+            "slots_removed": result.slots_removed,
+            "appointments": [
+                dict(_appointment(slot), patient_name=slot.patient.first_name) for slot in booked
+            ],
+        },
+    })
+    trigger_bulk_email(messages)
+    result.patients_notified = len(messages) - 1
+    report('email', len(messages), len(messages))
+
+    return result
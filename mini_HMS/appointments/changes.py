@@ -0,0 +1,57 @@
+from collections import namedtuple
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+from .models import SlotVersion
+
+# Change stamps let polling clients skip the slot query entirely: the API
+# derives ETag/Last-Modified from these, and Django's conditional view
+# handling answers 304 before the view body runs.
+#
+# Stamps are SlotVersion rows bumped in the same transaction as the slot
+# change, so every worker sees a change exactly when its data commits. A
+# per-process cache would let a worker that missed the write keep
+# answering 304 with stale data.
+#
+# Scopes: 'doctor:<id>' and 'patient:<id>'; 'all' (any slot changed) is
+# derived from the doctor rows rather than kept as one row every writer
+# would have to lock.
+
+Stamp = namedtuple('Stamp', ['version', 'changed'])
+
+NEVER = Stamp(0, 0.0)
+
+
+def get_stamp(scope):
+    """Returns the Stamp(version, changed timestamp) of the last change in `scope`."""
+    if scope == 'all':
+        totals = SlotVersion.objects.filter(scope__startswith='doctor:').aggregate(
+            version=Sum('version'), changed=Max('changed_at')
+        )
+        if not totals['version']:
+            return NEVER
+        return Stamp(totals['version'], totals['changed'].timestamp())
+
+    row = SlotVersion.objects.filter(scope=scope).values_list('version', 'changed_at').first()
+    return Stamp(row[0], row[1].timestamp()) if row else NEVER
+
+
+def _bump(scopes):
+    scopes = sorted(scopes)
+    SlotVersion.objects.bulk_create([SlotVersion(scope=scope) for scope in scopes], ignore_conflicts=True)
+    SlotVersion.objects.filter(scope__in=scopes).update(version=F('version') + 1, changed_at=timezone.now())
+
+
+def touch_slots(doctor_id=None, patient_id=None):
+    """
+    Marks slots of a doctor and/or bookings of a patient as changed. Call
+    it inside the transaction that makes the change, so the new stamp
+    commits (or rolls back) with it.
+    """
+    touch_many([doctor_id], [patient_id])
+
+
+def touch_many(doctor_ids=(), patient_ids=()):
+    """touch_slots for many users at once."""
+    scopes = {f"doctor:{pk}" for pk in doctor_ids if pk} | {f"patient:{pk}" for pk in patient_ids if pk}
+    if scopes:
+        _bump(scopes)
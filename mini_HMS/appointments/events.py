@@ -0,0 +1,134 @@
+import abc
+import asyncio
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# --- SLOT EVENT BROKER ---
+# Views publish slot changes, the SSE endpoint (appointments.api.slot_events)
+# subscribes per doctor. The broker class comes from SLOT_EVENT_BROKER so a
+# multi-worker deployment can swap the in-process one for a shared bus.
+
+SLOT_BOOKED = 'slot.booked'
+SLOT_RELEASED = 'slot.released'
+SLOT_CREATED = 'slot.created'
+SLOT_DELETED = 'slot.deleted'
+SLOT_BLOCKED = 'slot.blocked'
+SLOT_UNBLOCKED = 'slot.unblocked'
+RESYNC = 'resync'
+
+# Every event name a client may receive, for the pages that listen to them
+EVENT_TYPES = [SLOT_BOOKED, SLOT_RELEASED, SLOT_CREATED, SLOT_DELETED, SLOT_BLOCKED, SLOT_UNBLOCKED, RESYNC]
+
+
+class SlotEventBroker(abc.ABC):
+    """Interface every broker implements."""
+
+    @abc.abstractmethod
+    def publish(self, event):
+        """Deliver `event` (a dict with a 'doctor' key) to its subscribers. Thread-safe."""
+
+    @abc.abstractmethod
+    def subscribe(self, doctor_ids):
+        """Returns a Subscription; must be called from the consuming event loop."""
+
+    @abc.abstractmethod
+    def unsubscribe(self, subscription):
+        """Stops delivering to `subscription`."""
+
+
+class Subscription:
+    """
+    One connected client. Holds only an asyncio queue, so idle connections
+    cost a few hundred bytes and no thread.
+    """
+
+    def __init__(self, broker, doctor_ids, max_pending):
+        self.broker = broker
+        self.doctor_ids = frozenset(doctor_ids)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_pending)
+
+    def deliver(self, event):
+        # Publishers run in sync view threads, so hop onto the subscriber's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Loop already closed: the client is gone
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            # Slow client: drop the backlog and tell it to refetch instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {'type': RESYNC}
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout):
+        """Next event, or None when `timeout` seconds pass without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker(SlotEventBroker):
+    """Fan-out within a single worker process."""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, event):
+        with self._lock:
+            targets = list(self._subscribers.get(event['doctor'], ()))
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def subscribe(self, doctor_ids):
+        subscription = Subscription(self, doctor_ids, self.max_pending)
+        with self._lock:
+            for doctor_id in subscription.doctor_ids:
+                self._subscribers[doctor_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for doctor_id in subscription.doctor_ids:
+                subscribers = self._subscribers.get(doctor_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[doctor_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.SLOT_EVENT_BROKER)()
+    return _broker
+
+
+def publish_slot_event(kind, slot):
+    """Publishes once the surrounding transaction commits."""
+    event = {
+        'type': kind,
+        'slot': slot.id,
+        'doctor': slot.doctor_id,
+        'date': str(slot.date),
+        'start_time': str(slot.start_time)[:5],
+        'end_time': str(slot.end_time)[:5],
+    }
+    transaction.on_commit(lambda: get_broker().publish(event))
@@ -0,0 +1,119 @@
+import csv
+import json
+import zlib
+from .models import AppointmentSlot
+
+# Bulk export of AppointmentSlot for admins and scripts. Rows come from a
+# server-side cursor in chunks with doctor and patient joined in, and are
+# encoded and (optionally) gzipped as a generator, so memory stays flat
+# however many rows are exported. Used by the export view and
+# `manage.py export_appointments`.
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+COLUMNS = [
+    'id', 'date', 'start_time', 'end_time',
+    'doctor_id', 'doctor_username', 'doctor_name',
+    'patient_id', 'patient_username', 'patient_name',
+    'is_booked', 'is_blocked', 'cancel_request_by',
+]
+
+# Encoded rows are joined into pieces of about this size before they are
+# handed on, rather than one write per row
+BUFFER_SIZE = 64 * 1024
+
+
+def export_queryset(start=None, end=None, doctor_id=None):
+    slots = AppointmentSlot.objects.select_related('doctor', 'patient').only(
+        'date', 'start_time', 'end_time', 'is_booked', 'is_blocked', 'cancel_request_by', 'doctor', 'patient',
+        'doctor__username', 'doctor__first_name', 'patient__username', 'patient__first_name',
+    )
+    if start:
+        slots = slots.filter(date__gte=start)
+    if end:
+        slots = slots.filter(date__lte=end)
+    if doctor_id:
+        slots = slots.filter(doctor_id=doctor_id)
+    return slots.order_by('date', 'start_time', 'id')
+
+
+def _row(slot):
+    patient = slot.patient
+    return {
+        'id': slot.id,
+        'date': slot.date.isoformat(),
+        'start_time': slot.start_time.isoformat(),
+        'end_time': slot.end_time.isoformat(),
+        'doctor_id': slot.doctor_id,
+        'doctor_username': slot.doctor.username,
+        'doctor_name': slot.doctor.first_name,
+        'patient_id': slot.patient_id,
+        'patient_username': patient.username if patient else None,
+        'patient_name': patient.first_name if patient else None,
+        'is_booked': slot.is_booked,
+        'is_blocked': slot.is_blocked,
+        'cancel_request_by': slot.cancel_request_by or None,
+    }
+
+
+# Spreadsheets run a cell starting with one of these as a formula, so user
+# text like a name of "=HYPERLINK(...)" is written with a leading quote
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Line:
+    """File-like target for csv.writer that hands back what was written."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_cell(row[column]) for column in COLUMNS])
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def _buffered(lines):
+    parts, size = [], 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def _gzipped(chunks):
+    # wbits=31: a gzip container, so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(queryset, fmt, chunk_size, compress=False):
+    """Yields the export as bytes, one buffer at a time."""
+    rows = (_row(slot) for slot in queryset.iterator(chunk_size=chunk_size))
+    lines = _csv_lines(rows) if fmt == 'csv' else _jsonl_lines(rows)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
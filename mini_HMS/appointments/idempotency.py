@@ -0,0 +1,105 @@
+import re
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from .models import IdempotencyKey
+
+# Booking and cancelling call Google Calendar and the email service, so a
+# double-click or a client retry must not run them twice. Each POST carries
+# a key (Idempotency-Key header, or an idempotency_key form field rendered
+# by {% idempotency_field %}). The first request with a key runs the view
+# and stores its response; later ones get that response back, read from
+# the cache or the IdempotencyKey row, without the view running.
+#
+# A key whose first request is still running answers 409. If that request
+# died with its worker, the row would never get a response, so once it is
+# older than IDEMPOTENCY_LEASE the next retry takes the key over.
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+STORED_HEADERS = ('Location', 'Content-Type')
+KEY_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def _cache_key(user_id, key):
+    return f"idempotency:{user_id}:{key}"
+
+
+def _stored(record):
+    return {
+        'path': record.path,
+        'status': record.status_code,
+        'headers': record.response_headers,
+        'body': record.response_body,
+    }
+
+
+def _replay(request, stored):
+    if stored['path'] != request.path:
+        return HttpResponse("Idempotency key was already used for a different request.", status=422)
+    response = HttpResponse(stored['body'], status=stored['status'])
+    for name, value in stored['headers'].items():
+        response[name] = value
+    response[REPLAYED_HEADER] = 'true'
+    if 300 <= stored['status'] < 400:
+        messages.info(request, "That request was already processed.")
+    return response
+
+
+def _reclaim(record, request):
+    """Takes over a key whose first request outlived the lease. True if this request won it."""
+    now = timezone.now()
+    if record.created_at > now - timedelta(seconds=settings.IDEMPOTENCY_LEASE):
+        return False
+    # Conditional on the row being unchanged, so only one of several retries wins
+    return bool(IdempotencyKey.objects.filter(
+        pk=record.pk, status_code=None, created_at=record.created_at, path=request.path,
+    ).update(created_at=now))
+
+
+def idempotent(view):
+    """Runs `view` at most once per (user, idempotency key)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER) or request.POST.get('idempotency_key', '')
+        if not KEY_RE.match(key):
+            return HttpResponse("Missing or invalid idempotency key.", status=400)
+
+        cache_key = _cache_key(request.user.id, key)
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(request, stored)
+
+        try:
+            # Committed straight away so a concurrent duplicate hits the constraint
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=request.user, key=key, path=request.path)
+        except IntegrityError:
+            record = IdempotencyKey.objects.get(user=request.user, key=key)
+            if record.status_code is None:
+                if not _reclaim(record, request):
+                    return HttpResponse("A request with this idempotency key is still in progress.", status=409)
+            else:
+                stored = _stored(record)
+                cache.set(cache_key, stored, settings.IDEMPOTENCY_KEY_TTL)
+                return _replay(request, stored)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            # Nothing was stored, so let the client retry with the same key
+            record.delete()
+            raise
+
+        record.status_code = response.status_code
+        record.response_headers = {name: response[name] for name in STORED_HEADERS if name in response}
+        record.response_body = response.content.decode(response.charset)
+        record.save(update_fields=['status_code', 'response_headers', 'response_body'])
+        cache.set(cache_key, _stored(record), settings.IDEMPOTENCY_KEY_TTL)
+        return response
+    return wrapper
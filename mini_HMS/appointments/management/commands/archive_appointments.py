@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from appointments.archive import archivable, archive_appointments
+
+
+class Command(BaseCommand):
+    help = "Move booked appointments older than N days from AppointmentSlot into AppointmentArchive."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.APPOINTMENT_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--chunk-size', type=int, default=settings.APPOINTMENT_ARCHIVE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        total = archivable(options['days']).count()
+        self.stdout.write(f"{total} appointment(s) older than {options['days']} days to archive")
+
+        moved = archive_appointments(
+            options['days'],
+            chunk_size=options['chunk_size'],
+            progress=lambda moved: self.stdout.write(f"  {moved}/{total}"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} appointment(s)."))
@@ -0,0 +1,86 @@
+import time as clock
+from datetime import date, time, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from appointments.models import AppointmentSlot
+from mini_HMS.bench import scratch_data
+from users.models import Profile
+
+USERS = 1000
+SLOTS_PER_DAY = 16
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed N appointment slots (default 1M) and report queries and time for the "
+        "admin changelists: first page, a month drill-down, a search and the user list."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        with scratch_data(), override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            started = clock.perf_counter()
+            first_day = self.seed(options['rows'])
+            self.stdout.write(f"Seeded {options['rows']} slots in {clock.perf_counter() - started:.1f}s")
+
+            admin = User.objects.create_superuser('9600000000', 'admin@bench.local', 'pw')
+            client = Client()
+            client.force_login(admin)
+            pages = [
+                ('slots, first page', '/admin/appointments/appointmentslot/'),
+                ('slots, one month', f'/admin/appointments/appointmentslot/?date__year={first_day.year}&date__month={first_day.month}'),
+                ('slots, search', '/admin/appointments/appointmentslot/?q=970000001'),
+                ('users, first page', '/admin/auth/user/'),
+                ('users, doctors', '/admin/auth/user/?profile__role__exact=doctor'),
+            ]
+            for label, url in pages:
+                self.bench(client, label, url)
+
+    def seed(self, rows):
+        doctors = User.objects.bulk_create([User(username=f"97{i:08d}", first_name=f"Doctor {i}") for i in range(USERS)])
+        patients = User.objects.bulk_create([User(username=f"98{i:08d}", first_name=f"Patient {i}") for i in range(USERS)])
+        Profile.objects.bulk_create(
+            [Profile(user_id=user.pk, role='doctor', mobile=user.username) for user in doctors]
+            + [Profile(user_id=user.pk, role='patient', mobile=user.username) for user in patients]
+        )
+
+        first_day = date.today() + timedelta(days=1)
+        per_doctor = -(-rows // USERS)
+        batch = []
+        for n in range(rows):
+            doctor, k = divmod(n, per_doctor)
+            day, slot = divmod(k, SLOTS_PER_DAY)
+            booked = n % 3 == 0
+            batch.append(AppointmentSlot(
+                doctor=doctors[doctor], date=first_day + timedelta(days=day),
+                start_time=time(8 + slot // 2, 30 * (slot % 2)), end_time=time(8 + slot // 2, 30 * (slot % 2) + 29),
+                is_booked=booked, patient=patients[n % USERS] if booked else None,
+            ))
+            if len(batch) == BATCH_SIZE:
+                AppointmentSlot.objects.bulk_create(batch)
+                batch = []
+        AppointmentSlot.objects.bulk_create(batch)
+
+        # Give the planner (and the estimated-count paginator) fresh statistics
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return first_day
+
+    def bench(self, client, label, url):
+        # Seeding overflows the DEBUG query log, which hides new queries from the capture
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            started = clock.perf_counter()
+            response = client.get(url)
+            elapsed = clock.perf_counter() - started
+        slowest = max(ctx.captured_queries, key=lambda q: float(q['time']))
+        self.stdout.write(
+            f"  {label:<20} {response.status_code} {elapsed * 1000:>8.1f} ms  {len(ctx.captured_queries)} queries"
+        )
+        self.stdout.write(f"      slowest ({float(slowest['time']) * 1000:.1f} ms): {slowest['sql'][:110]}")
@@ -0,0 +1,70 @@
+import uuid
+from datetime import date, time, timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from appointments.models import AppointmentSlot
+from calendar_integration.backends import get_backend, InMemoryCalendarBackend
+from mini_HMS.bench import scratch_data, timed
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure book_slot throughput against a chosen calendar backend. The in-memory "
+        "backend makes runs repeatable: fixed latency, seeded failures, no network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=sorted(settings.CALENDAR_BACKEND_PROFILES), default='memory')
+        parser.add_argument('--bookings', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds per simulated API call (memory backend).")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of simulated calls that fail (memory backend).")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        backend = settings.CALENDAR_BACKEND_PROFILES[options['backend']]
+        backend_options = {}
+        if options['backend'] == 'memory':
+            backend_options = {'latency': options['latency'], 'failure_rate': options['failure_rate'], 'seed': options['seed']}
+
+        # Emails go to a separate service; keep them out of the measurement
+        with scratch_data(), mock.patch('appointments.views.trigger_email'), \
+                override_settings(CALENDAR_BACKEND=backend, CALENDAR_BACKEND_OPTIONS=backend_options):
+            slots, client = self.seed(options['bookings'])
+            pending = iter(slots)
+
+            def book():
+                client.post(f'/doctor/book-slot/{next(pending).id}/', {'idempotency_key': uuid.uuid4().hex})
+
+            elapsed, per_second = timed(book, len(slots))
+            booked = AppointmentSlot.objects.filter(pk__in=[s.pk for s in slots], is_booked=True).count()
+            with_events = AppointmentSlot.objects.filter(pk__in=[s.pk for s in slots], doctor_google_event_id__isnull=False).count()
+            calendar = get_backend()
+
+        self.stdout.write(
+            f"{options['backend']} backend: {booked}/{len(slots)} booked in {elapsed:.2f}s "
+            f"({per_second:.1f} bookings/s, {elapsed / len(slots) * 1000:.1f} ms each); "
+            f"{with_events} got a doctor calendar event"
+        )
+        if isinstance(calendar, InMemoryCalendarBackend):
+            self.stdout.write(f"  {calendar.calls} simulated API calls, {calendar.failures} failed")
+
+    def seed(self, count):
+        doctor = User.objects.create_user('9400000001', 'doc@bench.local', first_name='Doc')
+        doctor.profile.role = 'doctor'
+        doctor.profile.save()
+        patient = User.objects.create_user('9400000002', 'pat@bench.local', first_name='Pat')
+
+        start = date.today() + timedelta(days=2)
+        slots = AppointmentSlot.objects.bulk_create([
+            AppointmentSlot(
+                doctor=doctor, date=start + timedelta(days=i // 16),
+                start_time=time(8 + (i % 16) // 2, 30 * (i % 2)), end_time=time(8 + (i % 16) // 2, 30 * (i % 2) + 29),
+            )
+            for i in range(count)
+        ])
+        client = Client()
+        client.force_login(patient)
+        return slots, client
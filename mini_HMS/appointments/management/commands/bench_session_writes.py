@@ -0,0 +1,71 @@
+import uuid
+from datetime import date, time, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from appointments.models import AppointmentSlot
+from mini_HMS.bench import scratch_data
+
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE')
+
+PROFILES = [
+    ('db + fallback messages', 'django.contrib.sessions.backends.db', 'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('db + session messages', 'django.contrib.sessions.backends.db', 'django.contrib.messages.storage.session.SessionStorage'),
+    ('cached_db + cookie messages', 'django.contrib.sessions.backends.cached_db', 'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('signed_cookies + cookie messages', 'django.contrib.sessions.backends.signed_cookies', 'django.contrib.messages.storage.cookie.CookieStorage'),
+]
+
+
+class Command(BaseCommand):
+    help = "Count DB writes per request across login, booking and mutual cancellation for each session/message profile."
+
+    def handle(self, *args, **options):
+        # External calls are replaced so only database work is measured
+        with mock.patch('appointments.views.create_event', return_value=None), \
+                mock.patch('appointments.views.delete_event'), \
+                mock.patch('appointments.views.trigger_email'), \
+                override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            for label, engine, storage in PROFILES:
+                with scratch_data(), override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=storage):
+                    self.report(label, self.run_flow())
+
+    def run_flow(self):
+        doctor = User.objects.create_user('9100000001', 'doc@bench.local', 'pw', first_name='Doc')
+        doctor.profile.role = 'doctor'
+        doctor.profile.save()
+        User.objects.create_user('9100000002', 'pat@bench.local', 'pw', first_name='Pat')
+        slot = AppointmentSlot.objects.create(
+            doctor=doctor, date=date.today() + timedelta(days=2), start_time=time(10), end_time=time(10, 30)
+        )
+
+        patient_client, doctor_client = Client(), Client()
+        steps = [
+            (patient_client, 'post', '/login/', {'mobile': '9100000002', 'password': 'pw'}),
+            (patient_client, 'get', '/doctor/my-appointments/', None),
+            (patient_client, 'post', f'/doctor/book-slot/{slot.id}/', {'idempotency_key': uuid.uuid4().hex}),
+            (patient_client, 'get', '/doctor/my-appointments/', None),
+            (patient_client, 'post', f'/doctor/cancel-appointment/{slot.id}/', {'idempotency_key': uuid.uuid4().hex}),
+            (doctor_client, 'post', '/login/', {'mobile': '9100000001', 'password': 'pw'}),
+            (doctor_client, 'get', '/doctor/schedule/', None),
+            (doctor_client, 'post', f'/doctor/cancel-appointment/{slot.id}/', {'idempotency_key': uuid.uuid4().hex}),
+            (doctor_client, 'get', '/doctor/schedule/', None),
+        ]
+
+        counts = []
+        for client, method, url, data in steps:
+            with CaptureQueriesContext(connection) as ctx:
+                getattr(client, method)(url, data) if data else getattr(client, method)(url)
+            writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(WRITE_VERBS)]
+            counts.append((sum('"django_session"' in sql for sql in writes), len(writes)))
+        return counts
+
+    def report(self, label, counts):
+        session_writes = sum(s for s, _ in counts)
+        total_writes = sum(t for _, t in counts)
+        self.stdout.write(
+            f"{label:<34} {total_writes:3d} writes over {len(counts)} requests "
+            f"({total_writes / len(counts):.2f}/request, {session_writes} to django_session)"
+        )
@@ -0,0 +1,84 @@
+from datetime import date, time, timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from appointments.models import AppointmentSlot
+from mini_HMS import metrics, template_timing
+from mini_HMS.bench import scratch_data
+from mini_HMS.page_cache import bump_doctor_version
+from users.models import Profile
+
+PAGES = [
+    ('my_schedule', 'doctor', '/doctor/schedule/'),
+    ('patient_dashboard', 'patient', '/doctor/my-appointments/'),
+    ('find_doctor', 'patient', '/doctor/find-doctors/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render each dashboard with N rows under the cached and the reloading template "
+        "loader and report time per page, template and block."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        template_timing.install()
+        with scratch_data(), override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            clients = self.seed(options['rows'])
+            for profile in ('cached', 'reload'):
+                templates = [dict(settings.TEMPLATES[0], OPTIONS=dict(
+                    settings.TEMPLATES[0]['OPTIONS'], loaders=settings.TEMPLATE_LOADER_PROFILES[profile],
+                ))]
+                with override_settings(TEMPLATES=templates, TEMPLATE_TIMING=True, TEMPLATE_TIMING_SAMPLE=1):
+                    self.stdout.write(f"\n{profile} loader, {options['rows']} rows, {options['repeat']} renders each")
+                    for label, role, url in PAGES:
+                        self.bench(label, clients[role], url, options['repeat'])
+
+    def seed(self, rows):
+        doctor = User.objects.create_user('9200000001', 'doc@bench.local', 'pw', first_name='Doc')
+        doctor.profile.role = 'doctor'
+        doctor.profile.save()
+        patient = User.objects.create_user('9200000002', 'pat@bench.local', 'pw', first_name='Pat')
+
+        start = date.today() + timedelta(days=2)
+        AppointmentSlot.objects.bulk_create([
+            AppointmentSlot(
+                doctor=doctor, date=start + timedelta(days=i // 20),
+                start_time=time(8 + (i % 20) // 2, 30 * (i % 2)), end_time=time(8 + (i % 20) // 2, 30 * (i % 2) + 15),
+                # Half booked by the patient, half still open
+                is_booked=i % 2 == 0, patient=patient if i % 2 == 0 else None,
+            )
+            for i in range(rows)
+        ])
+
+        doctors = User.objects.bulk_create([
+            User(username=f"93{i:08d}", email=f"doc{i}@bench.local", first_name=f"Doctor {i}")
+            for i in range(rows)
+        ])
+        Profile.objects.bulk_create([Profile(user_id=user.pk, role='doctor', mobile=user.username) for user in doctors])
+
+        clients = {'doctor': Client(), 'patient': Client()}
+        clients['doctor'].force_login(doctor)
+        clients['patient'].force_login(patient)
+        return clients
+
+    def bench(self, label, client, url, repeat):
+        before = metrics.snapshot()
+        for _ in range(repeat):
+            # Render the doctor list every time instead of serving the cached fragment
+            bump_doctor_version()
+            client.get(url)
+        after = metrics.snapshot()
+        delta = {name: value - before.get(name, 0) for name, value in after.items()}
+        timing = template_timing.summary(delta)
+
+        self.stdout.write(f"  {label}: {timing['request']['avg_ms']:.1f} ms/request")
+        for kind in ('templates', 'blocks'):
+            for name, row in timing[kind].items():
+                if row['renders']:
+                    self.stdout.write(f"    {name:<55} {row['avg_ms']:>8.2f} ms x{row['renders'] // repeat}")
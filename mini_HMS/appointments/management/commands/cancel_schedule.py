@@ -0,0 +1,35 @@
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from appointments.bulk_cancel import cancel_range
+
+
+class Command(BaseCommand):
+    help = "Clear a doctor's schedule for a date range: remove slots, delete calendar events and notify patients."
+
+    def add_arguments(self, parser):
+        parser.add_argument('doctor', help="Doctor's mobile number (username).")
+        parser.add_argument('start', help="First day, YYYY-MM-DD.")
+        parser.add_argument('end', nargs='?', help="Last day, YYYY-MM-DD (defaults to start).")
+
+    def handle(self, *args, **options):
+        try:
+            doctor = User.objects.get(username=options['doctor'], profile__role='doctor')
+        except User.DoesNotExist:
+            raise CommandError(f"No doctor with mobile {options['doctor']}")
+        try:
+            start = datetime.strptime(options['start'], "%Y-%m-%d").date()
+            end = datetime.strptime(options['end'] or options['start'], "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+        if end < start:
+            raise CommandError("end is before start")
+
+        def progress(stage, done, total):
+            self.stdout.write(f"  {stage}: {done}/{total}")
+
+        result = cancel_range(doctor, start, end, progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {result.slots_removed} slot(s), cancelled {result.appointments_cancelled} appointment(s), "
+            f"deleted {result.calendar_events_deleted} calendar event(s), notified {result.patients_notified} patient(s)."
+        ))
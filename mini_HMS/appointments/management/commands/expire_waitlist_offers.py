@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from appointments.waitlist import expire_offers
+
+
+class Command(BaseCommand):
+    help = (
+        "Put patients whose waitlist offer was not booked within WAITLIST_OFFER_MINUTES "
+        "back in line, and offer each slot to the next waiter. Run every few minutes."
+    )
+
+    def handle(self, *args, **options):
+        lapsed = expire_offers()
+        self.stdout.write(self.style.SUCCESS(f"{lapsed} offer(s) lapsed."))
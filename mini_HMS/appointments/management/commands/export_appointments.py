@@ -0,0 +1,34 @@
+import sys
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from appointments.export import FORMATS, export_queryset, iter_export
+
+
+class Command(BaseCommand):
+    help = "Stream appointment slots as CSV or JSONL (optionally gzipped) to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help="First date (YYYY-MM-DD).")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last date (YYYY-MM-DD).")
+        parser.add_argument('--doctor', type=int, help="Doctor's user id.")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', help="File to write (default: stdout).")
+        parser.add_argument('--chunk-size', type=int, default=settings.APPOINTMENT_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = export_queryset(options['start'], options['end'], options['doctor'])
+        chunks = iter_export(queryset, options['format'], options['chunk_size'], compress=options['gzip'])
+
+        target = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in chunks:
+                target.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                target.close()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
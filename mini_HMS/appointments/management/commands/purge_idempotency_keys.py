@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from appointments.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored idempotent responses older than IDEMPOTENCY_KEY_TTL, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        total = 0
+        while ids := list(
+            IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:options['batch_size']]
+        ):
+            deleted, _ = IdempotencyKey.objects.filter(pk__in=ids).delete()
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} idempotency key(s)."))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from appointments.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute DoctorDailyStats from AppointmentSlot and AppointmentArchive, one chunk "
+        "of doctors per transaction. Use it to backfill the rollups or to repair drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.DOCTOR_STATS_REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        written = rebuild(
+            chunk_size=options['chunk_size'],
+            progress=lambda done, total: self.stdout.write(f"  {done}/{total} doctors"),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily row(s)."))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointmentslot_doctor_google_event_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentslot',
+            name='is_blocked',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointmentslot_is_blocked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot_id', models.BigIntegerField(unique=True)),
+                ('doctor_id', models.IntegerField()),
+                ('doctor_name', models.CharField(max_length=150)),
+                ('patient_id', models.IntegerField(blank=True, null=True)),
+                ('patient_name', models.CharField(blank=True, max_length=150)),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('outcome', models.CharField(choices=[('completed', 'Completed'), ('cancel_pending', 'Cancellation pending')], max_length=20)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-date', '-start_time'],
+                'indexes': [models.Index(fields=['doctor_id', '-date'], name='archive_doctor_date'), models.Index(fields=['patient_id', '-date'], name='archive_patient_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 17:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_doctordailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointmentslot',
+            index=models.Index(fields=['date', 'start_time'], name='slot_date_start'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0012_waitlist_offer_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctordailystats',
+            name='slots_expired',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class AppointmentSlot(models.Model):
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_slots')
@@ -10,6 +11,8 @@ class AppointmentSlot(models.Model):
     is_booked = models.BooleanField(default=False)
     doctor_google_event_id = models.CharField(max_length=255, blank=True, null=True)
     patient_google_event_id = models.CharField(max_length=255, blank=True, null=True)
+    # Set by calendar_integration.sync when the doctor's own calendar is busy
+    is_blocked = models.BooleanField(default=False)
     
     # --- FIELD FOR MUTUAL CANCELLATION ---
     cancel_request_by = models.CharField(
@@ -22,6 +25,11 @@ class AppointmentSlot(models.Model):
     class Meta:
         unique_together = ('doctor', 'date', 'start_time')
         ordering = ['date', 'start_time']
+        indexes = [
+            # Date ranges across all doctors: admin date_hierarchy and its
+            # MIN/MAX, newest-first changelist pages, exports by date
+            models.Index(fields=['date', 'start_time'], name='slot_date_start'),
+        ]
 
     def __str__(self):
         return f"{self.doctor.username} - {self.date}"
@@ -31,6 +39,146 @@ class AppointmentSlot(models.Model):
         """Returns formatted string: '10:00 - 10:30'"""
         return f"{self.start_time.strftime('%H:%M')} - {self.end_time.strftime('%H:%M')}"
 
+# --- ARCHIVE OF PAST APPOINTMENTS ---
+class AppointmentArchive(models.Model):
+    """
+    A finished appointment moved out of AppointmentSlot by
+    appointments.archive. Names are copied so history pages need no joins,
+    and the user ids are plain integers so history outlives the accounts.
+    """
+    COMPLETED = 'completed'
+    CANCEL_PENDING = 'cancel_pending'
+    OUTCOME_CHOICES = [
+        (COMPLETED, 'Completed'),
+        # A cancellation was requested but never confirmed before the date
+        (CANCEL_PENDING, 'Cancellation pending'),
+    ]
+
+    slot_id = models.BigIntegerField(unique=True)
+    doctor_id = models.IntegerField()
+    doctor_name = models.CharField(max_length=150)
+    patient_id = models.IntegerField(null=True, blank=True)
+    patient_name = models.CharField(max_length=150, blank=True)
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-start_time']
+        indexes = [
+            models.Index(fields=['doctor_id', '-date'], name='archive_doctor_date'),
+            models.Index(fields=['patient_id', '-date'], name='archive_patient_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_name} - {self.date}"
+
+    def get_time_range(self):
+        return f"{self.start_time.strftime('%H:%M')} - {self.end_time.strftime('%H:%M')}"
+
+# --- WAITLIST ---
+class WaitlistEntry(models.Model):
+    """
+    A patient waiting for any slot with `doctor` between two dates.
+    appointments.waitlist hands released or newly added slots to the
+    oldest matching entry, either booking it outright or offering it.
+    """
+    WAITING = 'waiting'
+    OFFERED = 'offered'
+    BOOKED = 'booked'
+    STATUS_CHOICES = [(WAITING, 'Waiting'), (OFFERED, 'Offered'), (BOOKED, 'Booked')]
+
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlisted_by')
+    earliest_date = models.DateField()
+    latest_date = models.DateField()
+    # Book the first matching slot without asking, or just offer it
+    auto_book = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    slot = models.ForeignKey(AppointmentSlot, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Set while OFFERED: after this the patient goes back to WAITING
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # First-come lookup: WHERE doctor = ? AND status = 'waiting' ORDER BY created_at
+            models.Index(fields=['doctor', 'status', 'created_at'], name='waitlist_lookup'),
+            models.Index(fields=['status', 'offer_expires_at'], name='waitlist_offer_expiry'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.username} waiting for {self.doctor.username}"
+
+# --- IDEMPOTENT WRITES ---
+class IdempotencyKey(models.Model):
+    """
+    One per (user, key) sent to an @idempotent view. Keeps the response of
+    the first request so a retry gets it back without the view running again.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=64)
+    path = models.CharField(max_length=255)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict)
+    response_body = models.TextField(blank=True)
+    # Re-stamped when a retry takes over an abandoned key
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+# --- DAILY ROLLUPS (see appointments.stats) ---
+class DoctorDailyStats(models.Model):
+    """
+    One doctor's day: slots on the schedule, how many are booked and how
+    many have a cancellation request pending, plus running counts of
+    appointments cancelled and of slots that passed unbooked. Reports read
+    these instead of AppointmentSlot.
+    """
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    # Archived appointments still count as offered and booked, and slots
+    # cleaned up unbooked still count as offered
+    slots_offered = models.IntegerField(default=0)
+    slots_booked = models.IntegerField(default=0)
+    cancel_requests = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    slots_expired = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            # Also the index for "this doctor, these dates"
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor.username} {self.date}"
+
+# --- CHANGE STAMPS (see appointments.changes) ---
+class SlotVersion(models.Model):
+    """
+    Change counter for one doctor's slots ('doctor:<id>') or one patient's
+    bookings ('patient:<id>'), bumped in the transaction that changes them.
+    API and calendar feed validators are derived from it.
+    """
+    scope = models.CharField(max_length=40, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
 # --- MODEL FOR COLLABORATION ---
 class DoctorPost(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='doctor_posts')
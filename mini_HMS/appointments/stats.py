@@ -0,0 +1,138 @@
+from collections import Counter, defaultdict
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from .models import AppointmentArchive, AppointmentSlot, DoctorDailyStats
+
+# Per-doctor daily figures for reports. Every path that creates, books,
+# cancels or removes slots calls record() inside its own transaction, so
+# the rollup commits or rolls back with the change, and a report reads
+# one row per doctor and day instead of aggregating AppointmentSlot.
+# rebuild() recomputes the rows from the slot and archive tables.
+
+OFFERED = 'slots_offered'
+BOOKED = 'slots_booked'
+CANCEL_REQUESTS = 'cancel_requests'
+CANCELLATIONS = 'cancellations'
+EXPIRED = 'slots_expired'
+
+FIELDS = [OFFERED, BOOKED, CANCEL_REQUESTS, CANCELLATIONS, EXPIRED]
+PENDING_REQUEST = Q(cancel_request_by__in=['doctor', 'patient'])
+
+
+def record(doctor_id, day, **deltas):
+    """Adds `deltas` (field=change) to the doctor's row for `day`."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = DoctorDailyStats.objects.filter(doctor_id=doctor_id, date=day)
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if rows.update(**updates):
+        return
+    try:
+        # Savepoint: losing the insert race must not break the caller's transaction
+        with transaction.atomic():
+            DoctorDailyStats.objects.create(doctor_id=doctor_id, date=day, **deltas)
+    except IntegrityError:
+        rows.update(**updates)
+
+
+def slots_removed(slots, expired=False):
+    """
+    Records deleted slots; booked ones count as cancelled. `expired` slots
+    passed unbooked: they were on offer, so they stay in slots_offered.
+    """
+    totals = defaultdict(Counter)
+    for slot in slots:
+        row = totals[(slot.doctor_id, slot.date)]
+        if expired:
+            row[EXPIRED] += 1
+        else:
+            row[OFFERED] -= 1
+        if slot.is_booked:
+            row[BOOKED] -= 1
+            row[CANCELLATIONS] += 1
+        if slot.cancel_request_by:
+            row[CANCEL_REQUESTS] -= 1
+    for (doctor_id, day), deltas in totals.items():
+        record(doctor_id, day, **deltas)
+
+
+# --- REPORTING ---
+
+def report(doctor, start, end):
+    """(rows, totals) for start..end, read from the rollups only."""
+    rows = list(DoctorDailyStats.objects.filter(doctor=doctor, date__range=(start, end)))
+    totals = {field: sum(getattr(row, field) for row in rows) for field in FIELDS}
+    totals['utilization'] = round(totals[BOOKED] / totals[OFFERED] * 100) if totals[OFFERED] > 0 else 0
+    return rows, totals
+
+
+# --- REBUILD ---
+
+def _figures(doctor_ids):
+    """{(doctor_id, date): Counter} computed from the slot and archive tables."""
+    figures = defaultdict(Counter)
+    live = (
+        AppointmentSlot.objects.filter(doctor_id__in=doctor_ids)
+        .values('doctor_id', 'date')
+        .annotate(
+            offered=Count('id'),
+            booked=Count('id', filter=Q(is_booked=True)),
+            requests=Count('id', filter=PENDING_REQUEST),
+        )
+        .order_by()
+    )
+    for row in live:
+        figures[(row['doctor_id'], row['date'])].update(
+            {OFFERED: row['offered'], BOOKED: row['booked'], CANCEL_REQUESTS: row['requests']}
+        )
+
+    archived = (
+        AppointmentArchive.objects.filter(doctor_id__in=doctor_ids)
+        .values('doctor_id', 'date')
+        .annotate(count=Count('id'), requests=Count('id', filter=Q(outcome=AppointmentArchive.CANCEL_PENDING)))
+        .order_by()
+    )
+    for row in archived:
+        figures[(row['doctor_id'], row['date'])].update(
+            {OFFERED: row['count'], BOOKED: row['count'], CANCEL_REQUESTS: row['requests']}
+        )
+    return figures
+
+
+def rebuild_chunk(doctor_ids):
+    """
+    Replaces the rollups of the given doctors. Cancellations and expired
+    slots leave no trace in the slot tables, so their running counts are
+    carried over, and expired slots are added back to slots_offered.
+    """
+    with transaction.atomic():
+        # Lock the rows so a concurrent record() waits instead of being overwritten
+        existing = DoctorDailyStats.objects.select_for_update().filter(doctor_id__in=doctor_ids)
+        carried = list(existing.values_list('doctor_id', 'date', CANCELLATIONS, EXPIRED))
+        figures = _figures(doctor_ids)
+        for doctor_id, day, cancelled, expired in carried:
+            counts = figures[(doctor_id, day)]
+            counts[CANCELLATIONS] = cancelled
+            counts[EXPIRED] = expired
+            counts[OFFERED] += expired
+        rows = [
+            DoctorDailyStats(doctor_id=doctor_id, date=day, **{field: counts[field] for field in FIELDS})
+            for (doctor_id, day), counts in figures.items()
+            if any(counts.values())
+        ]
+        existing.delete()
+        DoctorDailyStats.objects.bulk_create(rows)
+    return len(rows)
+
+
+def rebuild(chunk_size=100, progress=None):
+    """Rebuilds every doctor's rollups, `chunk_size` doctors per transaction. Returns rows written."""
+    doctor_ids = list(User.objects.filter(profile__role='doctor').order_by('pk').values_list('pk', flat=True))
+    written = 0
+    for i in range(0, len(doctor_ids), chunk_size):
+        written += rebuild_chunk(doctor_ids[i:i + chunk_size])
+        if progress:
+            progress(min(i + chunk_size, len(doctor_ids)), len(doctor_ids))
+    return written
@@ -0,0 +1,11 @@
+import uuid
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_field():
+    """Hidden input with a fresh key; resubmitting the same form reuses it."""
+    return format_html('<input type="hidden" name="idempotency_key" value="{}">', uuid.uuid4().hex)
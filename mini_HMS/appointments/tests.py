@@ -1,3 +1,646 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+from collections import defaultdict
+from datetime import date, time, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mini_HMS.changelist import prefix_filter
+from mini_HMS.testing import make_doctor, make_patient
+from .archive import archive_appointments
+from .events import SLOT_BOOKED, InProcessBroker, SlotEventBroker, get_broker, publish_slot_event
+from .export import _cell
+from .models import AppointmentSlot, AppointmentArchive, DoctorDailyStats, IdempotencyKey, WaitlistEntry
+from .stats import rebuild, report
+from .views import cleanup_stale_slots
+from .waitlist import expire_offers
+
+
+@mock.patch('appointments.views.trigger_email')
+@mock.patch('appointments.views.create_event', return_value=None)
+class SlotApiTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.slot = AppointmentSlot.objects.create(
+            doctor=self.doctor, date=date.today() + timedelta(days=3), start_time=time(10), end_time=time(10, 30)
+        )
+        self.url = f'/api/slots/?doctor={self.doctor.id}'
+        self.client.force_login(self.patient)
+
+    def test_matching_etag_is_answered_without_the_slot_query(self, *mocks):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(len(first.json()['slots']), 1)
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'appointments_appointmentslot' in q['sql']])
+
+    def test_change_made_by_another_worker_invalidates_the_etag(self, *mocks):
+        etag = self.client.get(self.url)['ETag']
+
+        # A second process: its own cache, only the database is shared
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker',
+        }}):
+            other = Client()
+            other.force_login(self.patient)
+            other.post(f'/doctor/book-slot/{self.slot.id}/', {'idempotency_key': 'api-book-1'})
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slots'], [])
+
+
+class SlotEventTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.slot = AppointmentSlot.objects.create(
+            doctor=self.doctor, date=date.today() + timedelta(days=3), start_time=time(10), end_time=time(10, 30)
+        )
+
+    def test_event_reaches_every_subscriber_of_its_doctor_only(self):
+        async def scenario():
+            broker = InProcessBroker()
+            first, second, other = broker.subscribe({1}), broker.subscribe({1, 2}), broker.subscribe({2})
+            broker.publish({'type': SLOT_BOOKED, 'doctor': 1})
+            received = [await sub.next(0.5) for sub in (first, second)] + [await other.next(0.05)]
+            for sub in (first, second, other):
+                sub.close()
+            return received, dict(broker._subscribers)
+
+        received, left = asyncio.run(scenario())
+
+        self.assertEqual(received, [{'type': SLOT_BOOKED, 'doctor': 1}] * 2 + [None])
+        self.assertEqual(left, {})
+
+    async def test_stream_frames_events_and_heartbeats(self):
+        await self.async_client.aforce_login(self.doctor)
+        with override_settings(SLOT_EVENT_HEARTBEAT=0.05):
+            response = await self.async_client.get(f'/api/events/slots/?doctors={self.doctor.id}')
+            chunks = response.streaming_content
+
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+            get_broker().publish({'type': SLOT_BOOKED, 'doctor': self.doctor.id, 'slot': 7})
+            data = f'{{"type":"slot.booked","doctor":{self.doctor.id},"slot":7}}'
+            self.assertEqual(await anext(chunks), f'event: slot.booked\ndata: {data}\n\n'.encode())
+            self.assertEqual(await anext(chunks), b': keep-alive\n\n')
+
+    def test_events_are_published_only_on_commit(self):
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    publish_slot_event(SLOT_BOOKED, self.slot)
+                    raise RuntimeError
+            publish.assert_not_called()
+
+            with self.captureOnCommitCallbacks() as callbacks:
+                publish_slot_event(SLOT_BOOKED, self.slot)
+            publish.assert_not_called()
+            callbacks[0]()
+
+        (event,), _ = publish.call_args
+        self.assertEqual((event['type'], event['slot'], event['start_time']), (SLOT_BOOKED, self.slot.id, '10:00'))
+
+    def test_patient_dashboard_subscribes_to_the_doctors_it_shows(self):
+        patient = make_patient()
+        self.client.force_login(patient)
+
+        response = self.client.get('/doctor/my-appointments/')
+
+        self.assertEqual(response.context['slot_events_url'], f'/api/events/slots/?doctors={self.doctor.id}')
+        self.assertContains(response, 'new EventSource(')
+        self.assertContains(response, '"slot.booked"')
+
+    def test_incomplete_broker_fails_when_loaded(self):
+        class PublishOnly(SlotEventBroker):
+            def publish(self, event):
+                pass
+
+        with self.assertRaises(TypeError):
+            PublishOnly()
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def slot(self, days_ago, hour, **fields):
+        return AppointmentSlot.objects.create(
+            doctor=self.doctor, date=date.today() - timedelta(days=days_ago),
+            start_time=time(hour), end_time=time(hour, 30), **fields
+        )
+
+    def test_moves_only_old_booked_slots_in_chunks(self):
+        for hour in range(9, 14):
+            self.slot(40, hour, is_booked=True, patient=self.patient)
+        pending = self.slot(40, 15, is_booked=True, patient=self.patient, cancel_request_by='doctor')
+        recent = self.slot(5, 9, is_booked=True, patient=self.patient)
+        open_slot = self.slot(40, 16)
+
+        self.assertEqual(archive_appointments(30, chunk_size=2), 6)
+
+        self.assertEqual(
+            set(AppointmentSlot.objects.values_list('pk', flat=True)), {recent.pk, open_slot.pk}
+        )
+        row = AppointmentArchive.objects.get(slot_id=pending.pk)
+        self.assertEqual((row.doctor_name, row.patient_id, row.patient_name), ('Doc', self.patient.pk, 'Pat'))
+        self.assertEqual(row.outcome, AppointmentArchive.CANCEL_PENDING)
+        self.assertEqual(AppointmentArchive.objects.filter(outcome=AppointmentArchive.COMPLETED).count(), 5)
+
+    def test_history_pages_read_the_archive(self):
+        self.slot(40, 9, is_booked=True, patient=self.patient)
+        archive_appointments(30)
+
+        self.client.force_login(self.patient)
+        response = self.client.get('/doctor/my-appointments/')
+        self.assertContains(response, 'Past Appointments')
+        self.assertEqual(len(response.context['past_appointments']), 1)
+
+        self.client.force_login(self.doctor)
+        response = self.client.get('/doctor/schedule/')
+        self.assertContains(response, 'Pat')
+
+
+class ScheduleWindowTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.client.force_login(self.doctor)
+        # A Monday well in the future, so cleanup_stale_slots leaves everything alone
+        today = date.today()
+        self.monday = today - timedelta(days=today.weekday()) + timedelta(weeks=2)
+
+    def add_slots(self, days, per_day):
+        AppointmentSlot.objects.bulk_create([
+            AppointmentSlot(
+                doctor=self.doctor, date=self.monday + timedelta(days=day), start_time=time(8 + i), end_time=time(8 + i, 30),
+                is_booked=i == 0, patient=self.patient if i == 0 else None,
+            )
+            for day in days for i in range(per_day)
+        ])
+
+    def get(self, **params):
+        return self.client.get('/doctor/schedule/', {'date': str(self.monday), **params})
+
+    def test_week_view_loads_only_its_week_with_daily_counts(self):
+        self.add_slots(range(-7, 14), per_day=3)
+
+        response = self.get()
+
+        self.assertEqual(len(response.context['slots']), 21)
+        self.assertTrue(all(self.monday <= s.date <= self.monday + timedelta(days=6) for s in response.context['slots']))
+        self.assertEqual([(d['booked'], d['free']) for d in response.context['days']], [(1, 2)] * 7)
+
+    def test_day_view_and_query_count_do_not_grow_with_the_schedule(self):
+        self.add_slots([0], per_day=2)
+        small = self.count_queries(view='day')
+
+        self.add_slots(range(1, 60), per_day=8)
+        response = self.get(view='day')
+
+        self.assertEqual(len(response.context['slots']), 2)
+        self.assertEqual(self.count_queries(view='day'), small)
+
+    def count_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            self.get(**params)
+        return len(ctx.captured_queries)
+
+
+class BulkCancelTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patients = [
+            make_patient(f'900000001{i}', f'pat{i}@example.com', f'Pat{i}') for i in range(2)
+        ]
+        self.day = date.today() + timedelta(days=5)
+
+    def slot(self, days, hour, patient=None):
+        return AppointmentSlot.objects.create(
+            doctor=self.doctor, date=self.day + timedelta(days=days), start_time=time(hour), end_time=time(hour, 30),
+            is_booked=patient is not None, patient=patient,
+            doctor_google_event_id=f"d{days}{hour}" if patient else None,
+            patient_google_event_id=f"p{days}{hour}" if patient else None,
+        )
+
+    @mock.patch('appointments.bulk_cancel.trigger_bulk_email')
+    @mock.patch('appointments.bulk_cancel.delete_events', side_effect=lambda user, ids: len(ids))
+    def test_clears_range_batches_calendar_and_sends_one_email_per_patient(self, delete_events, send):
+        first, second = self.patients
+        self.slot(0, 9, first)
+        self.slot(0, 10, first)
+        self.slot(1, 9, second)
+        self.slot(1, 10)
+        outside = self.slot(2, 9, first)
+
+        self.client.force_login(self.doctor)
+        response = self.client.post('/doctor/cancel-range/', {'start': str(self.day), 'end': str(self.day + timedelta(days=1))})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(AppointmentSlot.objects.values_list('pk', flat=True)), [outside.pk])
+
+        calls = {user.pk: sorted(ids) for (user, ids), _ in delete_events.call_args_list}
+        self.assertEqual(calls, {
+            self.doctor.pk: ['d010', 'd09', 'd19'],
+            first.pk: ['p010', 'p09'],
+            second.pk: ['p19'],
+        })
+
+        (messages,), _ = send.call_args
+        by_action = defaultdict(list)
+        for message in messages:
+            by_action[message['action']].append(message)
+        self.assertEqual(len(by_action['BULK_CANCELLATION']), 2)
+        self.assertEqual(len(by_action['DOCTOR_BULK_CANCELLATION']), 1)
+        first_email = next(m for m in by_action['BULK_CANCELLATION'] if m['recipient_email'] == first.email)
+        self.assertEqual(len(first_email['data']['appointments']), 2)
+
+    def test_patients_cannot_clear_a_schedule(self):
+        self.slot(0, 9, self.patients[0])
+        self.client.force_login(self.patients[0])
+
+        self.client.post('/doctor/cancel-range/', {'start': str(self.day)})
+
+        self.assertEqual(AppointmentSlot.objects.count(), 1)
+
+
+@mock.patch('appointments.views.trigger_email')
+@mock.patch('appointments.views.delete_event')
+@mock.patch('appointments.waitlist.trigger_email')
+@mock.patch('appointments.waitlist.trigger_bulk_email')
+@mock.patch('appointments.waitlist.create_event', return_value=None)
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.holder, self.first, self.second = [
+            make_patient(f'900000001{i}', f'pat{i}@example.com', f'Pat{i}') for i in range(3)
+        ]
+        self.day = date.today() + timedelta(days=5)
+
+    def wait(self, patient, auto_book=True):
+        return WaitlistEntry.objects.create(
+            patient=patient, doctor=self.doctor, auto_book=auto_book,
+            earliest_date=self.day - timedelta(days=1), latest_date=self.day + timedelta(days=1),
+        )
+
+    def test_released_slot_is_booked_for_the_oldest_waiter(self, create_event, send_bulk, *mocks):
+        slot = AppointmentSlot.objects.create(
+            doctor=self.doctor, patient=self.holder, is_booked=True, cancel_request_by='patient',
+            date=self.day, start_time=time(10), end_time=time(10, 30),
+        )
+        first, second = self.wait(self.first), self.wait(self.second)
+
+        self.client.force_login(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/doctor/cancel-appointment/{slot.id}/', {'idempotency_key': 'approve-1'})
+
+        slot.refresh_from_db()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((slot.is_booked, slot.patient_id), (True, self.first.id))
+        self.assertEqual((first.status, first.slot_id), (WaitlistEntry.BOOKED, slot.id))
+        self.assertEqual(second.status, WaitlistEntry.WAITING)
+        (messages,), _ = send_bulk.call_args
+        self.assertEqual([m['action'] for m in messages], ['WAITLIST_BOOKED', 'DOCTOR_NEW_BOOKING'])
+
+    def test_new_slot_is_offered_and_busy_waiters_are_skipped(self, create_event, send_bulk, send_offer, *mocks):
+        AppointmentSlot.objects.create(
+            doctor=self.doctor, patient=self.first, is_booked=True, date=self.day, start_time=time(9, 45), end_time=time(10, 15),
+        )
+        self.wait(self.first)
+        offered = self.wait(self.second, auto_book=False)
+
+        self.client.force_login(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/doctor/schedule/', {'date': str(self.day), 'start_time': '10:00', 'end_time': '10:30'})
+
+        offered.refresh_from_db()
+        self.assertEqual(offered.status, WaitlistEntry.OFFERED)
+        self.assertFalse(offered.slot.is_booked)
+        self.assertEqual(send_offer.call_args.kwargs['action'], 'WAITLIST_OFFER')
+        self.assertEqual(WaitlistEntry.objects.get(patient=self.first).status, WaitlistEntry.WAITING)
+
+    def slot(self, hour, **fields):
+        return AppointmentSlot.objects.create(
+            doctor=self.doctor, date=self.day, start_time=time(hour), end_time=time(hour, 30), **fields
+        )
+
+    def test_cancelled_slot_is_not_handed_back_to_the_patient_who_cancelled(self, *mocks):
+        slot = self.slot(10, patient=self.holder, is_booked=True)
+        self.wait(self.holder)
+        first = self.wait(self.first)
+
+        self.client.force_login(self.holder)
+        self.client.post(f'/doctor/cancel-appointment/{slot.id}/', {'idempotency_key': 'holder-cancel'})
+        self.client.force_login(self.doctor)
+        self.client.post(f'/doctor/cancel-appointment/{slot.id}/', {'idempotency_key': 'holder-approve'})
+
+        slot.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(slot.patient_id, self.first.id)
+        self.assertEqual(first.status, WaitlistEntry.BOOKED)
+        self.assertEqual(WaitlistEntry.objects.get(patient=self.holder).status, WaitlistEntry.WAITING)
+
+    @mock.patch('appointments.views.create_event', return_value=None)
+    def test_offer_lapses_when_someone_else_books_the_slot(self, *mocks):
+        offered = self.wait(self.second, auto_book=False)
+        self.client.force_login(self.doctor)
+        self.client.post('/doctor/schedule/', {'date': str(self.day), 'start_time': '10:00', 'end_time': '10:30'})
+        offered.refresh_from_db()
+        self.assertEqual(offered.status, WaitlistEntry.OFFERED)
+        self.assertIsNotNone(offered.offer_expires_at)
+
+        self.client.force_login(self.holder)
+        self.client.post(f'/doctor/book-slot/{offered.slot_id}/', {'idempotency_key': 'other-books-it'})
+
+        offered.refresh_from_db()
+        self.assertEqual((offered.status, offered.slot_id, offered.offer_expires_at), (WaitlistEntry.WAITING, None, None))
+        # Joining again moves the window of that same entry
+        self.client.force_login(self.second)
+        self.client.post(f'/doctor/waitlist/{self.doctor.id}/', {
+            'earliest_date': str(self.day), 'latest_date': str(self.day + timedelta(days=2)),
+        })
+        self.assertEqual(WaitlistEntry.objects.filter(patient=self.second).count(), 1)
+
+    def test_expired_offer_moves_on_and_deleted_slot_reopens_the_offer(self, create_event, send_bulk, send_offer, *mocks):
+        slot = self.slot(10)
+        first, second = self.wait(self.first, auto_book=False), self.wait(self.second, auto_book=False)
+        first.status, first.slot = WaitlistEntry.OFFERED, slot
+        first.offer_expires_at = timezone.now() - timedelta(minutes=1)
+        first.save()
+
+        self.assertEqual(expire_offers(), 1)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.slot_id), (WaitlistEntry.WAITING, None))
+        self.assertEqual((second.status, second.slot_id), (WaitlistEntry.OFFERED, slot.id))
+
+        self.client.force_login(self.doctor)
+        self.client.get(f'/doctor/delete-slot/{slot.id}/')
+        second.refresh_from_db()
+        self.assertEqual(second.status, WaitlistEntry.WAITING)
+
+
+@mock.patch('appointments.views.trigger_email')
+@mock.patch('appointments.views.delete_event')
+@mock.patch('appointments.views.create_event', return_value=None)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.slot = AppointmentSlot.objects.create(
+            doctor=self.doctor, date=date.today() + timedelta(days=3), start_time=time(10), end_time=time(10, 30)
+        )
+
+    def test_replayed_booking_returns_the_first_response_without_side_effects(self, create_event, delete_event, send):
+        self.client.force_login(self.patient)
+        url = f'/doctor/book-slot/{self.slot.id}/'
+
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='book-key-1')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.post(url, HTTP_IDEMPOTENCY_KEY='book-key-1')
+
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertFalse([q for q in ctx.captured_queries if 'appointments_appointmentslot' in q['sql']])
+        self.assertEqual(create_event.call_count, 2)
+        self.assertEqual(send.call_count, 2)
+
+    def test_key_left_in_progress_by_a_dead_worker_is_reclaimed_after_the_lease(self, create_event, delete_event, send):
+        self.client.force_login(self.patient)
+        url = f'/doctor/book-slot/{self.slot.id}/'
+        # The first request's worker died before it stored a response
+        record = IdempotencyKey.objects.create(user=self.patient, key='crashed-key', path=url)
+
+        self.assertEqual(self.client.post(url, HTTP_IDEMPOTENCY_KEY='crashed-key').status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='crashed-key')
+
+        self.assertEqual(response.status_code, 302)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.patient, self.patient)
+        record.refresh_from_db()
+        self.assertEqual(record.status_code, 302)
+
+    def test_get_and_missing_keys_are_rejected(self, *mocks):
+        self.client.force_login(self.patient)
+        url = f'/doctor/book-slot/{self.slot.id}/'
+
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_booked)
+
+    def test_second_approval_with_a_new_key_does_not_repeat_calendar_or_email(self, create_event, delete_event, send):
+        self.slot.is_booked, self.slot.patient, self.slot.cancel_request_by = True, self.patient, 'patient'
+        self.slot.doctor_google_event_id = 'doc-event'
+        self.slot.save()
+        self.client.force_login(self.doctor)
+
+        for key in ('approve-key-1', 'approve-key-2'):
+            self.client.post(f'/doctor/cancel-appointment/{self.slot.id}/', {'idempotency_key': key})
+
+        delete_event.assert_called_once()
+        self.assertEqual(send.call_count, 2)
+
+
+@mock.patch('appointments.views.trigger_email')
+@mock.patch('appointments.views.delete_event')
+@mock.patch('appointments.views.create_event', return_value=None)
+class DoctorStatsTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.day = date.today() + timedelta(days=3)
+
+    def figures(self):
+        return list(DoctorDailyStats.objects.values_list('date', 'slots_offered', 'slots_booked', 'cancel_requests', 'cancellations'))
+
+    def test_write_paths_keep_rollups_in_step_and_rebuild_agrees(self, *mocks):
+        self.client.force_login(self.doctor)
+        for start, end in (('10:00', '10:30'), ('11:00', '11:30'), ('12:00', '12:30')):
+            self.client.post('/doctor/schedule/', {'date': str(self.day), 'start_time': start, 'end_time': end})
+        first, second, third = AppointmentSlot.objects.order_by('start_time')
+
+        self.client.force_login(self.patient)
+        self.client.post(f'/doctor/book-slot/{first.id}/', {'idempotency_key': 'stats-book-1'})
+        self.client.post(f'/doctor/book-slot/{second.id}/', {'idempotency_key': 'stats-book-2'})
+        self.client.post(f'/doctor/cancel-appointment/{first.id}/', {'idempotency_key': 'stats-cancel-1'})
+        self.client.post(f'/doctor/cancel-appointment/{second.id}/', {'idempotency_key': 'stats-cancel-2'})
+        self.client.force_login(self.doctor)
+        self.client.post(f'/doctor/cancel-appointment/{first.id}/', {'idempotency_key': 'stats-approve-1'})
+        self.client.get(f'/doctor/delete-slot/{third.id}/')
+
+        # Two slots left: `first` free again, `second` booked with a request pending
+        self.assertEqual(self.figures(), [(self.day, 2, 1, 1, 1)])
+
+        DoctorDailyStats.objects.update(slots_offered=99)
+        self.assertEqual(rebuild(chunk_size=1), 1)
+        self.assertEqual(self.figures(), [(self.day, 2, 1, 1, 1)])
+
+    def test_cleanup_keeps_expired_slots_offered_and_rebuild_agrees(self, *mocks):
+        past = date.today() - timedelta(days=2)
+        for hour, patient in ((9, self.patient), (10, None), (11, None), (12, None)):
+            AppointmentSlot.objects.create(
+                doctor=self.doctor, date=past, start_time=time(hour), end_time=time(hour, 30),
+                patient=patient, is_booked=patient is not None,
+            )
+        DoctorDailyStats.objects.create(doctor=self.doctor, date=past, slots_offered=4, slots_booked=1)
+
+        cleanup_stale_slots()
+
+        self.assertEqual(AppointmentSlot.objects.count(), 1)
+        self.assertEqual(report(self.doctor, past, past)[1]['utilization'], 25)
+        self.assertEqual(rebuild(), 1)
+        row = DoctorDailyStats.objects.get()
+        self.assertEqual((row.slots_offered, row.slots_booked, row.slots_expired), (4, 1, 3))
+
+    def test_report_reads_only_the_rollups(self, *mocks):
+        DoctorDailyStats.objects.create(doctor=self.doctor, date=self.day, slots_offered=4, slots_booked=3, cancellations=1)
+        self.client.force_login(self.doctor)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/doctor/stats/')
+
+        self.assertEqual(response.context['totals']['utilization'], 75)
+        self.assertFalse([q for q in ctx.captured_queries if 'appointments_appointmentslot' in q['sql']])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('9000000009', 'staff@example.com', 'pw', is_staff=True)
+        self.doctors = [make_doctor(f'900000001{i}', f'doc{i}@example.com', f'Doc{i}') for i in range(2)]
+        patient = make_patient()
+        start = date.today() + timedelta(days=1)
+        for doctor in self.doctors:
+            for i in range(10):
+                AppointmentSlot.objects.create(
+                    doctor=doctor, date=start + timedelta(days=i), start_time=time(10), end_time=time(10, 30),
+                    is_booked=i % 2 == 0, patient=patient if i % 2 == 0 else None,
+                )
+        self.client.force_login(self.staff)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_streams_every_row_with_one_slot_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/doctor/export/')
+            rows = list(csv.DictReader(io.StringIO(self.body(response).decode())))
+
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]['patient_name'], 'Pat')
+        # Doctor and patient come from the join, not a query per row
+        self.assertEqual(len([q for q in ctx.captured_queries if 'appointments_appointmentslot' in q['sql']]), 1)
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+
+    def test_csv_neutralises_formula_cells(self):
+        self.doctors[0].first_name = '=HYPERLINK("http://evil.example")'
+        self.doctors[0].save()
+        User.objects.filter(username='9000000002').update(first_name='@SUM(A1)')
+
+        rows = list(csv.DictReader(io.StringIO(self.body(self.client.get('/doctor/export/')).decode())))
+
+        self.assertEqual(rows[0]['doctor_name'], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(rows[0]['patient_name'], "'@SUM(A1)")
+        self.assertEqual(rows[1]['doctor_name'], 'Doc1')
+        for text in ('+1', '-1', '\tx', '\rx'):
+            self.assertEqual(_cell(text), "'" + text)
+        self.assertEqual(_cell(-1), -1)
+
+    def test_filters_and_gzipped_jsonl(self):
+        last = date.today() + timedelta(days=4)
+        response = self.client.get('/doctor/export/', {
+            'format': 'jsonl', 'gzip': '1', 'doctor': self.doctors[1].id, 'end': str(last),
+        })
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.jsonl.gz"')
+        rows = [json.loads(line) for line in gzip.decompress(self.body(response)).splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['doctor_name'] for row in rows}, {'Doc1'})
+        self.assertEqual(rows[-1]['date'], str(last))
+
+    def test_staff_only(self):
+        self.client.force_login(self.doctors[0])
+        self.assertEqual(self.client.get('/doctor/export/').status_code, 302)
+
+
+class AdminChangelistTests(TestCase):
+    URL = '/admin/appointments/appointmentslot/'
+
+    def setUp(self):
+        admin = User.objects.create_superuser('9000000009', 'admin@example.com', 'pw')
+        self.doctor = make_doctor()
+        self.patient = make_patient('8000000002')
+        self.client.force_login(admin)
+        self.seeded = 0
+
+    def seed(self, count):
+        start = date.today() + timedelta(days=1)
+        AppointmentSlot.objects.bulk_create([
+            AppointmentSlot(
+                doctor=self.doctor, date=start + timedelta(days=self.seeded + i), start_time=time(10), end_time=time(10, 30),
+                is_booked=i % 2 == 0, patient=self.patient if i % 2 == 0 else None,
+            )
+            for i in range(count)
+        ])
+        self.seeded += count
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    @mock.patch('mini_HMS.changelist.estimated_rows', return_value=1_000_000)
+    def test_slot_list_at_a_million_rows_runs_a_fixed_set_of_bounded_queries(self, estimate):
+        self.seed(5)
+        _, few = self.get(self.URL)
+        self.seed(45)
+        response, many = self.get(self.URL)
+
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(response.context['cl'].result_count, 1_000_000)
+        slot_queries = [q['sql'] for q in many if 'appointments_appointmentslot' in q['sql']]
+        # No COUNT(*) over the table, no DISTINCT over every row for the drill-down
+        self.assertFalse([sql for sql in slot_queries if 'COUNT(' in sql or 'DISTINCT' in sql])
+        # Doctor and patient come from the page query; the only user lookup is the session's
+        self.assertEqual(len([q for q in many if q['sql'].startswith('SELECT "auth_user"')]), 1)
+
+    def test_search_matches_a_mobile_prefix_through_indexed_subqueries(self):
+        self.seed(10)
+
+        response, queries = self.get(f'{self.URL}?q=8000')
+
+        self.assertEqual(response.context['cl'].result_count, 5)
+        page = [q['sql'] for q in queries if q['sql'].startswith('SELECT "appointments_appointmentslot"')][0]
+        self.assertIn('"doctor_id" IN (SELECT', page)
+        self.assertIn('"username" >= \'8000\' AND U0."username" < \'8001\'', page)
+        self.assertNotIn('LIKE', page)
+        if connection.vendor == 'sqlite':
+            # A seek on the unique username index, not a SCAN of auth_user
+            users = User.objects.filter(prefix_filter('username', '8000')).values('pk')
+            plan = AppointmentSlot.objects.filter(doctor__in=users).explain()
+            self.assertRegex(plan, r'SEARCH \S+ USING COVERING INDEX \S+ \(username>\? AND username<\?\)')
+
+    def test_month_drill_down_lists_days_without_scanning(self):
+        self.seed(40)
+        first = date.today() + timedelta(days=1)
+
+        response, queries = self.get(f'{self.URL}?date__year={first.year}&date__month={first.month}')
+
+        self.assertFalse([q for q in queries if 'DISTINCT' in q['sql']])
+        self.assertTrue(all(slot.date.month == first.month for slot in response.context['cl'].result_list))
 
-# Create your tests here.
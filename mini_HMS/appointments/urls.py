@@ -6,12 +6,19 @@ urlpatterns = [
     path('dashboard/', views.doctor_dashboard, name='doctor_dashboard'),
     path('schedule/', views.my_schedule, name='my_schedule'),
     path('delete-slot/<int:slot_id>/', views.delete_slot, name='delete_slot'),
+    path('cancel-range/', views.cancel_schedule_range, name='cancel_schedule_range'),
+    path('stats/', views.doctor_stats, name='doctor_stats'),
     
     # Patient URLs
     path('find-doctors/', views.find_doctor, name='find_doctor'),
     path('my-appointments/', views.patient_dashboard, name='patient_dashboard'),
     path('book-slot/<int:slot_id>/', views.book_slot, name='book_slot'),
+    path('waitlist/<int:doctor_id>/', views.join_waitlist, name='join_waitlist'),
+    path('waitlist/leave/<int:entry_id>/', views.leave_waitlist, name='leave_waitlist'),
 
     # Shared URL
     path('cancel-appointment/<int:slot_id>/', views.cancel_appointment, name='cancel_appointment'),
+
+    # Staff
+    path('export/', views.export_appointments, name='export_appointments'),
 ]
\ No newline at end of file
@@ -1,12 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 from datetime import datetime, timedelta, date
-from .models import AppointmentSlot, DoctorPost
+from .models import AppointmentSlot, DoctorPost, WaitlistEntry
 from django.contrib.auth.models import User
 from calendar_integration.utils import create_event, delete_event
 from mini_HMS.utils import trigger_email
+from mini_HMS.page_cache import cached_fragment
+from calendar_integration.ics import feed_url
+from .changes import touch_slots
+from .archive import history_for
+from .bulk_cancel import cancel_range
+from .export import FORMATS, export_queryset, iter_export
+from .waitlist import hand_off, close_entries, reopen_offers
+from .idempotency import idempotent
+from . import stats
+from .events import publish_slot_event, EVENT_TYPES, SLOT_BOOKED, SLOT_RELEASED, SLOT_CREATED, SLOT_DELETED
 
 # --- HELPER FUNCTIONS ---
 
@@ -16,12 +31,17 @@ def cleanup_stale_slots():
     current_date = now.date()
     current_time = now.time()
 
-    AppointmentSlot.objects.filter(is_booked=False, date__lt=current_date).delete()
-    AppointmentSlot.objects.filter(
-        is_booked=False, 
-        date=current_date, 
-        start_time__lt=current_time
-    ).delete()
+    stale = AppointmentSlot.objects.filter(
+        Q(date__lt=current_date) | Q(date=current_date, start_time__lt=current_time),
+        is_booked=False,
+    )
+    with transaction.atomic():
+        # Locked so two concurrent cleanups do not both count the same rows
+        removed = list(stale.select_for_update())
+        if removed:
+            stats.slots_removed(removed, expired=True)
+            reopen_offers([slot.pk for slot in removed])
+            AppointmentSlot.objects.filter(pk__in=[slot.pk for slot in removed]).delete()
 
 def is_slot_too_soon(slot_date, slot_start_time):
     """Rule 2 Helper: Checks if slot is < 1 hour from now."""
@@ -30,6 +50,19 @@ def is_slot_too_soon(slot_date, slot_start_time):
     # Check if slot is within the next hour
     return slot_naive < (now_naive + timedelta(hours=1))
 
+def schedule_window(request):
+    """
+    Reads ?view=week|day&date=YYYY-MM-DD. Returns (view, anchor, first, last)
+    where first..last is the Monday-Sunday week containing `anchor`.
+    """
+    view = request.GET.get('view') if request.GET.get('view') in ('week', 'day') else 'week'
+    try:
+        anchor = datetime.strptime(request.GET.get('date', ''), "%Y-%m-%d").date()
+    except ValueError:
+        anchor = date.today()
+    first = anchor - timedelta(days=anchor.weekday())
+    return view, anchor, first, first + timedelta(days=6)
+
 
 # --- DOCTOR VIEWS ---
 
@@ -64,13 +97,21 @@ def my_schedule(request):
                 messages.error(request, "Invalid Slot: You must schedule at least 1 hour in advance.")
                 return redirect('my_schedule')
 
-            AppointmentSlot.objects.create(
-                doctor=request.user,
-                date=date_str,
-                start_time=start_time_str,
-                end_time=end_time_str
-            )
+            with transaction.atomic():
+                slot = AppointmentSlot.objects.create(
+                    doctor=request.user,
+                    date=slot_date,
+                    start_time=slot_start,
+                    end_time=datetime.strptime(end_time_str, "%H:%M").time()
+                )
+                touch_slots(doctor_id=request.user.id)
+                stats.record(slot.doctor_id, slot.date, slots_offered=1)
+                publish_slot_event(SLOT_CREATED, slot)
+                # Someone may already be waiting for this doctor on this day
+                hand_off(slot)
             messages.success(request, "Availability slot added successfully!")
+            # Open the week the new slot is in
+            return redirect(f"{reverse('my_schedule')}?date={slot_date}")
             
         except ValueError:
             messages.error(request, "Invalid date or time format.")
@@ -79,44 +120,147 @@ def my_schedule(request):
         
         return redirect('my_schedule')
 
-    slots = AppointmentSlot.objects.filter(doctor=request.user).order_by('date', 'start_time')
-    return render(request, 'appointments/my_schedule.html', {'slots': slots})
+    # Only one window is loaded, so the page costs the same for a doctor
+    # with a week of slots as for one with a year of them
+    view, anchor, week_start, week_end = schedule_window(request)
+    window_start, window_end = (anchor, anchor) if view == 'day' else (week_start, week_end)
+    step = timedelta(days=1 if view == 'day' else 7)
+
+    slots = AppointmentSlot.objects.filter(
+        doctor=request.user, date__range=(window_start, window_end)
+    ).select_related('patient__profile').order_by('date', 'start_time')
+
+    # Booked/free counts for each day of the week in one GROUP BY
+    counts = {
+        row['date']: row
+        for row in AppointmentSlot.objects.filter(doctor=request.user, date__range=(week_start, week_end))
+        .values('date').annotate(booked=Count('id', filter=Q(is_booked=True)), free=Count('id', filter=Q(is_booked=False)))
+        .order_by()
+    }
+    days = []
+    for offset in range(7):
+        day = week_start + timedelta(days=offset)
+        row = counts.get(day, {})
+        days.append({'date': day, 'booked': row.get('booked', 0), 'free': row.get('free', 0)})
+
+    return render(request, 'appointments/my_schedule.html', {
+        'slots': slots,
+        'view': view,
+        'anchor': anchor,
+        'days': days,
+        'window_start': window_start,
+        'window_end': window_end,
+        'previous_date': anchor - step,
+        'next_date': anchor + step,
+        'today': date.today(),
+        'past_appointments': history_for(request.user, settings.APPOINTMENT_HISTORY_LIMIT),
+        'ics_feed_url': feed_url(request, request.user),
+    })
 
 @login_required
 def delete_slot(request, slot_id):
     slot = get_object_or_404(AppointmentSlot, id=slot_id)
     if slot.doctor == request.user:
-        slot.delete()
+        with transaction.atomic():
+            # Event is built before delete() clears the pk, sent after commit
+            publish_slot_event(SLOT_DELETED, slot)
+            stats.slots_removed([slot])
+            reopen_offers([slot.pk])
+            slot.delete()
+            touch_slots(doctor_id=request.user.id)
         messages.success(request, "Slot removed.")
     else:
         messages.error(request, "Unauthorized.")
     return redirect('my_schedule') 
 
 @login_required
-def cancel_appointment(request, slot_id):
-    slot = get_object_or_404(AppointmentSlot, id=slot_id)
-    
-    if request.user == slot.doctor:
-        actor = 'doctor'
-        redirect_url = 'my_schedule'
-    elif request.user == slot.patient:
-        actor = 'patient'
-        redirect_url = 'patient_dashboard'
-    else:
+def doctor_stats(request):
+    """Daily offered/booked/cancelled figures, read from the rollups only."""
+    if not request.user.is_doctor:
         messages.error(request, "Unauthorized action.")
         return redirect('home')
 
-    if not slot.cancel_request_by:
-        slot.cancel_request_by = actor
-        slot.save()
-        messages.info(request, "Cancellation requested. Waiting for approval.")
-    
-    elif slot.cancel_request_by == actor:
-        messages.warning(request, "You have already requested cancellation.")
-        
-    else:
-        # --- APPROVED CANCELLATION --- 
-           
+    today = date.today()
+    try:
+        start = datetime.strptime(request.GET.get('start', ''), "%Y-%m-%d").date()
+        end = datetime.strptime(request.GET.get('end', ''), "%Y-%m-%d").date()
+    except ValueError:
+        start, end = today - timedelta(days=30), today + timedelta(days=14)
+    # At most a year of rows, however long the doctor has been here
+    start = max(start, end - timedelta(days=settings.DOCTOR_STATS_MAX_DAYS - 1))
+
+    rows, totals = stats.report(request.user, start, end)
+    return render(request, 'appointments/doctor_stats.html', {
+        'rows': rows,
+        'totals': totals,
+        'start': start,
+        'end': end,
+    })
+
+@login_required
+@require_POST
+def cancel_schedule_range(request):
+    """Doctor is unavailable for a day or a range: clear every slot in it at once."""
+    if not request.user.is_doctor:
+        messages.error(request, "Unauthorized action.")
+        return redirect('home')
+
+    try:
+        start = datetime.strptime(request.POST.get('start', ''), "%Y-%m-%d").date()
+        end = datetime.strptime(request.POST.get('end') or request.POST.get('start', ''), "%Y-%m-%d").date()
+    except ValueError:
+        messages.error(request, "Invalid date format.")
+        return redirect('my_schedule')
+
+    if end < start or start < date.today():
+        messages.error(request, "Choose a range starting today or later.")
+        return redirect('my_schedule')
+
+    result = cancel_range(request.user, start, end)
+    messages.success(
+        request,
+        f"Removed {result.slots_removed} slot(s) and cancelled {result.appointments_cancelled} appointment(s). "
+        f"{result.patients_notified} patient(s) notified."
+    )
+    return redirect(f"{reverse('my_schedule')}?date={start}")
+
+@login_required
+@require_POST
+@idempotent
+def cancel_appointment(request, slot_id):
+    with transaction.atomic():
+        # Locked so two approvals (two tabs, two keys) cannot both clear the slot
+        slot = get_object_or_404(AppointmentSlot.objects.select_for_update(), id=slot_id)
+
+        if request.user == slot.doctor:
+            actor = 'doctor'
+            redirect_url = 'my_schedule'
+        elif request.user == slot.patient:
+            actor = 'patient'
+            redirect_url = 'patient_dashboard'
+        else:
+            messages.error(request, "Unauthorized action.")
+            return redirect('home')
+
+        if not slot.is_booked:
+            # Already cancelled, e.g. by an earlier approval from another tab
+            messages.warning(request, "This appointment is no longer active.")
+            return redirect(redirect_url)
+
+        if not slot.cancel_request_by:
+            slot.cancel_request_by = actor
+            slot.save()
+            touch_slots(doctor_id=slot.doctor_id, patient_id=slot.patient_id)
+            stats.record(slot.doctor_id, slot.date, cancel_requests=1)
+            messages.info(request, "Cancellation requested. Waiting for approval.")
+            return redirect(redirect_url)
+
+        if slot.cancel_request_by == actor:
+            messages.warning(request, "You have already requested cancellation.")
+            return redirect(redirect_url)
+
+        # --- APPROVED CANCELLATION ---
+
         # 1. Capture details BEFORE clearing data
         # Optimization: Use the new model method
         email_data = {
@@ -126,40 +270,48 @@ def cancel_appointment(request, slot_id):
             "date": str(slot.date),
             "time": slot.get_time_range() # <--- Cleaner call
         }
-        
+
         patient_email = slot.patient.email if slot.patient else None
         doctor_email = slot.doctor.email
+        calendar_events = [(slot.doctor, slot.doctor_google_event_id), (slot.patient, slot.patient_google_event_id)]
+        released_by = slot.patient_id
 
-        # 2. Delete Calendar Events
-        if slot.doctor_google_event_id:
-            delete_event(slot.doctor, slot.doctor_google_event_id)
-        if slot.patient_google_event_id:
-            delete_event(slot.patient, slot.patient_google_event_id)
-
-        # 3. Clear Database
+        # 2. Clear Database, then pass the slot on to the waitlist
+        touch_slots(doctor_id=slot.doctor_id, patient_id=slot.patient_id)
+        stats.record(slot.doctor_id, slot.date, slots_booked=-1, cancel_requests=-1, cancellations=1)
         slot.patient = None
         slot.is_booked = False
         slot.cancel_request_by = None
         slot.doctor_google_event_id = None
         slot.patient_google_event_id = None
         slot.save()
+        publish_slot_event(SLOT_RELEASED, slot)
+        if not slot.is_blocked and not is_slot_too_soon(slot.date, slot.start_time):
+            # Never straight back to the patient who just cancelled it
+            hand_off(slot, exclude_patient_id=released_by)
 
-        # 4. Trigger Cancellation Emails
-        if patient_email:
-            trigger_email(
-                action="BOOKING_CANCELLATION",
-                recipient_email=patient_email,
-                data=email_data
-            )
+    # Only the request that approved gets here, so these run once
 
+    # 3. Delete Calendar Events
+    for owner, event_id in calendar_events:
+        if event_id:
+            delete_event(owner, event_id)
+
+    # 4. Trigger Cancellation Emails
+    if patient_email:
         trigger_email(
-            action="DOCTOR_SLOT_CANCELLED",
-            recipient_email=doctor_email,
+            action="BOOKING_CANCELLATION",
+            recipient_email=patient_email,
             data=email_data
         )
 
-        messages.success(request, "Cancellation approved. Appointment removed from Calendar.")
+    trigger_email(
+        action="DOCTOR_SLOT_CANCELLED",
+        recipient_email=doctor_email,
+        data=email_data
+    )
 
+    messages.success(request, "Cancellation approved. Appointment removed from Calendar.")
     return redirect(redirect_url)
 
 
@@ -172,16 +324,38 @@ def patient_dashboard(request):
     
     raw_slots = AppointmentSlot.objects.filter(
         is_booked=False, 
+        is_blocked=False,
         date__gte=today
     ).order_by('date', 'start_time')
 
     # Filter out slots less than 1 hour away
     available_slots = [slot for slot in raw_slots if not is_slot_too_soon(slot.date, slot.start_time)]
 
-    my_bookings = AppointmentSlot.objects.filter(patient=request.user).order_by('date')
-    return render(request, 'appointments/patient_dashboard.html', {'available_slots': available_slots, 'my_bookings': my_bookings})
+    my_bookings = list(AppointmentSlot.objects.filter(patient=request.user).order_by('date'))
+    waitlist = list(WaitlistEntry.objects.filter(
+        patient=request.user, status__in=[WaitlistEntry.WAITING, WaitlistEntry.OFFERED]
+    ).select_related('doctor', 'slot'))
+
+    # The page listens for slot events of every doctor it shows
+    doctor_ids = sorted({row.doctor_id for row in [*available_slots, *my_bookings, *waitlist]})
+    slot_events_url = None
+    if doctor_ids:
+        doctors = ','.join(str(pk) for pk in doctor_ids[:settings.SLOT_EVENT_MAX_DOCTORS])
+        slot_events_url = f"{reverse('api_slot_events')}?doctors={doctors}"
+
+    return render(request, 'appointments/patient_dashboard.html', {
+        'available_slots': available_slots,
+        'my_bookings': my_bookings,
+        'waitlist': waitlist,
+        'past_appointments': history_for(request.user, settings.APPOINTMENT_HISTORY_LIMIT),
+        'ics_feed_url': feed_url(request, request.user),
+        'slot_events_url': slot_events_url,
+        'slot_event_types': EVENT_TYPES,
+    })
 
 @login_required
+@require_POST
+@idempotent
 def book_slot(request, slot_id):
     with transaction.atomic():
         try:
@@ -192,6 +366,11 @@ def book_slot(request, slot_id):
                 messages.error(request, "Sorry, this slot was just booked by someone else.")
                 return redirect('patient_dashboard')
 
+            # Doctor is busy in their own calendar (calendar_integration.sync)
+            if slot.is_blocked:
+                messages.error(request, "This slot is no longer available.")
+                return redirect('patient_dashboard')
+
             # 2. Rule Check
             if is_slot_too_soon(slot.date, slot.start_time):
                  messages.error(request, "This slot is no longer available (must be booked 1 hour in advance).")
@@ -222,7 +401,7 @@ def book_slot(request, slot_id):
                 user=slot.doctor,
                 summary=f"Appointment with {slot.patient.first_name}",
                 description=f"Patient Mobile: {slot.patient.profile.mobile}",
-                start_dt=start_dt, end_dt=end_dt
+                start_dt=start_dt, end_dt=end_dt, slot=slot
             )
             slot.doctor_google_event_id = doc_id
 
@@ -231,11 +410,15 @@ def book_slot(request, slot_id):
                 user=slot.patient,
                 summary=f"Appointment with Dr. {slot.doctor.first_name}",
                 description=f"Doctor Mobile: {slot.doctor.profile.mobile}",
-                start_dt=start_dt, end_dt=end_dt
+                start_dt=start_dt, end_dt=end_dt, slot=slot
             )
             slot.patient_google_event_id = pat_id
 
             slot.save()
+            touch_slots(doctor_id=slot.doctor_id, patient_id=slot.patient_id)
+            stats.record(slot.doctor_id, slot.date, slots_booked=1)
+            publish_slot_event(SLOT_BOOKED, slot)
+            close_entries(request.user, slot)
 
             # --- TRIGGER CONFIRMATION EMAIL ---
             
@@ -268,7 +451,84 @@ def book_slot(request, slot_id):
             
     return redirect('patient_dashboard')
 
+@login_required
+def join_waitlist(request, doctor_id):
+    doctor = get_object_or_404(User, id=doctor_id, profile__role='doctor')
+    if request.user.is_doctor:
+        messages.error(request, "Only patients can join a waitlist.")
+        return redirect('home')
+
+    if request.method == 'POST':
+        try:
+            earliest = datetime.strptime(request.POST.get('earliest_date', ''), "%Y-%m-%d").date()
+            latest = datetime.strptime(request.POST.get('latest_date', ''), "%Y-%m-%d").date()
+        except ValueError:
+            messages.error(request, "Invalid date format.")
+            return redirect('join_waitlist', doctor_id=doctor.id)
+        if latest < earliest or earliest < date.today():
+            messages.error(request, "Choose a date window starting today or later.")
+            return redirect('join_waitlist', doctor_id=doctor.id)
+
+        # One active entry per doctor: joining again just moves the window,
+        # and an entry holding an offer keeps it
+        window = {'earliest_date': earliest, 'latest_date': latest, 'auto_book': request.POST.get('auto_book') == 'on'}
+        active = WaitlistEntry.objects.filter(
+            patient=request.user, doctor=doctor, status__in=[WaitlistEntry.WAITING, WaitlistEntry.OFFERED]
+        )
+        if not active.update(**window):
+            WaitlistEntry.objects.create(patient=request.user, doctor=doctor, **window)
+        open_now = AppointmentSlot.objects.filter(
+            doctor=doctor, is_booked=False, is_blocked=False, date__range=(earliest, latest)
+        ).exists()
+        if open_now:
+            messages.info(request, f"Dr. {doctor.first_name} already has open slots in that window - book one below.")
+        else:
+            messages.success(request, f"You're on Dr. {doctor.first_name}'s waitlist. We'll email you when a slot opens.")
+        return redirect('patient_dashboard')
+
+    return render(request, 'appointments/join_waitlist.html', {'doctor': doctor, 'today': date.today()})
+
+@login_required
+@require_POST
+def leave_waitlist(request, entry_id):
+    WaitlistEntry.objects.filter(id=entry_id, patient=request.user).delete()
+    messages.info(request, "Removed from the waitlist.")
+    return redirect('patient_dashboard')
+
 @login_required
 def find_doctor(request):
-    doctors = User.objects.filter(profile__role='doctor')
-    return render(request, 'appointments/find_doctor.html', {'doctors': doctors})
\ No newline at end of file
+    # The queryset is lazy, so it only runs when the cached fragment is stale
+    doctor_list = cached_fragment(
+        request, 'find_doctor', 'appointments/doctor_list.html',
+        lambda: {'doctors': User.objects.filter(profile__role='doctor').select_related('profile')}
+    )
+    return render(request, 'appointments/find_doctor.html', {'doctor_list': doctor_list})
+
+
+# --- STAFF EXPORT ---
+
+@user_passes_test(lambda u: u.is_staff)
+def export_appointments(request):
+    """
+    Streams slots as CSV or JSONL: ?format=csv|jsonl&start=&end=&doctor=&gzip=1.
+    Rows are read in chunks and written as they arrive.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return HttpResponseBadRequest("format must be csv or jsonl.")
+    try:
+        start = datetime.strptime(request.GET['start'], "%Y-%m-%d").date() if request.GET.get('start') else None
+        end = datetime.strptime(request.GET['end'], "%Y-%m-%d").date() if request.GET.get('end') else None
+        doctor_id = int(request.GET['doctor']) if request.GET.get('doctor') else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid start, end or doctor.")
+
+    compress = request.GET.get('gzip') == '1'
+    chunks = iter_export(
+        export_queryset(start, end, doctor_id), fmt, settings.APPOINTMENT_EXPORT_CHUNK_SIZE, compress=compress
+    )
+    filename = f"appointments.{fmt}" + ('.gz' if compress else '')
+    response = StreamingHttpResponse(chunks, content_type='application/gzip' if compress else FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
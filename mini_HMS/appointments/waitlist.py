@@ -0,0 +1,190 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from calendar_integration.utils import create_event
+from mini_HMS.utils import trigger_bulk_email, trigger_email
+from . import stats
+from .changes import touch_slots
+from .events import publish_slot_event, SLOT_BOOKED
+from .models import AppointmentSlot, WaitlistEntry
+
+# Hands a slot that just became free (released by a cancellation or newly
+# added by the doctor) to the oldest patient waiting for that doctor on
+# that date, inside the transaction that freed it. Patients no longer have
+# to keep reloading the dashboard to catch a cancellation.
+#
+# An offer does not hold the slot. It lapses back to WAITING when someone
+# else books the slot, when the slot is removed, or after
+# WAITLIST_OFFER_MINUTES (expire_offers), and the patient keeps their
+# place in line for later slots.
+
+
+def next_waiter(slot, exclude_patient_id=None):
+    """Oldest waiting entry whose window covers the slot, locked for update."""
+    busy = AppointmentSlot.objects.filter(
+        patient=OuterRef('patient'),
+        date=slot.date,
+        start_time__lt=slot.end_time,
+        end_time__gt=slot.start_time,
+    )
+    waiting = (
+        WaitlistEntry.objects
+        # Two releases at once must not pick the same waiter
+        .select_for_update(skip_locked=True)
+        .filter(
+            doctor_id=slot.doctor_id,
+            status=WaitlistEntry.WAITING,
+            earliest_date__lte=slot.date,
+            latest_date__gte=slot.date,
+        )
+        .exclude(Exists(busy))
+    )
+    if exclude_patient_id:
+        waiting = waiting.exclude(patient_id=exclude_patient_id)
+    return waiting.order_by('created_at').first()
+
+
+def hand_off(slot, exclude_patient_id=None):
+    """
+    Books or offers a free `slot` to the next waiter other than
+    `exclude_patient_id` (the patient who just gave it up). Call inside
+    the transaction that freed it. Returns the entry served, or None.
+    """
+    if slot.is_booked or slot.is_blocked:
+        return None
+    entry = next_waiter(slot, exclude_patient_id)
+    if entry is None:
+        return None
+
+    entry.slot = slot
+    if entry.auto_book:
+        slot.is_booked = True
+        slot.patient_id = entry.patient_id
+        slot.cancel_request_by = None
+        slot.save(update_fields=['is_booked', 'patient', 'cancel_request_by'])
+        entry.status = WaitlistEntry.BOOKED
+        entry.offer_expires_at = None
+        touch_slots(doctor_id=slot.doctor_id, patient_id=entry.patient_id)
+        stats.record(slot.doctor_id, slot.date, slots_booked=1)
+        publish_slot_event(SLOT_BOOKED, slot)
+        transaction.on_commit(lambda: _finish_booking(slot.pk))
+    else:
+        entry.status = WaitlistEntry.OFFERED
+        entry.offer_expires_at = timezone.now() + timedelta(minutes=settings.WAITLIST_OFFER_MINUTES)
+        transaction.on_commit(lambda: _send_offer(entry.pk))
+    entry.save(update_fields=['status', 'slot', 'offer_expires_at'])
+    return entry
+
+
+def close_entries(patient, slot):
+    """
+    The patient booked `slot` themselves: their waits for that doctor and
+    date are over. A different slot they had been offered goes to the next
+    waiter, and offers of `slot` to anyone else lapse.
+    """
+    entries = WaitlistEntry.objects.filter(
+        patient=patient,
+        doctor_id=slot.doctor_id,
+        status__in=[WaitlistEntry.WAITING, WaitlistEntry.OFFERED],
+        earliest_date__lte=slot.date,
+        latest_date__gte=slot.date,
+    )
+    passed_on = list(
+        entries.filter(status=WaitlistEntry.OFFERED, slot__isnull=False).exclude(slot=slot).values_list('slot_id', flat=True)
+    )
+    entries.update(status=WaitlistEntry.BOOKED, slot=slot, offer_expires_at=None)
+    reopen_offers([slot.pk])
+    for slot_id in passed_on:
+        _offer_on(slot_id, exclude_patient_id=patient.pk)
+
+
+def reopen_offers(slot_ids):
+    """
+    Offers of these slots are void (booked by someone else, or about to be
+    deleted): those patients go back to waiting. Call before deleting.
+    """
+    return WaitlistEntry.objects.filter(status=WaitlistEntry.OFFERED, slot_id__in=slot_ids).update(
+        status=WaitlistEntry.WAITING, slot=None, offer_expires_at=None
+    )
+
+
+def _offer_on(slot_id, exclude_patient_id):
+    """hand_off for a slot that is not already locked, if it is still free and bookable."""
+    slot = AppointmentSlot.objects.select_for_update().filter(pk=slot_id).first()
+    cutoff = datetime.now() + timedelta(hours=1)
+    if slot is None or datetime.combine(slot.date, slot.start_time) < cutoff:
+        return None
+    return hand_off(slot, exclude_patient_id)
+
+
+def expire_offers():
+    """
+    Puts patients whose offer ran out back in line and passes each slot
+    to the next waiter. Returns the number of offers that lapsed.
+    """
+    due = WaitlistEntry.objects.filter(status=WaitlistEntry.OFFERED, offer_expires_at__lte=timezone.now())
+    lapsed = 0
+    for pk in list(due.values_list('pk', flat=True)):
+        with transaction.atomic():
+            # Skipped if the patient is booking it right now
+            entry = due.select_for_update(skip_locked=True).filter(pk=pk).first()
+            if entry is None:
+                continue
+            slot_id = entry.slot_id
+            entry.status, entry.slot, entry.offer_expires_at = WaitlistEntry.WAITING, None, None
+            entry.save(update_fields=['status', 'slot', 'offer_expires_at'])
+            if slot_id:
+                _offer_on(slot_id, exclude_patient_id=entry.patient_id)
+            lapsed += 1
+    return lapsed
+
+
+# --- AFTER COMMIT: calendar and email ---
+
+def _email_data(slot, patient):
+    return {
+        "patient_name": patient.first_name,
+        "doctor_name": slot.doctor.first_name,
+        "date": str(slot.date),
+        "time": slot.get_time_range(),
+    }
+
+
+def _finish_booking(slot_id):
+    slot = AppointmentSlot.objects.select_related('doctor__profile', 'patient__profile').filter(pk=slot_id).first()
+    if slot is None or slot.patient is None:
+        return
+
+    start_dt = datetime.combine(slot.date, slot.start_time)
+    end_dt = datetime.combine(slot.date, slot.end_time)
+    doctor_event = create_event(
+        user=slot.doctor,
+        summary=f"Appointment with {slot.patient.first_name}",
+        description=f"Patient Mobile: {slot.patient.profile.mobile}",
+        start_dt=start_dt, end_dt=end_dt, slot=slot,
+    )
+    patient_event = create_event(
+        user=slot.patient,
+        summary=f"Appointment with Dr. {slot.doctor.first_name}",
+        description=f"Doctor Mobile: {slot.doctor.profile.mobile}",
+        start_dt=start_dt, end_dt=end_dt, slot=slot,
+    )
+    AppointmentSlot.objects.filter(pk=slot.pk).update(
+        doctor_google_event_id=doctor_event, patient_google_event_id=patient_event
+    )
+
+    data = _email_data(slot, slot.patient)
+    trigger_bulk_email([
+        {"action": "WAITLIST_BOOKED", "recipient_email": slot.patient.email, "data": data},
+        {"action": "DOCTOR_NEW_BOOKING", "recipient_email": slot.doctor.email, "data": data},
+    ])
+
+
+def _send_offer(entry_id):
+    entry = WaitlistEntry.objects.select_related('patient', 'slot__doctor').filter(pk=entry_id).first()
+    if entry is None or entry.slot is None:
+        return
+    data = _email_data(entry.slot, entry.patient)
+    trigger_email(action="WAITLIST_OFFER", recipient_email=entry.patient.email, data=data)
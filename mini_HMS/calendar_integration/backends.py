@@ -0,0 +1,164 @@
+import abc
+import itertools
+import logging
+import random
+import threading
+import time
+from django.conf import settings
+from django.utils.module_loading import import_string
+from . import quota
+from .models import CalendarRetry
+
+logger = logging.getLogger(__name__)
+
+# --- CALENDAR BACKENDS ---
+# calendar_integration.utils forwards every call to the backend named by
+# CALENDAR_BACKEND (constructed with CALENDAR_BACKEND_OPTIONS), so a
+# deployment can turn external sync off and load tests can run without
+# touching Google.
+
+
+class CalendarBackend(abc.ABC):
+    """
+    Interface every backend implements. Failures are logged, never raised.
+    A backend missing a method fails when get_backend() constructs it.
+    """
+
+    @abc.abstractmethod
+    def create_event(self, user, summary, description, start_dt, end_dt, slot=None):
+        """Returns the new event's id, or None if nothing was created. `slot` is the booking, if any."""
+
+    @abc.abstractmethod
+    def delete_event(self, user, event_id):
+        """Deletes one event."""
+
+    @abc.abstractmethod
+    def delete_events(self, user, event_ids):
+        """Batch delete of one user's events; returns how many succeeded."""
+
+    @abc.abstractmethod
+    def sync(self, doctor):
+        """Pulls the doctor's busy time; returns slots changed, or None if not supported."""
+
+
+class GoogleCalendarBackend(CalendarBackend):
+    """
+    Google Calendar API, within our quota (see .quota): calls over budget or
+    refused by Google are queued for retry. A batch delete is charged as one
+    request. The client libraries load on the first call.
+    """
+
+    def create_event(self, user, summary, description, start_dt, end_dt, slot=None):
+        if not hasattr(user, 'calendar_token'):
+            # Not connected: skip loading the client libraries at all
+            return None
+        return quota.call(user, CalendarRetry.CREATE, {
+            'summary': summary, 'description': description,
+            'start': start_dt.isoformat(), 'end': end_dt.isoformat(),
+            # A replay only goes ahead while this same booking stands
+            'slot_id': slot.pk if slot else None, 'patient_id': slot.patient_id if slot else None,
+        })
+
+    def delete_event(self, user, event_id):
+        if not event_id or not hasattr(user, 'calendar_token'):
+            return
+        quota.call(user, CalendarRetry.DELETE, {'event_id': event_id})
+
+    def delete_events(self, user, event_ids):
+        event_ids = [event_id for event_id in event_ids if event_id]
+        if not event_ids or not hasattr(user, 'calendar_token'):
+            return 0
+        return quota.call(user, CalendarRetry.DELETE_MANY, {'event_ids': event_ids})
+
+    def sync(self, doctor):
+        from .sync import sync_doctor
+        if quota.take_token(doctor):
+            # Out of budget: the next sync run picks up the same changes
+            return None
+        return sync_doctor(doctor)
+
+
+class NullCalendarBackend(CalendarBackend):
+    """External calendars switched off; the .ics feed still works."""
+
+    def create_event(self, user, summary, description, start_dt, end_dt, slot=None):
+        return None
+
+    def delete_event(self, user, event_id):
+        pass
+
+    def delete_events(self, user, event_ids):
+        return 0
+
+    def sync(self, doctor):
+        return None
+
+
+class InMemoryCalendarBackend(CalendarBackend):
+    """
+    Fake for benchmarks and tests. Every call sleeps `latency` seconds and
+    fails with probability `failure_rate`; `seed` makes failures repeatable.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.events = {}
+        self.calls = 0
+        self.failures = 0
+
+    def _call(self, what):
+        """Simulates one API round trip. Returns False when it 'failed'."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            self.failures += failed
+        if failed:
+            logger.error(f"Error {what}: simulated failure")
+        return not failed
+
+    def create_event(self, user, summary, description, start_dt, end_dt, slot=None):
+        if not self._call("creating event"):
+            return None
+        with self._lock:
+            event_id = f"mem-{next(self._ids)}"
+            self.events[event_id] = {'user': user.id, 'summary': summary, 'start': start_dt, 'end': end_dt}
+        return event_id
+
+    def delete_event(self, user, event_id):
+        if event_id and self._call("deleting event"):
+            with self._lock:
+                self.events.pop(event_id, None)
+
+    def delete_events(self, user, event_ids):
+        event_ids = [event_id for event_id in event_ids if event_id]
+        # One simulated round trip per batch, like the real batch endpoint
+        if not event_ids or not self._call("deleting events"):
+            return 0
+        with self._lock:
+            return sum(self.events.pop(event_id, None) is not None for event_id in event_ids)
+
+    def sync(self, doctor):
+        # Nothing happens in a fake calendar between syncs
+        return 0 if self._call("syncing") else None
+
+
+_backend = None
+_backend_config = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """The configured backend, rebuilt if the settings changed (override_settings)."""
+    global _backend, _backend_config
+    config = (settings.CALENDAR_BACKEND, repr(sorted(settings.CALENDAR_BACKEND_OPTIONS.items())))
+    if _backend is None or _backend_config != config:
+        with _backend_lock:
+            if _backend is None or _backend_config != config:
+                _backend = import_string(settings.CALENDAR_BACKEND)(**settings.CALENDAR_BACKEND_OPTIONS)
+                _backend_config = config
+    return _backend
@@ -0,0 +1,156 @@
+import json
+import logging
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from django.conf import settings
+from .quota import RateLimited
+from .utils import APP_EVENT_MARKER, SCOPES
+
+# Google Calendar implementation behind calendar_integration.utils. Import
+# that facade instead of this module so the client libraries stay unloaded
+# until a calendar call is actually made.
+
+logger = logging.getLogger(__name__)
+
+# 403 reasons that mean "slow down", as opposed to a permissions problem
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded'}
+
+def _is_rate_limited(error):
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    details = error.error_details if isinstance(error.error_details, list) else []
+    return error.resp.status == 403 and any(
+        isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS for detail in details
+    )
+
+def _retry_after(error):
+    value = error.resp.get('retry-after', '')
+    return float(value) if value.isdigit() else None
+
+def get_credentials(user):
+
+    """Retrieve and auto-refresh credentials for a user."""
+
+    # Check if the user has a token
+    if not hasattr(user, 'calendar_token'):
+        return None
+
+    token_entry = user.calendar_token
+    creds_data = json.loads(token_entry.token_data)
+    creds = Credentials.from_authorized_user_info(creds_data, SCOPES)
+
+    # Refresh if expired
+    if creds and creds.expired and creds.refresh_token:
+        try:
+            creds.refresh(Request())
+            # Save the fresh token back to DB
+            token_entry.token_data = creds.to_json()
+            token_entry.save()
+        except Exception as e:
+            logger.error(f"Failed to refresh token for {user.username}: {e}")
+            return None
+
+    return creds
+
+def get_service(creds):
+    """Calendar v3 client. GOOGLE_CALENDAR_API_ENDPOINT points it at a fake server in tests."""
+    client_options = None
+    if settings.GOOGLE_CALENDAR_API_ENDPOINT:
+        client_options = {'api_endpoint': settings.GOOGLE_CALENDAR_API_ENDPOINT}
+    return build('calendar', 'v3', credentials=creds, client_options=client_options, cache_discovery=False)
+
+def create_event(user, summary, description, start_dt, end_dt):
+    """Creates a Google Calendar event and returns the Event ID."""
+    creds = get_credentials(user)
+    if not creds:
+        return None
+
+    try:
+        service = get_service(creds)
+        event = {
+            'summary': summary,
+            'description': description,
+            'start': {'dateTime': start_dt.isoformat(), 'timeZone': settings.TIME_ZONE},
+            'end': {'dateTime': end_dt.isoformat(), 'timeZone': settings.TIME_ZONE},
+            'extendedProperties': APP_EVENT_MARKER,
+        }
+        result = service.events().insert(calendarId='primary', body=event).execute()
+        return result.get('id')
+    except HttpError as e:
+        if _is_rate_limited(e):
+            raise RateLimited(f"Rate limited creating event: {e}", _retry_after(e)) from e
+        logger.error(f"Error creating event: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error creating event: {e}")
+        return None
+
+def delete_event(user, event_id):
+    """Deletes an event by ID."""
+    if not event_id: return
+    
+    creds = get_credentials(user)
+    if not creds: return
+
+    try:
+        service = get_service(creds)
+        service.events().delete(calendarId='primary', eventId=event_id).execute()
+    except HttpError as e:
+        if _is_rate_limited(e):
+            raise RateLimited(f"Rate limited deleting event: {e}", _retry_after(e)) from e
+        logger.error(f"Error deleting event: {e}")
+    except Exception as e:
+        logger.error(f"Error deleting event: {e}")
+
+# Calendar API batch requests accept up to 50 calls each
+BATCH_SIZE = 50
+
+def delete_events(user, event_ids):
+    """
+    Deletes many of one user's events using batch requests. Returns how
+    many deletes succeeded; failures are logged, not raised, except rate
+    limiting, which raises RateLimited with the ids still to delete.
+    """
+    event_ids = [event_id for event_id in event_ids if event_id]
+    if not event_ids:
+        return 0
+
+    creds = get_credentials(user)
+    if not creds:
+        return 0
+
+    deleted = 0
+    limited = []
+    def on_response(request_id, response, exception):
+        nonlocal deleted
+        if exception is None:
+            deleted += 1
+        elif _is_rate_limited(exception):
+            limited.append(request_id)
+        else:
+            logger.error(f"Error deleting event {request_id}: {exception}")
+
+    try:
+        service = get_service(creds)
+        for i in range(0, len(event_ids), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for event_id in event_ids[i:i + BATCH_SIZE]:
+                batch.add(service.events().delete(calendarId='primary', eventId=event_id), request_id=event_id)
+            try:
+                batch.execute()
+            except HttpError as e:
+                if not _is_rate_limited(e):
+                    raise
+                # The whole batch was refused: it and every later one are still to do
+                raise RateLimited(f"Rate limited deleting events: {e}", _retry_after(e), limited + event_ids[i:], deleted) from e
+    except RateLimited:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting events for {user.username}: {e}")
+    if limited:
+        raise RateLimited(f"Rate limited deleting {len(limited)} event(s)", None, limited, deleted)
+    return deleted
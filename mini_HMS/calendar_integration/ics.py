@@ -0,0 +1,135 @@
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core import signing
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from appointments.models import AppointmentSlot, AppointmentArchive
+from appointments.changes import get_stamp
+
+# Read-only iCalendar feed: calendar apps poll a signed URL instead of us
+# pushing every booking through the Google API.
+
+FEED_SALT = 'calendar_integration.ics_feed'
+
+# --- SIGNED URLS ---
+
+def feed_token(user):
+    return signing.Signer(salt=FEED_SALT).sign(str(user.id))
+
+def user_id_from_token(token):
+    """Returns the user id or None if the signature does not match."""
+    try:
+        return int(signing.Signer(salt=FEED_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+def feed_url(request, user):
+    return request.build_absolute_uri(reverse('ics_feed', args=[feed_token(user)]))
+
+# --- VERSIONING ---
+
+def feed_stamps(user_id):
+    """A user's feed changes when slots they own as doctor or hold as patient change."""
+    return get_stamp(f"doctor:{user_id}"), get_stamp(f"patient:{user_id}")
+
+def history_start(history_days):
+    """First day of archived history in the feed. Moves every day, so it is part of the version."""
+    return timezone.localdate() - timedelta(days=history_days)
+
+def feed_etag(user_id, history_days):
+    raw = "|".join(repr(s) for s in feed_stamps(user_id))
+    return hashlib.md5(f"{user_id}|{raw}|{history_start(history_days)}".encode(), usedforsecurity=False).hexdigest()
+
+def feed_last_modified(user_id, history_days):
+    changed = datetime.fromtimestamp(max(stamp.changed for stamp in feed_stamps(user_id)), tz=dt_timezone.utc)
+    # The history window last moved at local midnight
+    moved = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+    return max(changed, moved)
+
+# --- RENDERING ---
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def _fold(line):
+    """RFC 5545 3.1: lines longer than 75 octets continue with a leading space."""
+    raw = line.encode('utf-8')
+    if len(raw) <= 75:
+        return line + '\r\n'
+    parts = []
+    while raw:
+        cut = 75 if not parts else 74
+        # Never split inside a multi-byte character
+        while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(raw[:cut].decode('utf-8'))
+        raw = raw[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+def _utc(day, clock):
+    local = timezone.make_aware(datetime.combine(day, clock), timezone.get_current_timezone())
+    return local.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _vevent(slot_id, summary, day, start, end, status, stamp):
+    lines = [
+        'BEGIN:VEVENT',
+        # Archived rows keep their slot's UID so calendars treat them as the same event
+        f"UID:slot-{slot_id}@mini-hms",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_utc(day, start)}",
+        f"DTEND:{_utc(day, end)}",
+        f"SUMMARY:{_escape(summary)}",
+        f"STATUS:{status}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+def _event(slot, user, stamp):
+    if slot.doctor_id == user.id:
+        summary = f"Appointment with {slot.patient.first_name if slot.patient else 'Patient'}"
+    else:
+        summary = f"Appointment with Dr. {slot.doctor.first_name}"
+    status = 'TENTATIVE' if slot.cancel_request_by else 'CONFIRMED'
+    return _vevent(slot.id, summary, slot.date, slot.start_time, slot.end_time, status, stamp)
+
+def _archived_event(row, user, stamp):
+    if row.doctor_id == user.id:
+        summary = f"Appointment with {row.patient_name or 'Patient'}"
+    else:
+        summary = f"Appointment with Dr. {row.doctor_name}"
+    status = 'CONFIRMED' if row.outcome == AppointmentArchive.COMPLETED else 'TENTATIVE'
+    return _vevent(row.slot_id, summary, row.date, row.start_time, row.end_time, status, stamp)
+
+def iter_feed(user, chunk_size, history_days):
+    """
+    Yields the calendar piece by piece; rows are streamed from the DB in
+    chunks. Archived appointments older than `history_days` are left out,
+    so the feed does not grow with the patient's whole history.
+    """
+    stamp = timezone.now().astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(_fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Mini HMS//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        f"X-WR-CALNAME:{_escape('Mini HMS - ' + user.first_name)}",
+    ])
+
+    # History first: archived rows all predate the live ones
+    archived = AppointmentArchive.objects.filter(
+        Q(doctor_id=user.id) | Q(patient_id=user.id),
+        date__gte=history_start(history_days),
+    ).order_by('date', 'start_time')
+
+    for row in archived.iterator(chunk_size=chunk_size):
+        yield _archived_event(row, user, stamp)
+
+    slots = AppointmentSlot.objects.filter(
+        Q(doctor=user, is_booked=True) | Q(patient=user)
+    ).select_related('doctor', 'patient').order_by('date', 'start_time')
+
+    for slot in slots.iterator(chunk_size=chunk_size):
+        yield _event(slot, user, stamp)
+
+    yield _fold('END:VCALENDAR')
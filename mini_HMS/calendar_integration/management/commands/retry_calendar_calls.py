@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from calendar_integration.models import CalendarRetry
+from calendar_integration.quota import run_due
+
+
+class Command(BaseCommand):
+    help = "Replay Calendar API calls that were throttled or rate limited once their backoff has passed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help="Calls picked up per pass.")
+        parser.add_argument('--interval', type=int, default=0, help="Repeat every N seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            # Drain everything that is due before sleeping
+            replayed = 0
+            while True:
+                picked = run_due(limit=options['limit'])
+                replayed += picked
+                if picked < options['limit']:
+                    break
+            self.stdout.write(
+                f"Replayed {replayed} call(s) in {time.monotonic() - started:.2f}s; "
+                f"{CalendarRetry.objects.count()} still queued"
+            )
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from calendar_integration.sync import sync_all
+
+
+class Command(BaseCommand):
+    help = "Pull busy time from connected doctors' Google Calendars and block overlapping slots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Doctors synced in parallel (default: CALENDAR_SYNC_WORKERS).")
+        parser.add_argument('--interval', type=int, default=0, help="Repeat every N seconds instead of running once.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            results = sync_all(workers=options['workers'])
+            for username, result in sorted(results.items()):
+                if isinstance(result, Exception):
+                    self.stderr.write(f"{username}: failed ({result})")
+                elif result is not None:
+                    self.stdout.write(f"{username}: {result} slot(s) changed")
+            self.stdout.write(f"Synced {len(results)} doctor(s) in {time.monotonic() - started:.2f}s")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -6,5 +6,44 @@ class GoogleCalendarToken(models.Model):
     token_data = models.TextField()  # Stores the JSON credentials
     updated_at = models.DateTimeField(auto_now=True)
 
+    # --- INCREMENTAL PULL SYNC (see calendar_integration.sync) ---
+    sync_token = models.TextField(blank=True, null=True)
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Calendar Token for {self.user.username}"
+
+# --- BUSY TIME PULLED FROM GOOGLE ---
+class CalendarBusyBlock(models.Model):
+    """A busy event on a doctor's own calendar; overlapping slots are blocked."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='busy_blocks')
+    event_id = models.CharField(max_length=255)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'event_id')
+        indexes = [models.Index(fields=['user', 'start', 'end'])]
+
+    def __str__(self):
+        return f"Busy {self.user.username}: {self.start} - {self.end}"
+
+# --- CALLS WAITING OUT A RATE LIMIT (see calendar_integration.quota) ---
+class CalendarRetry(models.Model):
+    """An API call deferred by our own throttle or a 403/429 from Google."""
+    CREATE = 'create'
+    DELETE = 'delete'
+    DELETE_MANY = 'delete_many'
+    ACTION_CHOICES = [(CREATE, 'Create event'), (DELETE, 'Delete event'), (DELETE_MANY, 'Delete events')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='calendar_retries')
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    payload = models.JSONField()
+    # Rate-limit responses from Google so far; local throttling does not count
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_at = models.DateTimeField(db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
-        return f"Calendar Token for {self.user.username}"
\ No newline at end of file
+        return f"{self.action} for {self.user.username} at {self.run_at}"
@@ -0,0 +1,193 @@
+import logging
+import random
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from appointments.models import AppointmentSlot
+from mini_HMS import metrics
+from mini_HMS.throttle import TokenBucket
+from .models import CalendarRetry
+
+logger = logging.getLogger(__name__)
+
+# Google Calendar quota handling. Each API request first takes a token
+# from the user's bucket and from the project-wide one; both live in the
+# cache, like the login throttle, so every worker draws from one budget.
+# A call that finds a bucket empty, or that Google answers with 429 or a
+# rate-limit 403, is not dropped: it becomes a CalendarRetry row that
+# `manage.py retry_calendar_calls` replays after an exponential, jittered
+# delay.
+
+THROTTLED = "calendar.throttled"
+RATE_LIMITED = "calendar.rate_limited"
+RETRIED = "calendar.retried"
+ABANDONED = "calendar.retry_abandoned"
+metrics.register(THROTTLED, RATE_LIMITED, RETRIED, ABANDONED)
+
+PROJECT = 'project'
+
+# How long a runner owns the rows it picked up
+LEASE = timedelta(minutes=5)
+
+
+class RateLimited(Exception):
+    """
+    Google refused a call for quota reasons. For batch deletes, `event_ids`
+    are the ones still to delete and `done` how many went through.
+    """
+
+    def __init__(self, message, retry_after=None, event_ids=None, done=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.event_ids = event_ids
+        self.done = done
+
+
+# --- BUCKETS AND BACKOFF ---
+
+def _buckets():
+    config = settings.CALENDAR_API_THROTTLE
+    return (
+        TokenBucket('calendar_user', *config['PER_USER']),
+        TokenBucket('calendar_project', *config['PROJECT']),
+    )
+
+def take_token(user):
+    """Charges one request to `user` and the project. Returns 0, or seconds to wait."""
+    if not settings.CALENDAR_API_THROTTLE['ENABLED']:
+        return 0
+    per_user, project = _buckets()
+    if per_user.consume(user.id) and project.consume(PROJECT):
+        return 0
+    metrics.incr(THROTTLED)
+    return max(per_user.wait_time(user.id), project.wait_time(PROJECT))
+
+def backoff(attempts):
+    """Delay after the `attempts`-th rate-limit response: doubling, capped, jittered."""
+    config = settings.CALENDAR_API_RETRY
+    ceiling = min(config['MAX_DELAY'], config['BASE_DELAY'] * 2 ** (attempts - 1))
+    # Equal jitter: callers limited together spread out, but none retries at once
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+# --- CALLS ---
+
+def _google():
+    from . import google_calendar
+    return google_calendar
+
+def _create(user, payload):
+    return _google().create_event(
+        user, payload['summary'], payload['description'],
+        datetime.fromisoformat(payload['start']), datetime.fromisoformat(payload['end']),
+    )
+
+def _delete(user, payload):
+    return _google().delete_event(user, payload['event_id'])
+
+def _delete_many(user, payload):
+    return _google().delete_events(user, payload['event_ids'])
+
+ACTIONS = {CalendarRetry.CREATE: _create, CalendarRetry.DELETE: _delete, CalendarRetry.DELETE_MANY: _delete_many}
+# What the caller gets back when its call was queued instead
+DEFERRED_RESULT = {CalendarRetry.CREATE: None, CalendarRetry.DELETE: None, CalendarRetry.DELETE_MANY: 0}
+
+
+def _schedule(user, action, payload, delay, error, attempts=0):
+    CalendarRetry.objects.create(
+        user=user, action=action, payload=payload, attempts=attempts,
+        run_at=timezone.now() + timedelta(seconds=delay), last_error=error,
+    )
+
+def call(user, action, payload):
+    """
+    Makes one calendar call if quota allows, else queues it. `payload` must
+    be JSON-serialisable. Returns the call's result, or DEFERRED_RESULT.
+    """
+    wait = take_token(user)
+    if wait:
+        _schedule(user, action, payload, wait, "throttled locally")
+        return DEFERRED_RESULT[action]
+    try:
+        return ACTIONS[action](user, payload)
+    except RateLimited as e:
+        metrics.incr(RATE_LIMITED)
+        if e.event_ids is not None:
+            payload = {'event_ids': e.event_ids}
+        _schedule(user, action, payload, max(e.retry_after or 0, backoff(1)), str(e), attempts=1)
+        return DEFERRED_RESULT[action] if e.done is None else e.done
+
+
+# --- RETRY QUEUE ---
+
+def _slot_for(user, payload):
+    """
+    The booked slot a queued create belongs to, or None if that booking is
+    gone: cancelled, or cancelled and rebooked by someone else, whose event
+    this payload does not describe. Also None once it has its event.
+    """
+    if not payload.get('slot_id'):
+        # Not tied to a booking it could be checked against
+        return None, None
+    slot = AppointmentSlot.objects.filter(
+        Q(doctor=user) | Q(patient=user),
+        pk=payload['slot_id'], patient_id=payload['patient_id'], is_booked=True,
+    ).first()
+    if slot is None:
+        return None, None
+    field = 'doctor_google_event_id' if slot.doctor_id == user.id else 'patient_google_event_id'
+    return (None, None) if getattr(slot, field) else (slot, field)
+
+def _replay(retry):
+    user, payload = retry.user, retry.payload
+    slot = None
+    if retry.action == CalendarRetry.CREATE:
+        slot, field = _slot_for(user, payload)
+        if slot is None:
+            retry.delete()
+            return
+
+    wait = take_token(user)
+    if wait:
+        retry.run_at = timezone.now() + timedelta(seconds=wait)
+        retry.save(update_fields=['run_at'])
+        return
+
+    metrics.incr(RETRIED)
+    try:
+        result = ACTIONS[retry.action](user, payload)
+    except RateLimited as e:
+        metrics.incr(RATE_LIMITED)
+        retry.attempts += 1
+        if retry.attempts >= settings.CALENDAR_API_RETRY['MAX_ATTEMPTS']:
+            logger.error(f"Giving up on calendar {retry.action} for {user.username} after {retry.attempts} attempts: {e}")
+            metrics.incr(ABANDONED)
+            retry.delete()
+            return
+        if e.event_ids is not None:
+            retry.payload = {'event_ids': e.event_ids}
+        retry.run_at = timezone.now() + timedelta(seconds=max(e.retry_after or 0, backoff(retry.attempts)))
+        retry.last_error = str(e)
+        retry.save(update_fields=['attempts', 'payload', 'run_at', 'last_error'])
+        return
+
+    if slot is not None and result:
+        # Only if nothing else filled it in while the call was in flight
+        AppointmentSlot.objects.filter(pk=slot.pk, **{field: None}).update(**{field: result})
+    retry.delete()
+
+def run_due(limit=100):
+    """Replays queued calls whose time has come. Returns how many were picked up."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            CalendarRetry.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(run_at__lte=now).select_related('user').order_by('run_at')[:limit]
+        )
+        # Leased, so another runner skips them while these calls are in flight
+        CalendarRetry.objects.filter(pk__in=[retry.pk for retry in due]).update(run_at=now + LEASE)
+    for retry in due:
+        _replay(retry)
+    return len(due)
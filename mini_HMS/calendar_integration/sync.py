@@ -0,0 +1,195 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from appointments.models import AppointmentSlot
+from appointments.changes import touch_slots
+from appointments.events import publish_slot_event, SLOT_BLOCKED, SLOT_UNBLOCKED
+from .models import CalendarBusyBlock
+from .utils import get_credentials, get_service, sync_calendar
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 250
+
+# --- HELPERS ---
+
+def _event_bounds(item):
+    """Aware (start, end) of a Calendar event, or None if it has no usable times."""
+    start, end = item.get('start', {}), item.get('end', {})
+    if 'dateTime' in start and 'dateTime' in end:
+        return parse_datetime(start['dateTime']), parse_datetime(end['dateTime'])
+    if 'date' in start and 'date' in end:
+        # All-day event: blocks whole local days
+        tz = timezone.get_current_timezone()
+        return (
+            timezone.make_aware(datetime.combine(parse_date(start['date']), time.min), tz),
+            timezone.make_aware(datetime.combine(parse_date(end['date']), time.min), tz),
+        )
+    return None
+
+def _is_busy(item):
+    if item.get('status') == 'cancelled' or item.get('transparency') == 'transparent':
+        return False
+    private = item.get('extendedProperties', {}).get('private', {})
+    return private.get('mini_hms') != '1'
+
+def _overlapping_slots(doctor, start, end):
+    """Slots of `doctor` overlapping [start, end). Slots store naive local date/time."""
+    start = timezone.localtime(start)
+    end = timezone.localtime(end)
+    query = Q()
+    day = start.date()
+    while day <= end.date():
+        lower = start.time() if day == start.date() else time.min
+        if day == end.date():
+            query |= Q(date=day, start_time__lt=end.time(), end_time__gt=lower)
+        else:
+            query |= Q(date=day, end_time__gt=lower)
+        day += timedelta(days=1)
+    return AppointmentSlot.objects.filter(query, doctor=doctor)
+
+def _slot_window(slot):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(slot.date, slot.start_time), tz),
+        timezone.make_aware(datetime.combine(slot.date, slot.end_time), tz),
+    )
+
+# --- DELTA APPLICATION ---
+
+def apply_changes(doctor, items):
+    """
+    Applies one page of changed events: upserts or drops busy blocks, then
+    recomputes is_blocked only for slots touching an old or new interval.
+    Returns the number of slots whose availability flipped.
+    """
+    existing = {
+        block.event_id: block
+        for block in CalendarBusyBlock.objects.filter(user=doctor, event_id__in=[i['id'] for i in items])
+    }
+    touched = []
+
+    with transaction.atomic():
+        for item in items:
+            old = existing.get(item['id'])
+            if old:
+                touched.append((old.start, old.end))
+            bounds = _event_bounds(item) if _is_busy(item) else None
+            if bounds:
+                CalendarBusyBlock.objects.update_or_create(
+                    user=doctor, event_id=item['id'], defaults={'start': bounds[0], 'end': bounds[1]}
+                )
+                touched.append(bounds)
+            elif old:
+                old.delete()
+
+        if not touched:
+            return 0
+
+        query = Q()
+        for start, end in touched:
+            query |= Q(pk__in=_overlapping_slots(doctor, start, end).values('pk'))
+        flipped = []
+        for slot in AppointmentSlot.objects.filter(query):
+            slot_start, slot_end = _slot_window(slot)
+            blocked = CalendarBusyBlock.objects.filter(user=doctor, start__lt=slot_end, end__gt=slot_start).exists()
+            if blocked != slot.is_blocked:
+                slot.is_blocked = blocked
+                flipped.append(slot)
+
+        if flipped:
+            AppointmentSlot.objects.bulk_update(flipped, ['is_blocked'])
+            touch_slots(doctor_id=doctor.id)
+            for slot in flipped:
+                publish_slot_event(SLOT_BLOCKED if slot.is_blocked else SLOT_UNBLOCKED, slot)
+
+    return len(flipped)
+
+# --- PULL SYNC ---
+
+def sync_doctor(doctor):
+    """
+    Pulls changes from the doctor's primary calendar since the stored
+    syncToken (or everything from now on for the first run). Returns the
+    number of slots whose availability changed, or None if not connected.
+    """
+    from googleapiclient.errors import HttpError
+
+    creds = get_credentials(doctor)
+    if not creds:
+        return None
+
+    token_entry = doctor.calendar_token
+    service = get_service(creds)
+    sync_token = token_entry.sync_token
+    page_token = None
+    flipped = 0
+
+    while True:
+        params = {'calendarId': 'primary', 'singleEvents': True, 'showDeleted': True, 'maxResults': PAGE_SIZE}
+        if page_token:
+            params['pageToken'] = page_token
+        if sync_token:
+            params['syncToken'] = sync_token
+        else:
+            params['timeMin'] = timezone.now().isoformat()
+
+        try:
+            result = service.events().list(**params).execute()
+        except HttpError as e:
+            if e.resp.status == 410 and sync_token:
+                # Token expired on Google's side: drop local state and resync fully
+                logger.info(f"Sync token expired for {doctor.username}, running full sync")
+                CalendarBusyBlock.objects.filter(user=doctor).delete()
+                flipped += _unblock_all(doctor)
+                sync_token, page_token = None, None
+                continue
+            raise
+
+        flipped += apply_changes(doctor, result.get('items', []))
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            break
+
+    token_entry.sync_token = result.get('nextSyncToken')
+    token_entry.last_synced_at = timezone.now()
+    token_entry.save(update_fields=['sync_token', 'last_synced_at'])
+    return flipped
+
+def _unblock_all(doctor):
+    blocked = list(AppointmentSlot.objects.filter(doctor=doctor, is_blocked=True))
+    if blocked:
+        AppointmentSlot.objects.filter(pk__in=[s.pk for s in blocked]).update(is_blocked=False)
+        touch_slots(doctor_id=doctor.id)
+        for slot in blocked:
+            publish_slot_event(SLOT_UNBLOCKED, slot)
+    return len(blocked)
+
+def _sync_in_thread(doctor):
+    try:
+        return sync_calendar(doctor)
+    finally:
+        # Each pool thread opens its own DB connection
+        connection.close()
+
+def sync_all(workers=None):
+    """Syncs every connected doctor, at most `workers` at a time. Returns {username: result}."""
+    workers = workers or settings.CALENDAR_SYNC_WORKERS
+    doctors = User.objects.filter(profile__role='doctor', calendar_token__isnull=False).select_related('calendar_token')
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_sync_in_thread, doctor): doctor for doctor in doctors}
+        for future in as_completed(futures):
+            doctor = futures[future]
+            try:
+                results[doctor.username] = future.result()
+            except Exception as e:
+                logger.error(f"Calendar sync failed for {doctor.username}: {e}")
+                results[doctor.username] = e
+    return results
@@ -1,3 +1,402 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import date, datetime, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from appointments.bulk_cancel import cancel_range
+from appointments.changes import touch_slots
+from appointments.models import AppointmentArchive, AppointmentSlot
+from mini_HMS import metrics
+from mini_HMS.bench import import_times
+from mini_HMS.testing import make_doctor, make_patient
+from mini_HMS.throttle import TokenBucket
+from . import quota
+from .backends import CalendarBackend, get_backend
+from .ics import feed_token
+from .models import GoogleCalendarToken, CalendarBusyBlock, CalendarRetry
+from .quota import run_due
+from .sync import sync_doctor
+from .utils import create_event, delete_event
 
-# Create your tests here.
+
+class FakeCalendar:
+    """
+    Just enough of events.list to exercise syncToken handling: every change
+    bumps a sequence number, and a sync token is the sequence it was issued at.
+    Inserts and deletes are recorded; statuses queued in `fail_next` are
+    returned instead, to simulate quota errors.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.seq = 0
+        self.requests = []
+        self.expired_tokens = set()
+        self.inserted = []
+        self.deleted = []
+        self.fail_next = []
+
+    def put(self, event_id, **fields):
+        self.seq += 1
+        self.events[event_id] = dict(fields, id=event_id, seq=self.seq, status=fields.get('status', 'confirmed'))
+
+    def cancel(self, event_id):
+        self.put(event_id, status='cancelled')
+
+    def list(self, params):
+        self.requests.append(params)
+        token = params.get('syncToken')
+        if token in self.expired_tokens:
+            return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid.'}}
+        since = int(token) if token else 0
+        items = [
+            {k: v for k, v in e.items() if k != 'seq'}
+            for e in self.events.values()
+            if e['seq'] > since and (token or e['status'] != 'cancelled')
+        ]
+        return 200, {'items': items, 'nextSyncToken': str(self.seq)}
+
+    def insert(self, event):
+        if self.fail_next:
+            return self.failure(self.fail_next.pop(0))
+        self.inserted.append(event)
+        return 200, dict(event, id=f"g{len(self.inserted)}")
+
+    def delete(self, event_id):
+        if self.fail_next:
+            return self.failure(self.fail_next.pop(0))
+        self.deleted.append(event_id)
+        return 204, None
+
+    def failure(self, status):
+        reason = 'rateLimitExceeded' if status in (403, 429) else 'backendError'
+        return status, {'error': {'code': status, 'message': 'Rate Limit Exceeded', 'errors': [{'reason': reason}]}}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.respond(*self.server.calendar.list(params))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.respond(*self.server.calendar.insert(json.loads(body)))
+
+    def do_DELETE(self):
+        self.respond(*self.server.calendar.delete(urlparse(self.path).path.rsplit('/', 1)[-1]))
+
+    def respond(self, status, body):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeCalendarTestCase(TestCase):
+    """A doctor connected to a FakeCalendar served over HTTP."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCalendarHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.calendar = self.server.calendar = FakeCalendar()
+        self.doctor = make_doctor()
+        GoogleCalendarToken.objects.create(user=self.doctor, token_data=json.dumps({
+            'token': 'fake', 'refresh_token': 'fake', 'client_id': 'fake', 'client_secret': 'fake',
+            'expiry': '2999-01-01T00:00:00Z',
+        }))
+        self.day = date.today() + timedelta(days=3)
+        self.slot = AppointmentSlot.objects.create(doctor=self.doctor, date=self.day, start_time=time(10), end_time=time(10, 30))
+        self.other = AppointmentSlot.objects.create(doctor=self.doctor, date=self.day, start_time=time(11), end_time=time(11, 30))
+
+
+class CalendarSyncTests(FakeCalendarTestCase):
+    def busy(self, event_id, start, end, **fields):
+        self.calendar.put(
+            event_id,
+            start={'dateTime': f"{self.day}T{start}:00+05:30"},
+            end={'dateTime': f"{self.day}T{end}:00+05:30"},
+            **fields,
+        )
+
+    def sync(self):
+        with override_settings(GOOGLE_CALENDAR_API_ENDPOINT=self.endpoint):
+            self.doctor.refresh_from_db()
+            return sync_doctor(self.doctor)
+
+    def test_initial_sync_blocks_overlapping_slots_and_stores_token(self):
+        self.busy('e1', '10:15', '10:45')
+
+        self.assertEqual(self.sync(), 1)
+
+        self.slot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertTrue(self.slot.is_blocked)
+        self.assertFalse(self.other.is_blocked)
+        self.assertEqual(self.doctor.calendar_token.sync_token, '1')
+        self.assertIn('timeMin', self.calendar.requests[0])
+
+    def test_incremental_sync_sends_token_and_applies_only_deltas(self):
+        self.busy('e1', '10:00', '10:30')
+        self.sync()
+
+        self.calendar.cancel('e1')
+        self.busy('e2', '11:00', '12:00')
+        self.assertEqual(self.sync(), 2)
+
+        self.assertEqual(self.calendar.requests[-1]['syncToken'], '1')
+        self.assertNotIn('timeMin', self.calendar.requests[-1])
+        self.slot.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertFalse(self.slot.is_blocked)
+        self.assertTrue(self.other.is_blocked)
+        self.assertEqual(list(CalendarBusyBlock.objects.values_list('event_id', flat=True)), ['e2'])
+
+    def test_events_created_by_the_app_and_free_time_are_ignored(self):
+        self.busy('ours', '10:00', '10:30', extendedProperties={'private': {'mini_hms': '1'}})
+        self.busy('free', '11:00', '11:30', transparency='transparent')
+
+        self.assertEqual(self.sync(), 0)
+        self.assertFalse(CalendarBusyBlock.objects.exists())
+
+    def test_expired_token_falls_back_to_full_sync(self):
+        self.busy('e1', '10:00', '10:30')
+        self.sync()
+        self.calendar.expired_tokens.add('1')
+        self.calendar.cancel('e1')
+
+        self.sync()
+
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_blocked)
+        self.assertIn('timeMin', self.calendar.requests[-1])
+        self.assertFalse(CalendarBusyBlock.objects.exists())
+
+
+class IcsFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.slot = AppointmentSlot.objects.create(
+            doctor=self.doctor, patient=self.patient, is_booked=True,
+            date=date.today() + timedelta(days=3), start_time=time(10), end_time=time(10, 30),
+        )
+        self.url = f'/calendar/feed/{feed_token(self.patient)}.ics'
+
+    def body(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content.decode()
+
+    def test_bad_or_tampered_signatures_are_rejected(self):
+        token = feed_token(self.patient)
+        other_user = token.replace(str(self.patient.id), str(self.doctor.id), 1)
+
+        for bad in (other_user, token[:-1] + ('A' if token[-1] != 'A' else 'B'), 'not-a-token'):
+            self.assertEqual(self.client.get(f'/calendar/feed/{bad}.ics').status_code, 404)
+
+    def test_matching_etag_gets_304_and_any_slot_change_invalidates(self):
+        first = self.client.get(self.url)
+        self.assertIn('STATUS:CONFIRMED', self.body(first))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        # Served from the stored render while nothing changes
+        self.assertFalse(self.client.get(self.url).streaming)
+
+        AppointmentSlot.objects.filter(pk=self.slot.pk).update(cancel_request_by='doctor')
+        touch_slots(doctor_id=self.doctor.id, patient_id=self.patient.id)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:TENTATIVE', self.body(response))
+
+    @override_settings(ICS_FEED_HISTORY_DAYS=90)
+    def test_history_is_limited_to_the_window(self):
+        for slot_id, days_ago in ((1001, 10), (1002, 200)):
+            AppointmentArchive.objects.create(
+                slot_id=slot_id, doctor_id=self.doctor.id, doctor_name='Doc', patient_id=self.patient.id,
+                patient_name='Pat', date=date.today() - timedelta(days=days_ago), start_time=time(9), end_time=time(9, 30),
+                outcome=AppointmentArchive.COMPLETED,
+            )
+
+        body = self.body(self.client.get(self.url))
+
+        self.assertIn('UID:slot-1001@mini-hms', body)
+        self.assertNotIn('UID:slot-1002@mini-hms', body)
+
+    def test_moving_history_window_invalidates_the_etag(self):
+        first = self.client.get(self.url)
+        tomorrow = date.today() + timedelta(days=1)
+
+        with mock.patch('calendar_integration.ics.timezone.localdate', return_value=tomorrow):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+            by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+
+        self.assertEqual((response.status_code, by_date.status_code), (200, 200))
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+
+@override_settings(CALENDAR_API_RETRY={'MAX_ATTEMPTS': 3, 'BASE_DELAY': 2, 'MAX_DELAY': 60})
+class CalendarQuotaTests(FakeCalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        # Buckets and counters live in the cache, which outlives each test
+        cache.clear()
+        patient = make_patient()
+        AppointmentSlot.objects.filter(pk=self.slot.pk).update(is_booked=True, patient=patient)
+        self.endpoint_override = override_settings(GOOGLE_CALENDAR_API_ENDPOINT=self.endpoint)
+        self.endpoint_override.enable()
+        self.addCleanup(self.endpoint_override.disable)
+
+    def create(self):
+        start = datetime.combine(self.day, time(10))
+        self.slot.refresh_from_db()
+        return create_event(self.doctor, 'Appointment', '', start, start + timedelta(minutes=30), slot=self.slot)
+
+    def run_retries(self):
+        CalendarRetry.objects.update(run_at=timezone.now())
+        return run_due()
+
+    def test_rate_limited_create_is_retried_with_backoff_and_attached_to_the_slot(self):
+        self.calendar.fail_next = [429, 403]
+
+        self.assertIsNone(self.create())
+        retry = CalendarRetry.objects.get()
+        self.assertEqual(retry.attempts, 1)
+        self.assertGreaterEqual(retry.run_at, timezone.now() + timedelta(seconds=0.9))
+
+        self.run_retries()
+        retry.refresh_from_db()
+        self.assertEqual(retry.attempts, 2)
+
+        self.run_retries()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.doctor_google_event_id, 'g1')
+        self.assertFalse(CalendarRetry.objects.exists())
+        self.assertEqual(metrics.snapshot()[quota.RATE_LIMITED], 2)
+        self.assertEqual(metrics.snapshot()[quota.RETRIED], 2)
+
+    def test_retry_is_dropped_if_the_appointment_was_cancelled(self):
+        self.calendar.fail_next = [429]
+        self.create()
+        AppointmentSlot.objects.filter(pk=self.slot.pk).update(is_booked=False, patient=None)
+
+        self.run_retries()
+
+        self.assertEqual(self.calendar.inserted, [])
+        self.assertFalse(CalendarRetry.objects.exists())
+
+    def test_retry_is_dropped_if_the_slot_was_rebooked_by_someone_else(self):
+        self.calendar.fail_next = [429]
+        self.create()
+        self.assertEqual(CalendarRetry.objects.get().payload['slot_id'], self.slot.pk)
+        other = make_patient('9000000003', 'other@example.com', 'Other')
+        AppointmentSlot.objects.filter(pk=self.slot.pk).update(patient=other)
+
+        self.run_retries()
+
+        self.assertEqual(self.calendar.inserted, [])
+        self.assertFalse(CalendarRetry.objects.exists())
+
+    def test_calls_over_budget_are_queued_instead_of_sent(self):
+        with override_settings(CALENDAR_API_THROTTLE={'ENABLED': True, 'PER_USER': (1, 0.01), 'PROJECT': (100, 100)}):
+            delete_event(self.doctor, 'e1')
+            delete_event(self.doctor, 'e2')
+
+        self.assertEqual(self.calendar.deleted, ['e1'])
+        self.assertEqual(CalendarRetry.objects.get().payload, {'event_id': 'e2'})
+        self.assertEqual(metrics.snapshot()[quota.THROTTLED], 1)
+
+        # Once the bucket has refilled
+        TokenBucket('calendar_user', 1, 0.01).reset(self.doctor.id)
+        self.run_retries()
+        self.assertEqual(self.calendar.deleted, ['e1', 'e2'])
+
+    def test_gives_up_after_max_attempts(self):
+        self.calendar.fail_next = [429] * 3
+        delete_event(self.doctor, 'e1')
+
+        self.run_retries()
+        with self.assertLogs('calendar_integration.quota', 'ERROR'):
+            self.run_retries()
+
+        self.assertFalse(CalendarRetry.objects.exists())
+        self.assertEqual(metrics.snapshot()[quota.ABANDONED], 1)
+
+
+MEMORY_BACKEND = 'calendar_integration.backends.InMemoryCalendarBackend'
+
+
+class CreateOnlyBackend(CalendarBackend):
+    def create_event(self, user, summary, description, start_dt, end_dt, slot=None):
+        return None
+
+
+@mock.patch('appointments.views.trigger_email')
+@mock.patch('appointments.bulk_cancel.trigger_bulk_email')
+class CalendarBackendTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.day = date.today() + timedelta(days=3)
+        self.slot = AppointmentSlot.objects.create(doctor=self.doctor, date=self.day, start_time=time(10), end_time=time(10, 30))
+        self.client.force_login(self.patient)
+
+    def book(self, key):
+        self.client.post(f'/doctor/book-slot/{self.slot.id}/', {'idempotency_key': key})
+        self.slot.refresh_from_db()
+
+    @override_settings(CALENDAR_BACKEND=MEMORY_BACKEND, CALENDAR_BACKEND_OPTIONS={})
+    def test_memory_backend_records_and_deletes_events(self, *mocks):
+        self.book('backend-book-1')
+
+        calendar = get_backend()
+        self.assertTrue(self.slot.is_booked)
+        self.assertEqual(set(calendar.events), {self.slot.doctor_google_event_id, self.slot.patient_google_event_id})
+
+        cancel_range(self.doctor, self.day, self.day)
+        self.assertEqual(calendar.events, {})
+
+    @override_settings(CALENDAR_BACKEND=MEMORY_BACKEND, CALENDAR_BACKEND_OPTIONS={'failure_rate': 1.0})
+    def test_calendar_failures_do_not_block_booking(self, *mocks):
+        with self.assertLogs('calendar_integration.backends', 'ERROR'):
+            self.book('backend-book-2')
+
+        self.assertTrue(self.slot.is_booked)
+        self.assertIsNone(self.slot.doctor_google_event_id)
+        self.assertEqual(get_backend().failures, 2)
+
+    @override_settings(CALENDAR_BACKEND='calendar_integration.tests.CreateOnlyBackend', CALENDAR_BACKEND_OPTIONS={})
+    def test_incomplete_backend_fails_when_loaded(self, *mocks):
+        with self.assertRaisesMessage(TypeError, 'delete_event'):
+            get_backend()
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_worker_startup_does_not_load_google_client_libraries(self):
+        _, modules = import_times()
+
+        self.assertIn('calendar_integration.views', modules)
+        eager = [name for name in modules if name.startswith(('googleapiclient', 'google.auth', 'google.oauth2', 'google_auth_oauthlib'))]
+        self.assertEqual(eager, [])
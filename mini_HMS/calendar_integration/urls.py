@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('connect/', views.oauth_init, name='connect_calendar'),
     path('callback/', views.oauth_callback, name='calendar_callback'),
+    path('feed/<str:token>.ics', views.ics_feed, name='ics_feed'),
 ]
\ No newline at end of file
@@ -1,68 +1,42 @@
-import json
-import logging
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from django.conf import settings
-from .models import GoogleCalendarToken
+from .backends import get_backend
 
-logger = logging.getLogger(__name__)
-SCOPES = ['https://www.googleapis.com/auth/calendar.events']
-
-def get_credentials(user):
-
-    """Retrieve and auto-refresh credentials for a user."""
+# Calendar facade. Calls go to the backend picked by CALENDAR_BACKEND
+# (see .backends). The Google one lives in .google_calendar, which imports
+# googleapiclient and google-auth; loading those costs every worker tens
+# of milliseconds and several MB at startup, so it is only imported by the
+# first real calendar call.
 
-    # Check if the user has a token
-    if not hasattr(user, 'calendar_token'):
-        return None
+SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 
-    token_entry = user.calendar_token
-    creds_data = json.loads(token_entry.token_data)
-    creds = Credentials.from_authorized_user_info(creds_data, SCOPES)
+# Marks events this app created, so the pull sync does not treat a
+# booking we pushed as the doctor being busy elsewhere.
+APP_EVENT_MARKER = {'private': {'mini_hms': '1'}}
 
-    # Refresh if expired
-    if creds and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            # Save the fresh token back to DB
-            token_entry.token_data = creds.to_json()
-            token_entry.save()
-        except Exception as e:
-            logger.error(f"Failed to refresh token for {user.username}: {e}")
-            return None
 
-    return creds
+def get_credentials(user):
+    """Retrieve and auto-refresh Google credentials for a user."""
+    from . import google_calendar
+    return google_calendar.get_credentials(user)
 
-def create_event(user, summary, description, start_dt, end_dt):
-    """Creates a Google Calendar event and returns the Event ID."""
-    creds = get_credentials(user)
-    if not creds:
-        return None
+def get_service(creds):
+    from . import google_calendar
+    return google_calendar.get_service(creds)
 
-    try:
-        service = build('calendar', 'v3', credentials=creds)
-        event = {
-            'summary': summary,
-            'description': description,
-            'start': {'dateTime': start_dt.isoformat(), 'timeZone': settings.TIME_ZONE},
-            'end': {'dateTime': end_dt.isoformat(), 'timeZone': settings.TIME_ZONE},
-        }
-        result = service.events().insert(calendarId='primary', body=event).execute()
-        return result.get('id')
-    except Exception as e:
-        logger.error(f"Error creating event: {e}")
-        return None
+def create_event(user, summary, description, start_dt, end_dt, slot=None):
+    """
+    Creates a calendar event and returns the Event ID (or None). `slot` is
+    the booking it belongs to, so a deferred call can check it still holds.
+    """
+    return get_backend().create_event(user, summary, description, start_dt, end_dt, slot=slot)
 
 def delete_event(user, event_id):
     """Deletes an event by ID."""
-    if not event_id: return
-    
-    creds = get_credentials(user)
-    if not creds: return
+    get_backend().delete_event(user, event_id)
+
+def delete_events(user, event_ids):
+    """Deletes many of one user's events in batch requests; returns how many succeeded."""
+    return get_backend().delete_events(user, event_ids)
 
-    try:
-        service = build('calendar', 'v3', credentials=creds)
-        service.events().delete(calendarId='primary', eventId=event_id).execute()
-    except Exception as e:
-        logger.error(f"Error deleting event: {e}")
\ No newline at end of file
+def sync_calendar(doctor):
+    """Pulls the doctor's busy time; returns slots changed, or None if unsupported."""
+    return get_backend().sync(doctor)
@@ -1,19 +1,31 @@
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from google_auth_oauthlib.flow import Flow
+from django.views.decorators.http import condition, require_GET
 from .models import GoogleCalendarToken
+from . import ics
+
+from .utils import SCOPES
 
 CLIENT_SECRETS_FILE = "client_secret.json"
-SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 
-def oauth_init(request):
-    """Step 1: Send user to Google"""
-    flow = Flow.from_client_secrets_file(
+def _flow(request, **kwargs):
+    # Imported here: only the two OAuth views need google_auth_oauthlib
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
-        redirect_uri=request.build_absolute_uri(reverse('google_callback_legacy'))
+        redirect_uri=request.build_absolute_uri(reverse('google_callback_legacy')),
+        **kwargs
     )
+
+def oauth_init(request):
+    """Step 1: Send user to Google"""
+    flow = _flow(request)
     auth_url, state = flow.authorization_url(access_type='offline', include_granted_scopes='true', prompt='consent')
     request.session['google_auth_state'] = state
     return redirect(auth_url)
@@ -21,12 +33,7 @@ def oauth_init(request):
 def oauth_callback(request):
     """Step 2: Receive token from Google"""
     state = request.session.get('google_auth_state')
-    flow = Flow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE,
-        scopes=SCOPES,
-        state=state,
-        redirect_uri=request.build_absolute_uri(reverse('google_callback_legacy'))
-    )
+    flow = _flow(request, state=state)
     
     flow.fetch_token(authorization_response=request.build_absolute_uri())
     credentials = flow.credentials
@@ -42,4 +49,44 @@ def oauth_callback(request):
     # Redirect back to the correct dashboard
     if hasattr(request.user, 'profile') and request.user.profile.role == 'doctor':
         return redirect('my_schedule')
-    return redirect('patient_dashboard')
\ No newline at end of file
+    return redirect('patient_dashboard')
+
+# --- ICS SUBSCRIPTION FEED ---
+
+def _feed_user_id(token):
+    user_id = ics.user_id_from_token(token)
+    if user_id is None:
+        raise Http404
+    return user_id
+
+def _feed_etag(request, token):
+    return ics.feed_etag(_feed_user_id(token), settings.ICS_FEED_HISTORY_DAYS)
+
+def _feed_last_modified(request, token):
+    return ics.feed_last_modified(_feed_user_id(token), settings.ICS_FEED_HISTORY_DAYS)
+
+def _stream_and_cache(key, chunks):
+    """Passes chunks through and stores the whole body once the stream completes."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), settings.ICS_FEED_CACHE_TIMEOUT)
+
+@require_GET
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def ics_feed(request, token):
+    """Signed, login-free .ics feed of a user's appointments for calendar apps."""
+    user = get_object_or_404(User, id=_feed_user_id(token))
+    key = f"ics_feed:{user.id}:{ics.feed_etag(user.id, settings.ICS_FEED_HISTORY_DAYS)}"
+    content_type = 'text/calendar; charset=utf-8'
+
+    cached = cache.get(key)
+    if cached is not None:
+        response = HttpResponse(cached, content_type=content_type)
+    else:
+        chunks = ics.iter_feed(user, settings.ICS_FEED_CHUNK_SIZE, settings.ICS_FEED_HISTORY_DAYS)
+        response = StreamingHttpResponse(_stream_and_cache(key, chunks), content_type=content_type)
+
+    response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    return response
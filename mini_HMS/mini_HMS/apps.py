@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class MiniHMSConfig(AppConfig):
+    name = 'mini_HMS'
+
+    def ready(self):
+        # Registers the vendored-asset and throttle-cache system checks
+        import mini_HMS.assets
+        import mini_HMS.throttle
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
+
+Live slot updates (/api/events/slots/) are long-lived async streams and
+should be served from this entry point, e.g.:
+
+    uvicorn mini_HMS.asgi:application
 """
 
 import os
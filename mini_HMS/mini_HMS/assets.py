@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error, Tags, Warning, register
+from django.templatetags.static import static
+
+# Third-party CSS/JS that base.html used to pull from CDNs. `manage.py
+# vendor_assets` downloads them (plus the fonts their CSS references) into
+# static/vendor/ at build time; collectstatic then hashes and compresses
+# them with everything else. Pages link the local copies where they exist
+# and the CDN otherwise, unless VENDOR_ASSETS_MODE says otherwise; in
+# 'local' mode the checks below flag a build that skipped the vendoring
+# step.
+
+VENDOR_ASSETS = {
+    'bootstrap_css': {
+        'url': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'path': 'vendor/bootstrap/bootstrap.min.css',
+    },
+    'bootstrap_js': {
+        'url': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'path': 'vendor/bootstrap/bootstrap.bundle.min.js',
+    },
+    'bootstrap_icons_css': {
+        'url': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+        'path': 'vendor/bootstrap-icons/bootstrap-icons.css',
+    },
+    'poppins_css': {
+        'url': 'https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700&display=swap',
+        'path': 'vendor/poppins/poppins.css',
+    },
+}
+
+# Google Fonts only serves woff2 to browsers it recognises
+FETCH_HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'}
+
+CSS_URL_RE = re.compile(r"url\((['\"]?)([^'\")]+)\1\)")
+SOURCE_MAP_RE = re.compile(r"/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S+")
+
+# --- PAGE HELPERS ---
+
+@lru_cache(maxsize=None)
+def _vendored(path):
+    return finders.find(path) is not None
+
+def asset_urls():
+    """{name: url} for base.html: the local copy if vendored, else the CDN."""
+    mode = settings.VENDOR_ASSETS_MODE
+    urls = {}
+    for name, asset in VENDOR_ASSETS.items():
+        local = mode == 'local' or (mode == 'auto' and _vendored(asset['path']))
+        urls[name] = static(asset['path']) if local else asset['url']
+    return urls
+
+# --- BUILD CHECKS ---
+
+def missing_assets():
+    """Vendor paths the pages link to locally but that are not in the static sources."""
+    if settings.VENDOR_ASSETS_MODE != 'local':
+        return []
+    return [asset['path'] for asset in VENDOR_ASSETS.values() if finders.find(asset['path']) is None]
+
+def _missing_hint(missing):
+    return f"Not vendored: {', '.join(missing)}. Run `manage.py vendor_assets` before collectstatic."
+
+@register(Tags.staticfiles)
+def check_vendor_assets(app_configs, **kwargs):
+    missing = missing_assets()
+    return [Warning(_missing_hint(missing), id='mini_HMS.W001')] if missing else []
+
+@register(Tags.staticfiles, deploy=True)
+def check_vendor_assets_deploy(app_configs, **kwargs):
+    # `check --deploy` fails the build instead of shipping pages with broken styles
+    missing = missing_assets()
+    return [Error(_missing_hint(missing), id='mini_HMS.E001')] if missing else []
+
+# --- MINIFICATION (used by mini_HMS.storage at collectstatic time) ---
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    # Only after ':' - a space before it can be a descendant combinator
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+# --- VENDORING (build time only) ---
+
+def _fetch(url):
+    import requests
+    response = requests.get(url, headers=FETCH_HEADERS, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def vendor_asset(name, target_root, log=print):
+    """Downloads one asset into target_root; CSS dependencies are localised too."""
+    asset = VENDOR_ASSETS[name]
+    target = Path(target_root) / asset['path']
+    target.parent.mkdir(parents=True, exist_ok=True)
+    body = _fetch(asset['url'])
+
+    if target.suffix in ('.css', '.js'):
+        text = SOURCE_MAP_RE.sub('', body.decode('utf-8'))
+        if target.suffix == '.css':
+            text = _localise_css_urls(text, asset['url'], target.parent, log)
+        body = text.encode('utf-8')
+
+    target.write_bytes(body)
+    log(f"  {asset['path']} ({len(body)} bytes)")
+
+def _localise_css_urls(css, source_url, target_dir, log):
+    """Downloads every url(...) in `css` next to it and rewrites the reference."""
+    def replace(match):
+        ref = match.group(2)
+        if ref.startswith('data:'):
+            return match.group(0)
+        absolute = urljoin(source_url, ref)
+        parts = urlsplit(absolute)
+        if parts.netloc == urlsplit(source_url).netloc and not ref.startswith(('http:', 'https:', '//')):
+            local = ref.split('?')[0].split('#')[0]
+        else:
+            local = 'files/' + parts.path.rsplit('/', 1)[-1]
+        destination = target_dir / local
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if not destination.exists():
+            destination.write_bytes(_fetch(absolute.split('#')[0]))
+            log(f"    {destination.relative_to(target_dir)}")
+        return f'url("{local}")'
+
+    return CSS_URL_RE.sub(replace, css)
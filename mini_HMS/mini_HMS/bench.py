@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.test import override_settings
+
+# Shared helpers for the bench_* management commands. Benchmarks run
+# against the configured database but never leave rows behind.
+
+class Rollback(Exception):
+    pass
+
+@contextmanager
+def scratch_data():
+    """
+    Everything written inside the block is rolled back afterwards. Also
+    admits django.test.Client's 'testserver' host.
+    """
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+def timed(fn, repeat):
+    """Calls fn() `repeat` times; returns (total_seconds, per_second)."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - started
+    return elapsed, (repeat / elapsed if elapsed else 0.0)
+
+# What a worker process does before serving: build the WSGI application
+# and load the URLconf, which imports every view module.
+WORKER_STARTUP = (
+    "import mini_HMS.wsgi\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns"
+)
+
+def import_times(code=WORKER_STARTUP):
+    """
+    Runs `code` in a fresh interpreter under -X importtime. Returns
+    (wall_seconds, {module: cumulative_microseconds}).
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(), check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return elapsed, modules
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+# Admin changelists over large tables. Django's paginator runs an exact
+# COUNT(*) on every page view, which reads the whole table. Unfiltered
+# lists use the planner's row estimate instead; filtered ones stop
+# counting at ADMIN_EXACT_COUNT_LIMIT rows, so narrowing the filter is how
+# to page past that. date_hierarchy drill-downs likewise run SELECT
+# DISTINCT over every matching row; CalendarDatesQuerySet answers them
+# from the first and last date alone.
+#
+# Search is by prefix only. `field__startswith` compiles to LIKE ... ESCAPE,
+# which SQLite will not answer from an index, so prefix_filter() asks for
+# the same rows as a range the index can seek to.
+
+
+def estimated_rows(model):
+    """The database's own estimate of the table's size, or None if it has none."""
+    connection = connections[model.objects.db]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table]),
+        'mysql': (
+            "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+            [table],
+        ),
+        # Only present once ANALYZE has run; the first number is the row count
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    sql, params = queries[connection.vendor]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # Postgres reports -1 for a table that was never analyzed
+    return estimate if estimate >= 0 else None
+
+
+def prefix_filter(field, prefix):
+    """
+    Q for values of `field` starting with `prefix`: field >= prefix and
+    < the next string of that length, compared in code point order.
+    """
+    upper = prefix.rstrip(chr(0x10FFFF))
+    if not upper:
+        return Q(**{f'{field}__gte': prefix})
+    upper = upper[:-1] + chr(ord(upper[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset.model)
+            # Small tables are cheap to count, and estimates are least accurate there
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
+
+
+class CalendarDatesQuerySet(QuerySet):
+    """
+    dates() from the first and last value alone, each one index seek:
+    every year, month or day between them, including any that happen to be
+    empty.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        values = self.order_by().values_list(field_name, flat=True)
+        # Two ORDER BY ... LIMIT 1 queries: some databases only turn a lone
+        # MIN() or MAX() into an index seek, not both in one query
+        current = values.order_by(field_name).first()
+        if current is None:
+            return []
+        last = values.order_by(f'-{field_name}').first()
+        if kind == 'year':
+            current = current.replace(month=1, day=1)
+        elif kind == 'month':
+            current = current.replace(day=1)
+
+        periods = []
+        while current <= last:
+            periods.append(current)
+            if kind == 'day':
+                current += timedelta(days=1)
+            elif kind == 'month':
+                current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+            else:
+                current = current.replace(year=current.year + 1)
+        return periods if order == 'ASC' else periods[::-1]
+
+    @classmethod
+    def wrap(cls, queryset):
+        return cls(model=queryset.model, query=queryset.query, using=queryset._db)
+
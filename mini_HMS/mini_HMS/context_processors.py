@@ -0,0 +1,5 @@
+from .assets import asset_urls
+
+def vendor_assets(request):
+    """Exposes {{ vendor.bootstrap_css }} etc. to every template."""
+    return {'vendor': asset_urls()}
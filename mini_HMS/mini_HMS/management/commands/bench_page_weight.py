@@ -0,0 +1,82 @@
+import gzip
+import os
+import re
+import time
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from mini_HMS.assets import VENDOR_ASSETS
+from mini_HMS.bench import scratch_data
+from mini_HMS.views import HASHED_NAME_RE
+
+ASSET_RE = re.compile(r'<(?:link[^>]*?href|script[^>]*?src)="([^"]+)"')
+CDN_TO_LOCAL = {asset['url']: asset['path'] for asset in VENDOR_ASSETS.values()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the home page's first-level asset weight and a modelled first render "
+        "between CDN assets and the local hashed/compressed pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rtt-ms', type=float, default=150.0, help="Round trip time of the modelled connection.")
+        parser.add_argument('--kbps', type=float, default=1600.0, help="Downstream bandwidth of the modelled connection.")
+
+    def handle(self, *args, **options):
+        self.rtt = options['rtt_ms'] / 1000
+        self.bytes_per_second = options['kbps'] * 1000 / 8
+
+        with scratch_data():
+            for label, mode in (('before: CDN', 'cdn'), ('after: local pipeline', 'auto')):
+                with override_settings(VENDOR_ASSETS_MODE=mode):
+                    self.report(label, *self.measure())
+
+        self.stdout.write(
+            "\nSizes of CDN assets are taken from the vendored copies (gzip, as CDNs serve them). "
+            "Render time is modelled: 3 RTTs per new origin, 1 RTT per request wave, bytes / bandwidth."
+        )
+
+    def measure(self):
+        started = time.perf_counter()
+        response = Client().get('/')
+        server_ms = (time.perf_counter() - started) * 1000
+        html = response.content
+        assets = [self.asset_size(url) for url in ASSET_RE.findall(html.decode('utf-8'))]
+        return server_ms, len(gzip.compress(html)), assets
+
+    def asset_size(self, url):
+        """(url, origin or None for same-origin, transferred bytes or None, immutable?)"""
+        if url.startswith(('http://', 'https://')):
+            local = CDN_TO_LOCAL.get(url)
+            path = finders.find(local) if local else None
+            size = len(gzip.compress(open(path, 'rb').read())) if path else None
+            return url, urlsplit(url).netloc, size, False
+
+        name = url[len(settings.STATIC_URL.rstrip('/')) + 1:] if url.startswith('/' + settings.STATIC_URL.lstrip('/')) else url
+        collected = os.path.join(settings.STATIC_ROOT, name)
+        for candidate in (collected + '.br', collected + '.gz', collected):
+            if os.path.isfile(candidate):
+                return url, None, os.path.getsize(candidate), bool(HASHED_NAME_RE.search(name))
+        source = finders.find(name.split('?')[0])
+        size = len(gzip.compress(open(source, 'rb').read())) if source else None
+        return url, None, size, False
+
+    def report(self, label, server_ms, html_bytes, assets):
+        origins = {origin for _, origin, _, _ in assets if origin}
+        total = html_bytes + sum(size or 0 for _, _, size, _ in assets)
+        # HTML round trip, then one wave for its assets plus setup for every extra origin
+        modelled = (2 + 3 * len(origins)) * self.rtt + total / self.bytes_per_second
+        revalidated = sum(1 for _, _, _, immutable in assets if not immutable)
+
+        self.stdout.write(f"\n{label}")
+        for url, origin, size, immutable in assets:
+            shown = f"{size:>8} B" if size is not None else "       ? B"
+            self.stdout.write(f"  {shown}  {'immutable ' if immutable else ''}{url}")
+        self.stdout.write(
+            f"  total {total} B over {1 + len(assets)} requests, {len(origins)} third-party origin(s); "
+            f"server render {server_ms:.1f} ms; modelled first render {modelled * 1000:.0f} ms; "
+            f"{revalidated} asset(s) revalidated on repeat visits"
+        )
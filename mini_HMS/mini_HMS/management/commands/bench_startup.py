@@ -0,0 +1,44 @@
+import statistics
+from django.core.management.base import BaseCommand
+from mini_HMS.bench import import_times
+
+# Libraries that should only load on first use (see calendar_integration.utils)
+LAZY_PREFIXES = ('googleapiclient', 'google.', 'google_auth_oauthlib', 'requests', 'smtplib')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker start-up (mini_HMS.wsgi plus the URLconf) with -X importtime and "
+        "list the most expensive imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        walls, runs = [], []
+        for _ in range(options['runs']):
+            wall, modules = import_times()
+            walls.append(wall)
+            runs.append(modules)
+
+        self.stdout.write(
+            f"worker start-up: median {statistics.median(walls) * 1000:.0f} ms, "
+            f"min {min(walls) * 1000:.0f} ms over {options['runs']} runs (interpreter included)"
+        )
+
+        # Median cumulative time per module across runs
+        medians = {
+            name: statistics.median(run.get(name, 0) for run in runs)
+            for name in runs[0]
+        }
+        self.stdout.write(f"\nheaviest imports (cumulative, includes children):")
+        for name, us in sorted(medians.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {us / 1000:8.1f} ms  {name}")
+
+        eager = sorted(name for name in runs[0] if name.startswith(LAZY_PREFIXES))
+        if eager:
+            self.stdout.write(self.style.WARNING(f"\nloaded at start-up but meant to be lazy: {', '.join(eager)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("\nno Google client, requests or smtplib modules loaded at start-up"))
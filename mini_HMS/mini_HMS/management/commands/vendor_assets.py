@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from requests.exceptions import RequestException
+from mini_HMS.assets import VENDOR_ASSETS, vendor_asset
+
+
+class Command(BaseCommand):
+    help = (
+        "Download Bootstrap, Bootstrap Icons and the Poppins font (with the files their CSS "
+        "references) into static/vendor/. Run at build time, then collectstatic; pages no "
+        "longer touch third-party CDNs at runtime."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', default=str(settings.STATICFILES_DIRS[0]), help="Static source directory to write into.")
+
+    def handle(self, *args, **options):
+        for name in VENDOR_ASSETS:
+            self.stdout.write(name)
+            try:
+                vendor_asset(name, options['target'], log=self.stdout.write)
+            except RequestException as e:
+                raise CommandError(f"Could not download {name}: {e}")
+        self.stdout.write(self.style.SUCCESS("Vendored. Now run: python manage.py collectstatic --noinput"))
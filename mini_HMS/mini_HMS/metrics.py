@@ -0,0 +1,44 @@
+from django.core.cache import cache
+
+# Counters live in the configured cache so every worker sharing the
+# backend reports the same numbers.
+METRIC_PREFIX = "metrics:"
+
+# Every counter a module intends to bump is registered at import time,
+# so the metrics view knows which keys to read back.
+REGISTERED_METRICS = set()
+
+
+def register(*names):
+    """Declare counter names so they show up in snapshot()."""
+    REGISTERED_METRICS.update(names)
+
+
+def incr(name, delta=1):
+    """Increment a counter, creating it on first use."""
+    key = METRIC_PREFIX + name
+    REGISTERED_METRICS.add(name)
+    if cache.add(key, delta, timeout=None):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Key expired or was evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+def snapshot():
+    """Returns {name: value} for every registered counter."""
+    names = sorted(REGISTERED_METRICS)
+    values = cache.get_many([METRIC_PREFIX + name for name in names])
+    return {name: values.get(METRIC_PREFIX + name, 0) for name in names}
+
+
+def reset():
+    cache.delete_many([METRIC_PREFIX + name for name in REGISTERED_METRICS])
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from . import metrics
+
+# Bumped by users.signals whenever doctor data changes. Every cached
+# fragment embeds the version in its key, so a bump orphans the old
+# entries instead of having to find and delete them.
+DOCTOR_VERSION_KEY = "page_cache:doctor_version"
+
+metrics.register("page_cache.hits", "page_cache.misses")
+
+
+def get_doctor_version():
+    version = cache.get(DOCTOR_VERSION_KEY)
+    if version is None:
+        cache.add(DOCTOR_VERSION_KEY, 1, timeout=None)
+        version = cache.get(DOCTOR_VERSION_KEY, 1)
+    return version
+
+
+def bump_doctor_version():
+    try:
+        return cache.incr(DOCTOR_VERSION_KEY)
+    except ValueError:
+        # Nothing cached yet, so there is nothing to invalidate
+        cache.add(DOCTOR_VERSION_KEY, 1, timeout=None)
+        return get_doctor_version()
+
+
+def role_for(user):
+    """Cache partition for a user: 'anonymous', 'doctor' or 'patient'."""
+    if not user.is_authenticated:
+        return "anonymous"
+    return "doctor" if user.is_doctor else "patient"
+
+
+def cached_fragment(request, name, template_name, build_context=None):
+    """
+    Renders `template_name` once per (role, doctor version) and serves the
+    stored HTML afterwards. `build_context` is only called on a miss, so
+    the queries it sets up never run while the fragment is cached.
+
+    Fragments must not contain per-user output such as {% csrf_token %}.
+    """
+    role = role_for(request.user)
+    key = f"page_cache:{name}:{role}:v{get_doctor_version()}"
+
+    html = cache.get(key)
+    if html is None:
+        metrics.incr("page_cache.misses")
+        context = build_context() if build_context else {}
+        context["cache_role"] = role
+        html = render_to_string(template_name, context, request=request)
+        cache.set(key, html, settings.PAGE_CACHE_TIMEOUT)
+    else:
+        metrics.incr("page_cache.hits")
+
+    return mark_safe(html)
+
+
+def hit_ratio():
+    stats = metrics.snapshot()
+    return metrics.ratio(stats.get("page_cache.hits", 0), stats.get("page_cache.misses", 0))
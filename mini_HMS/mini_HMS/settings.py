@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
     'users',
     'appointments',
     'calendar_integration',
+    # Project-level management commands (vendor_assets, bench_page_weight)
+    'mini_HMS',
 ]
 
 MIDDLEWARE = [
@@ -51,25 +54,51 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'mini_HMS.template_timing.render_timing_middleware',
 ]
 
 ROOT_URLCONF = 'mini_HMS.urls'
 
+# HMS_TEMPLATES: 'cached' (default) compiles each template once per
+# process; 'reload' re-reads templates from disk on every render, for
+# working on them with runserver.
+TEMPLATE_LOADER_PROFILES = {
+    'cached': [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ],
+    'reload': [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ],
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADER_PROFILES[os.environ.get('HMS_TEMPLATES', 'cached')],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'mini_HMS.context_processors.vendor_assets',
             ],
         },
     },
 ]
 
+# Render time per template and per {% block %}, added to the shared
+# metrics at the end of each request (see mini_HMS.template_timing). A
+# timed request costs two cache writes per template and block rendered,
+# so it is a profiling aid: off by default, and HMS_TEMPLATE_TIMING_SAMPLE
+# times only that fraction of requests when it is on.
+TEMPLATE_TIMING = os.environ.get('HMS_TEMPLATE_TIMING', '0') == '1'
+TEMPLATE_TIMING_SAMPLE = float(os.environ.get('HMS_TEMPLATE_TIMING_SAMPLE', '1'))
+
 WSGI_APPLICATION = 'mini_HMS.wsgi.application'
 
 
@@ -84,6 +113,207 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# HMS_CACHE picks the backend: 'locmem' (per process, default), 'file'
+# (shared by every worker on a single node) or 'redis' (shared across
+# nodes; needs the redis package). The metrics counters are only global
+# when the backend is shared. Throttling needs atomic counters as well,
+# which only redis gives across workers (see mini_HMS.throttle).
+
+CACHE_PROFILES = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mini-hms',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('HMS_CACHE_DIR', str(BASE_DIR / '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('HMS_REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_PROFILES[os.environ.get('HMS_CACHE', 'locmem')],
+}
+
+# Seconds a rendered home/find_doctor fragment is kept. Doctor changes
+# invalidate it earlier through the version counter in mini_HMS.page_cache.
+PAGE_CACHE_TIMEOUT = 60 * 15
+
+
+# Live slot updates (Server-Sent Events)
+# The in-process broker only reaches clients connected to the same worker;
+# point this at a shared implementation of appointments.events.SlotEventBroker
+# when running several ASGI workers.
+
+SLOT_EVENT_BROKER = 'appointments.events.InProcessBroker'
+SLOT_EVENT_HEARTBEAT = 15
+SLOT_EVENT_MAX_DOCTORS = 50
+
+
+# Google Calendar
+# Override the API endpoint to run against a local fake server.
+
+GOOGLE_CALENDAR_API_ENDPOINT = os.environ.get('GOOGLE_CALENDAR_API_ENDPOINT')
+
+# HMS_CALENDAR_BACKEND: 'google' (default), 'none' to turn external
+# calendars off, or 'memory', an in-process fake whose latency and failure
+# rate come from HMS_CALENDAR_LATENCY (seconds) and
+# HMS_CALENDAR_FAILURE_RATE (0-1), for load tests and benchmarks.
+CALENDAR_BACKEND_PROFILES = {
+    'google': 'calendar_integration.backends.GoogleCalendarBackend',
+    'none': 'calendar_integration.backends.NullCalendarBackend',
+    'memory': 'calendar_integration.backends.InMemoryCalendarBackend',
+}
+CALENDAR_BACKEND = CALENDAR_BACKEND_PROFILES[os.environ.get('HMS_CALENDAR_BACKEND', 'google')]
+CALENDAR_BACKEND_OPTIONS = {}
+if CALENDAR_BACKEND == CALENDAR_BACKEND_PROFILES['memory']:
+    CALENDAR_BACKEND_OPTIONS = {
+        'latency': float(os.environ.get('HMS_CALENDAR_LATENCY', 0)),
+        'failure_rate': float(os.environ.get('HMS_CALENDAR_FAILURE_RATE', 0)),
+    }
+
+# Doctors synced in parallel by `manage.py sync_calendars`
+CALENDAR_SYNC_WORKERS = 4
+
+# Calendar API budget, as (capacity, refill per second) token buckets
+# shared through the cache (which, as for LOGIN_THROTTLE, must be redis
+# with more than one worker). Google allows roughly 600 requests a minute
+# per user and 10,000 per project by default; stay under both.
+CALENDAR_API_THROTTLE = {
+    'ENABLED': True,
+    'PER_USER': (20, 5),
+    'PROJECT': (100, 100),
+}
+
+# Calls refused by the throttle or by Google (429 / rate-limit 403) are
+# queued and replayed by `manage.py retry_calendar_calls`. Delays in seconds.
+CALENDAR_API_RETRY = {
+    'MAX_ATTEMPTS': 8,
+    'BASE_DELAY': 2,
+    'MAX_DELAY': 600,
+}
+
+# .ics subscription feed: rows fetched per DB round trip while streaming,
+# how long a rendered feed is kept (it is also dropped on any change), and
+# how many days of archived appointments it still lists.
+ICS_FEED_CHUNK_SIZE = 500
+ICS_FEED_CACHE_TIMEOUT = 60 * 60 * 24
+ICS_FEED_HISTORY_DAYS = 90
+
+# `manage.py archive_appointments` moves booked slots older than this many
+# days into AppointmentArchive, one transaction per chunk. Dashboards show
+# the latest APPOINTMENT_HISTORY_LIMIT archived appointments.
+APPOINTMENT_ARCHIVE_AFTER_DAYS = 30
+APPOINTMENT_ARCHIVE_CHUNK_SIZE = 1000
+APPOINTMENT_HISTORY_LIMIT = 20
+
+# A waitlist offer leaves the slot open to everyone; if the patient has not
+# booked it within this many minutes, `manage.py expire_waitlist_offers`
+# puts them back in line and offers the slot to the next waiter.
+WAITLIST_OFFER_MINUTES = 120
+
+# Per-doctor daily rollups (appointments.stats) behind the statistics page,
+# which shows at most this many days. `manage.py rebuild_doctor_stats`
+# recomputes them this many doctors per transaction.
+DOCTOR_STATS_MAX_DAYS = 366
+DOCTOR_STATS_REBUILD_CHUNK_SIZE = 100
+
+# Rows fetched per DB round trip by the streaming appointment export
+# (/doctor/export/ and `manage.py export_appointments`)
+APPOINTMENT_EXPORT_CHUNK_SIZE = 2000
+
+# Admin changelists (mini_HMS.changelist): unfiltered pages show the
+# database's row estimate; filtered ones count at most this many rows.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Stored responses of idempotent POSTs (booking, cancelling) are replayed
+# for this long; `manage.py purge_idempotency_keys` drops older rows.
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# Seconds a key's first request may run before a retry may assume it died
+# and run the view itself. Keep it above the worker timeout, or a slow
+# request could run twice.
+IDEMPOTENCY_LEASE = 120
+
+
+# Sessions and messages
+# https://docs.djangoproject.com/en/6.0/topics/http/sessions/
+# HMS_SESSION: 'cached_db' (default; reads from cache, writes through to
+# the DB), 'db', 'cache' (no DB at all; needs a shared cache) or
+# 'signed_cookies' (no server-side state). HMS_MESSAGES: 'cookie' keeps
+# flash messages out of the session entirely, 'fallback' spills oversize
+# messages into it, 'session' always stores them there.
+
+SESSION_PROFILES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+MESSAGE_STORAGE_PROFILES = {
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+}
+
+SESSION_ENGINE = SESSION_PROFILES[os.environ.get('HMS_SESSION', 'cached_db')]
+MESSAGE_STORAGE = MESSAGE_STORAGE_PROFILES[os.environ.get('HMS_MESSAGES', 'cookie')]
+
+# Rows removed per DELETE by `manage.py purge_sessions`
+SESSION_PURGE_BATCH_SIZE = 1000
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/6.0/topics/auth/passwords/
+# HMS_PASSWORD_HASHER picks the hasher new passwords use. The others stay
+# listed so existing hashes still verify; Django rehashes them with the
+# preferred hasher on the next successful login.
+
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'mini_HMS.hashers.TunablePBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',  # needs argon2-cffi
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    # Tests and benchmarks only: fast and insecure
+    'md5': 'django.contrib.auth.hashers.MD5PasswordHasher',
+}
+
+PREFERRED_PASSWORD_HASHER = PASSWORD_HASHER_PROFILES[os.environ.get('HMS_PASSWORD_HASHER', 'pbkdf2')]
+
+PASSWORD_HASHERS = [PREFERRED_PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'mini_HMS.hashers.TunablePBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    )
+    if hasher != PREFERRED_PASSWORD_HASHER
+]
+
+# PBKDF2 cost; None keeps Django's default for the installed version
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ['HMS_PBKDF2_ITERATIONS']) if os.environ.get('HMS_PBKDF2_ITERATIONS') else None
+
+
+# Login throttling
+# Token buckets checked before the password hash runs: (burst, tokens
+# refilled per second) per mobile number and per client IP. The budgets
+# live in the default cache, so with more than one worker it must be
+# redis: the file backend's increments are not atomic, and locmem gives
+# each worker its own budget. `manage.py check` enforces this.
+
+LOGIN_THROTTLE = {
+    'ENABLED': True,
+    'PER_MOBILE': (5, 1 / 60),
+    'PER_IP': (30, 1 / 2),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -122,4 +352,28 @@ STATIC_URL = 'static/'
 
 STATICFILES_DIRS = [
     BASE_DIR / "static",
-]
\ No newline at end of file
+]
+
+# `manage.py collectstatic` writes minified, content-hashed files plus
+# .gz/.br variants here. serve_static answers for them with far-future
+# immutable caching when HMS_SERVE_STATIC is on (the default).
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "mini_HMS.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
+SERVE_STATIC = os.environ.get('HMS_SERVE_STATIC', '1') == '1'
+
+# Bootstrap, icons and fonts: 'auto' (default) serves the copies `manage.py
+# vendor_assets` places in static/vendor/ and falls back to the CDN for any
+# that are missing, as in a fresh checkout (static/vendor/ is not
+# committed). 'local' never uses the CDN, and `manage.py check` reports
+# missing copies (`check --deploy` fails on them); set it once the build
+# runs vendor_assets. 'cdn' always uses the CDN.
+VENDOR_ASSETS_MODE = os.environ.get('HMS_VENDOR_ASSETS', 'auto')
\ No newline at end of file
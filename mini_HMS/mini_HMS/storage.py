@@ -0,0 +1,69 @@
+import gzip
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from .assets import minify_css
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.json', '.map', '.ttf', '.eot')
+MIN_COMPRESS_SIZE = 512
+
+
+class _MinifiedSource:
+    """Wraps a finder's storage so hashing and saving see minified CSS."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def open(self, path, mode='rb'):
+        original = self.storage.open(path, mode)
+        if not path.endswith('.css') or '.min.' in path:
+            return original
+        with original:
+            return ContentFile(minify_css(original.read().decode('utf-8')).encode('utf-8'), name=path)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic output: minified CSS, content-hashed names (so files can
+    be cached forever) and .gz/.br siblings for mini_HMS.views.serve_static.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        paths = {name: (_MinifiedSource(storage), path) for name, (storage, path) in paths.items()}
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if not dry_run:
+            for hashed_name in set(self.hashed_files.values()):
+                self._write_compressed(hashed_name)
+
+    def _write_compressed(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+    def stored_name(self, name):
+        # Before the first collectstatic there is no manifest; serve the plain
+        # name instead of failing every page that uses {% static %}.
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            return name
@@ -0,0 +1,147 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Template
+from django.template.loader_tags import BlockNode
+from django.utils.decorators import sync_and_async_middleware
+from . import metrics
+
+# Render timing. Template._render and BlockNode.render are wrapped so every
+# template (including {% include %}d ones) and every {% block %} adds its
+# elapsed time to a per-request dict; the middleware adds those totals to
+# the shared metrics once the response is ready. Times are inclusive: a
+# page's figure contains the includes and blocks rendered inside it.
+# With TEMPLATE_TIMING_SAMPLE below 1 only that share of requests is
+# timed; the figures are per timed request, so averages stay comparable.
+
+REQUEST_COUNT = "request.count"
+REQUEST_TIME = "request.time_us"
+
+_timings = ContextVar('template_timings', default=None)
+_installed = False
+
+
+def _record(label, elapsed):
+    timings = _timings.get()
+    if timings is None:
+        # Rendering outside a request (emails, management commands)
+        return
+    entry = timings.setdefault(label, [0, 0.0])
+    entry[0] += 1
+    entry[1] += elapsed
+
+
+def _timed_template_render(original):
+    @wraps(original)
+    def _render(self, context):
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            _record(f"template.{self.name or '<string>'}", time.perf_counter() - started)
+    return _render
+
+
+def _timed_block_render(original):
+    @wraps(original)
+    def render(self, context):
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            # Blocks are labelled by the page being rendered: base.html's
+            # 'content' block costs something different on every page
+            page = context.template.name if context.template else None
+            _record(f"block.{page or '<string>'}#{self.name}", time.perf_counter() - started)
+    return render
+
+
+def install():
+    """Wraps the render methods once per process."""
+    global _installed
+    if _installed:
+        return
+    Template._render = _timed_template_render(Template._render)
+    BlockNode.render = _timed_block_render(BlockNode.render)
+    _installed = True
+
+
+def flush(elapsed, timings):
+    metrics.incr(REQUEST_COUNT)
+    metrics.incr(REQUEST_TIME, int(elapsed * 1_000_000))
+    for label, (count, seconds) in timings.items():
+        metrics.incr(f"{label}.renders", count)
+        metrics.incr(f"{label}.time_us", int(seconds * 1_000_000))
+
+
+@sync_and_async_middleware
+def render_timing_middleware(get_response):
+    if not settings.TEMPLATE_TIMING:
+        raise MiddlewareNotUsed
+    install()
+
+    def sampled():
+        rate = settings.TEMPLATE_TIMING_SAMPLE
+        return rate >= 1 or random.random() < rate
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not sampled():
+                return await get_response(request)
+            token = _timings.set({})
+            started = time.perf_counter()
+            try:
+                return await get_response(request)
+            finally:
+                timings = _timings.get()
+                _timings.reset(token)
+                flush(time.perf_counter() - started, timings)
+    else:
+        def middleware(request):
+            if not sampled():
+                return get_response(request)
+            token = _timings.set({})
+            started = time.perf_counter()
+            try:
+                return get_response(request)
+            finally:
+                timings = _timings.get()
+                _timings.reset(token)
+                flush(time.perf_counter() - started, timings)
+    return middleware
+
+
+def summary(snapshot):
+    """
+    Average milliseconds per request, per template and per block from a
+    metrics.snapshot(), slowest first.
+    """
+    def average(count, total_us):
+        return round(total_us / count / 1000, 3) if count else 0.0
+
+    result = {
+        'request': {
+            'count': snapshot.get(REQUEST_COUNT, 0),
+            'avg_ms': average(snapshot.get(REQUEST_COUNT, 0), snapshot.get(REQUEST_TIME, 0)),
+        },
+        'templates': {},
+        'blocks': {},
+    }
+    for name, value in snapshot.items():
+        if not name.endswith('.renders'):
+            continue
+        label = name[:-len('.renders')]
+        kind, _, target = label.partition('.')
+        if kind not in ('template', 'block'):
+            continue
+        result[kind + 's'][target] = {
+            'renders': value,
+            'avg_ms': average(value, snapshot.get(f"{label}.time_us", 0)),
+        }
+    for kind in ('templates', 'blocks'):
+        result[kind] = dict(sorted(result[kind].items(), key=lambda item: -item[1]['avg_ms']))
+    return result
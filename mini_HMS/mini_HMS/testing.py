@@ -0,0 +1,15 @@
+from django.contrib.auth.models import User
+
+# Fixtures shared by the apps' tests. Usernames are mobile numbers, as
+# signup makes them; every account's password is 'pw'.
+
+
+def make_patient(username='9000000002', email='pat@example.com', first_name='Pat', **fields):
+    return User.objects.create_user(username, email, 'pw', first_name=first_name, **fields)
+
+
+def make_doctor(username='9000000001', email='doc@example.com', first_name='Doc', **fields):
+    doctor = make_patient(username, email, first_name, **fields)
+    doctor.profile.role = 'doctor'
+    doctor.profile.save()
+    return doctor
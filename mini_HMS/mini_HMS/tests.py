@@ -0,0 +1,202 @@
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from unittest import mock
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from appointments.models import AppointmentSlot
+from . import metrics, template_timing
+from .utils import trigger_bulk_email
+from .assets import VENDOR_ASSETS, _vendored, asset_urls, check_vendor_assets, check_vendor_assets_deploy
+from .testing import make_doctor, make_patient
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_incr_creates_and_adds_and_snapshot_reads_registered_counters(self):
+        metrics.register('test.never_bumped')
+
+        self.assertEqual(metrics.incr('test.counter'), 1)
+        self.assertEqual(metrics.incr('test.counter', 4), 5)
+
+        stats = metrics.snapshot()
+        self.assertEqual(stats['test.counter'], 5)
+        self.assertEqual(stats['test.never_bumped'], 0)
+        self.assertEqual(metrics.ratio(3, 1), 0.75)
+
+    def test_counter_recovers_after_eviction(self):
+        metrics.incr('test.evicted')
+        cache.delete(metrics.METRIC_PREFIX + 'test.evicted')
+
+        self.assertEqual(metrics.incr('test.evicted'), 1)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.client.force_login(self.patient)
+
+    def find_doctor(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/doctor/find-doctors/')
+        self.assertEqual(response.status_code, 200)
+        doctor_queries = [q for q in ctx.captured_queries if '"users_profile"."role" = \'doctor\'' in q['sql']]
+        return response, len(doctor_queries)
+
+    def counts(self):
+        stats = metrics.snapshot()
+        return stats['page_cache.hits'], stats['page_cache.misses']
+
+    def test_second_request_is_a_hit_that_skips_the_doctor_query(self):
+        _, first = self.find_doctor()
+        response, second = self.find_doctor()
+
+        self.assertEqual((first, second), (1, 0))
+        self.assertContains(response, 'Dr. Doc')
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_doctor_change_invalidates_and_slot_change_does_not(self):
+        self.find_doctor()
+
+        # The fragment lists doctors only, so slot writes leave it valid
+        AppointmentSlot.objects.create(
+            doctor=self.doctor, date=date.today() + timedelta(days=3), start_time=time(10), end_time=time(10, 30)
+        )
+        self.assertEqual(self.find_doctor()[1], 0)
+
+        self.doctor.first_name = 'Renamed'
+        self.doctor.save()
+        response, queries = self.find_doctor()
+
+        self.assertEqual(queries, 1)
+        self.assertContains(response, 'Dr. Renamed')
+
+    def test_login_does_not_invalidate(self):
+        self.find_doctor()
+        self.client.post('/login/', {'mobile': '9000000001', 'password': 'pw'})
+        self.client.force_login(self.patient)
+
+        self.assertEqual(self.find_doctor()[1], 0)
+
+
+class TemplateTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def requests_timed(self):
+        return metrics.snapshot().get(template_timing.REQUEST_COUNT, 0)
+
+    def test_off_by_default(self):
+        self.client.get('/')
+
+        self.assertEqual(self.requests_timed(), 0)
+
+    @override_settings(TEMPLATE_TIMING=True, TEMPLATE_TIMING_SAMPLE=1)
+    def test_middleware_records_templates_and_blocks_per_request(self):
+        self.client.get('/')
+        self.client.get('/')
+
+        timing = template_timing.summary(metrics.snapshot())
+        self.assertEqual(timing['request']['count'], 2)
+        self.assertEqual(timing['templates']['home.html']['renders'], 2)
+        self.assertIn('home.html#content', timing['blocks'])
+
+    @override_settings(TEMPLATE_TIMING=True, TEMPLATE_TIMING_SAMPLE=0.25)
+    def test_only_sampled_requests_are_timed(self):
+        with mock.patch('mini_HMS.template_timing.random.random', side_effect=[0.1, 0.5, 0.9]):
+            for _ in range(3):
+                self.client.get('/')
+
+        self.assertEqual(self.requests_timed(), 1)
+
+    def test_flush_adds_counts_and_microseconds(self):
+        template_timing.flush(0.004, {'template.page.html': [2, 0.003]})
+        template_timing.flush(0.002, {'template.page.html': [1, 0.001]})
+
+        stats = metrics.snapshot()
+        self.assertEqual((stats['request.count'], stats['request.time_us']), (2, 6000))
+        self.assertEqual((stats['template.page.html.renders'], stats['template.page.html.time_us']), (3, 4000))
+
+
+class StaticServingTests(TestCase):
+    NAME = 'style.0123456789ab.css'
+
+    def setUp(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        for name, body in ((self.NAME, b'plain'), (self.NAME + '.gz', b'gzipped'), (self.NAME + '.br', b'brotli')):
+            (root / name).write_bytes(body)
+        (root / 'style.css').write_bytes(b'plain')
+        override = override_settings(STATIC_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get(self, accept, name=NAME):
+        response = self.client.get(f'/static/{name}', HTTP_ACCEPT_ENCODING=accept)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return response.get('Content-Encoding'), b''.join(response.streaming_content)
+
+    def test_variant_follows_tokens_and_q_values(self):
+        cases = {
+            'gzip, deflate, br': ('br', b'brotli'),
+            'br;q=0, gzip': ('gzip', b'gzipped'),
+            'br;q=0.2, gzip;q=0.9': ('gzip', b'gzipped'),
+            'x-gzip': ('gzip', b'gzipped'),
+            '*': ('br', b'brotli'),
+            'gzip;q=0, *;q=0.5': ('br', b'brotli'),
+            'brotli-ish, gzipper': (None, b'plain'),
+            '*;q=0': (None, b'plain'),
+            '': (None, b'plain'),
+        }
+        for accept, expected in cases.items():
+            with self.subTest(accept=accept):
+                self.assertEqual(self.get(accept), expected)
+
+    def test_only_hashed_names_are_immutable(self):
+        self.assertIn('immutable', self.client.get(f'/static/{self.NAME}')['Cache-Control'])
+        self.assertEqual(self.client.get('/static/style.css')['Cache-Control'], 'public, max-age=300')
+
+    def test_missing_vendor_files_are_reported_in_local_mode(self):
+        with mock.patch('mini_HMS.assets.finders.find', return_value=None):
+            with override_settings(VENDOR_ASSETS_MODE='local'):
+                warnings, errors = check_vendor_assets(None), check_vendor_assets_deploy(None)
+            with override_settings(VENDOR_ASSETS_MODE='cdn'):
+                self.assertEqual(check_vendor_assets(None), [])
+
+        self.assertEqual([w.id for w in warnings], ['mini_HMS.W001'])
+        self.assertEqual([e.id for e in errors], ['mini_HMS.E001'])
+        self.assertTrue(all(asset['path'] in errors[0].msg for asset in VENDOR_ASSETS.values()))
+
+    def test_fresh_checkout_falls_back_to_the_cdn_without_warnings(self):
+        _vendored.cache_clear()
+        self.addCleanup(_vendored.cache_clear)
+        with mock.patch('mini_HMS.assets.finders.find', return_value=None):
+            urls = asset_urls()
+            issues = check_vendor_assets(None) + check_vendor_assets_deploy(None)
+
+        self.assertEqual(settings.VENDOR_ASSETS_MODE, 'auto')
+        self.assertEqual(urls, {name: asset['url'] for name, asset in VENDOR_ASSETS.items()})
+        self.assertEqual(issues, [])
+
+
+class BulkEmailTests(TestCase):
+    @mock.patch('requests.post')
+    def test_undeliverable_recipients_are_logged_and_returned(self, post):
+        post.return_value = mock.Mock(status_code=200)
+        post.return_value.json.return_value = {'message': 'Batch processed', 'failed': ['bad@example.com']}
+        messages = [{'action': 'SIGNUP_WELCOME', 'recipient_email': f'{name}@example.com', 'data': {}} for name in ('ok', 'bad')]
+
+        with self.assertLogs('mini_HMS.utils', 'ERROR') as logs:
+            self.assertEqual(trigger_bulk_email(messages), ['bad@example.com'])
+
+        self.assertIn('bad@example.com', logs.output[0])
+        self.assertEqual(post.call_args.kwargs['json'], {'messages': messages})
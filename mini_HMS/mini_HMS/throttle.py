@@ -0,0 +1,124 @@
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Error, Tags, register
+
+# Rate budgets stored in the cache. Counts only change through
+# cache.add/incr/decr, so concurrent requests cannot over-admit the way a
+# get/compute/set would - provided the backend implements those
+# atomically. Redis and memcached do, across every process; locmem does
+# within one process only. The file and database backends inherit
+# BaseCache.incr, a get followed by a set, which loses increments between
+# workers (and resets the key's timeout). The checks below refuse them,
+# and refuse locmem for deployments, where there is more than one worker.
+
+# Backends whose add/incr/decr are atomic across processes
+SHARED_ATOMIC_BACKENDS = {
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+}
+# Atomic, but private to each process
+LOCAL_ATOMIC_BACKENDS = {'django.core.cache.backends.locmem.LocMemCache'}
+
+# Settings whose buckets live in the default cache
+THROTTLE_SETTINGS = ('LOGIN_THROTTLE', 'CALENDAR_API_THROTTLE')
+
+class TokenBucket:
+    """
+    Admits up to `capacity` tokens per `capacity / refill_per_second`
+    seconds for each ident. Like a token bucket, spent budget comes back
+    gradually: the previous window's count is weighted by how much of it
+    still overlaps a window ending now.
+    """
+
+    def __init__(self, name, capacity, refill_per_second, cache_alias='default'):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.cache_alias = cache_alias
+        self.window = capacity / refill_per_second
+        # Long enough for a window to be read back as the previous one
+        self.timeout = math.ceil(2 * self.window) + 1
+
+    def _keys(self, ident, now):
+        """(current window key, previous window key, fraction of the current window elapsed)."""
+        digest = hashlib.md5(str(ident).encode(), usedforsecurity=False).hexdigest()
+        index = int(now // self.window)
+        base = f"throttle:{self.name}:{digest}"
+        return f"{base}:{index}", f"{base}:{index - 1}", now / self.window - index
+
+    def consume(self, ident, tokens=1):
+        """Takes `tokens` from the budget for `ident`. Returns False if there are not enough."""
+        cache = caches[self.cache_alias]
+        current_key, previous_key, elapsed = self._keys(ident, time.time())
+        cache.add(current_key, 0, timeout=self.timeout)
+        try:
+            current = cache.incr(current_key, tokens)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.add(current_key, tokens, timeout=self.timeout)
+            current = tokens
+        previous = cache.get(previous_key, 0)
+        if previous * (1 - elapsed) + current <= self.capacity:
+            return True
+        # A refused request gives its tokens back
+        try:
+            cache.decr(current_key, tokens)
+        except ValueError:
+            pass
+        return False
+
+    def wait_time(self, ident, tokens=1):
+        """Seconds until `tokens` are available for `ident`."""
+        current_key, previous_key, elapsed = self._keys(ident, time.time())
+        counts = caches[self.cache_alias].get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+
+        # Within this window, room opens up as the previous window slides out
+        room = self.capacity - current - tokens
+        if room >= previous * (1 - elapsed):
+            return 0.0
+        if room >= 0:
+            return (1 - room / previous - elapsed) * self.window
+        # Otherwise after this window ends, as its own count slides out in turn
+        room = self.capacity - tokens
+        fraction = 1 - room / current if current else 1
+        return (1 - elapsed + min(1.0, max(0.0, fraction))) * self.window
+
+    def reset(self, ident):
+        current_key, previous_key, _ = self._keys(ident, time.time())
+        caches[self.cache_alias].delete_many([current_key, previous_key])
+
+
+# --- CHECKS ---
+
+def _throttled():
+    return [name for name in THROTTLE_SETTINGS if getattr(settings, name, {}).get('ENABLED')]
+
+def _cache_backend(alias='default'):
+    return settings.CACHES[alias]['BACKEND']
+
+@register(Tags.caches)
+def check_throttle_cache(app_configs, **kwargs):
+    backend = _cache_backend()
+    if not _throttled() or backend in SHARED_ATOMIC_BACKENDS | LOCAL_ATOMIC_BACKENDS:
+        return []
+    return [Error(
+        f"{', '.join(_throttled())} need atomic cache counters, which {backend} does not provide.",
+        hint="Use HMS_CACHE=redis, or turn throttling off.",
+        id='mini_HMS.E002',
+    )]
+
+@register(Tags.caches, deploy=True)
+def check_throttle_cache_deploy(app_configs, **kwargs):
+    # A deployment runs several workers; per-process budgets multiply by their number
+    if not _throttled() or _cache_backend() not in LOCAL_ATOMIC_BACKENDS:
+        return []
+    return [Error(
+        f"{', '.join(_throttled())} keep budgets in a per-process cache, so each worker admits the full budget.",
+        hint="Use HMS_CACHE=redis.",
+        id='mini_HMS.E003',
+    )]
@@ -15,7 +15,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from . import views
 from calendar_integration import views as calendar_views
 
@@ -23,8 +24,15 @@ from calendar_integration import views as calendar_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.home, name='home'),
+    path('metrics/', views.metrics_view, name='metrics'),
     path('', include('users.urls')),
     path('doctor/', include('appointments.urls')),
+    path('api/', include('appointments.api_urls')),
     path('calendar/', include('calendar_integration.urls')),
     path('oauth2callback/', calendar_views.oauth_callback, name='google_callback_legacy'),
 ]
+
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % settings.STATIC_URL.lstrip('/'), views.serve_static, name='static'),
+    ]
@@ -1,4 +1,3 @@
-import requests
 import json
 import logging
 
@@ -11,6 +10,9 @@ def trigger_email(action, recipient_email, data):
     """
     Sends a payload to the Serverless Email Microservice.
     """
+    # requests costs ~60 ms to import; only pay for it once an email is sent
+    import requests
+
     payload = {
         "action": action,
         "recipient_email": recipient_email,
@@ -26,4 +28,32 @@ def trigger_email(action, recipient_email, data):
             logger.error(f"Email service failed: {response.text}")
     except requests.exceptions.RequestException as e:
         # We log the error but don't stop the user's flow (Fail Silently)
-        logger.error(f"Could not connect to Email Service: {e}")
\ No newline at end of file
+        logger.error(f"Could not connect to Email Service: {e}")
+
+# Max messages per request to the email service's batch mode
+EMAIL_BATCH_SIZE = 100
+
+def trigger_bulk_email(messages):
+    """
+    Sends many {action, recipient_email, data} payloads in batched requests.
+    The email service reuses one SMTP connection per batch. Returns the
+    recipients it reported as undeliverable.
+    """
+    import requests
+
+    undelivered = []
+    for i in range(0, len(messages), EMAIL_BATCH_SIZE):
+        batch = messages[i:i + EMAIL_BATCH_SIZE]
+        try:
+            response = requests.post(EMAIL_SERVICE_URL, json={"messages": batch}, timeout=30)
+            if response.status_code == 200:
+                logger.info(f"Email batch triggered successfully: {len(batch)} message(s)")
+                failed = response.json().get('failed') or []
+                if failed:
+                    logger.error(f"Email service could not deliver to: {', '.join(failed)}")
+                undelivered += failed
+            else:
+                logger.error(f"Email service failed for batch: {response.text}")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Could not connect to Email Service: {e}")
+    return undelivered
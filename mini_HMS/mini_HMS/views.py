@@ -1,5 +1,89 @@
-import requests
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.contrib.auth.decorators import user_passes_test
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+from . import metrics, template_timing
+from .page_cache import cached_fragment, hit_ratio
 
 def home(request):
-    return render(request, 'home.html')
\ No newline at end of file
+    home_content = cached_fragment(request, 'home', 'home_content.html')
+    return render(request, 'home.html', {'home_content': home_content})
+
+@user_passes_test(lambda u: u.is_staff)
+def metrics_view(request):
+    """Staff-only JSON dump of the shared counters."""
+    data = metrics.snapshot()
+    data['page_cache.hit_ratio'] = hit_ratio()
+    data['render_timing'] = template_timing.summary(data)
+    return JsonResponse(data)
+
+# --- STATIC FILES ---
+
+# Names written by ManifestStaticFilesStorage: style.3f1a2b4c5d6e.css
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Pre-compressed siblings in order of preference when the client rates them equally
+VARIANTS = [('.br', 'br'), ('.gz', 'gzip')]
+
+def accepted_encodings(header):
+    """
+    {coding: q} from an Accept-Encoding header (RFC 9110 12.5.3). A coding
+    that is not listed takes the q of '*', or is not acceptable at all.
+    """
+    weights = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        coding = coding.lower()
+        weights['gzip' if coding == 'x-gzip' else coding] = q
+    return weights
+
+def choose_variant(header, path):
+    """(file to send, Content-Encoding or None) for the client's Accept-Encoding."""
+    weights = accepted_encodings(header)
+    best, best_q = (path, None), 0.0
+    for suffix, coding in VARIANTS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q and os.path.isfile(path + suffix):
+            best, best_q = (path + suffix, coding), q
+    return best
+
+@require_safe
+def serve_static(request, path):
+    """
+    Serves collectstatic output, preferring the pre-compressed .br/.gz
+    sibling the client accepts. Hashed names never change content, so
+    they are cached for a year without revalidation.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    chosen, encoding = choose_variant(request.headers.get('Accept-Encoding', ''), full_path)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = FileResponse(open(chosen, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    # Caches must key on Accept-Encoding whichever variant this client got
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['Cache-Control'] = IMMUTABLE if HASHED_NAME_RE.search(path) else 'public, max-age=300'
+    return response
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from mini_HMS.changelist import EstimatedCountPaginator, prefix_filter
 from .models import Profile
 
 # This makes Profile fields appear inside the User form
@@ -13,11 +14,27 @@ class ProfileInline(admin.StackedInline):
 class UserAdmin(BaseUserAdmin):
     inlines = (ProfileInline,)
     list_display = ('username', 'email', 'first_name', 'get_role', 'is_staff')
+    # Profile comes in the page query, so get_role costs nothing per row
+    list_select_related = ('profile',)
+    list_filter = ('profile__role', 'is_staff', 'is_active')
+    # Usernames are mobile numbers, searched as a range on their unique
+    # index. Unlike Django's UserAdmin, email and names are not searched:
+    # matching those means a scan of the whole table.
+    search_fields = ('username',)
+    search_help_text = "Start of the mobile number (email and names are not searched)."
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(prefix_filter('username', term)), False
 
     # Helper to show role in the main list
+    @admin.display(description='Role', ordering='profile__role')
     def get_role(self, instance):
         return instance.profile.role
-    get_role.short_description = 'Role'
 
 # Re-register UserAdmin
 admin.site.unregister(User)
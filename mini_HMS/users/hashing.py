@@ -0,0 +1,13 @@
+import os
+
+# Worker-side helpers for hashing passwords in a process pool. Kept free of
+# model imports so spawned workers can import it before Django is set up.
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+def hash_password(raw_password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(raw_password)
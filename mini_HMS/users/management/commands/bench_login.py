@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from mini_HMS.bench import scratch_data, timed
+from mini_HMS.throttle import TokenBucket
+
+LEGIT_MOBILE = '9000000000'
+LEGIT_IP = '10.0.0.1'
+ATTACK_IP = '10.66.66.66'
+
+
+class Command(BaseCommand):
+    help = "Measure login throughput alone and during a credential-stuffing burst, with and without throttling."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help="Legitimate logins per scenario.")
+        parser.add_argument('--attack-ratio', type=int, default=10, help="Bad attempts interleaved per legitimate login.")
+
+    def handle(self, *args, **options):
+        logins, ratio = options['logins'], options['attack_ratio']
+
+        with scratch_data():
+            User.objects.create_user(LEGIT_MOBILE, 'bench@example.com', 'bench-pass', first_name='Bench')
+            self.stdout.write(f"{logins} legitimate logins, {ratio} bad attempts each under attack\n")
+
+            self.report("baseline", self.run(logins, 0, throttle=False))
+            self.report("attack, unthrottled", self.run(logins, ratio, throttle=False))
+            self.report("attack, throttled", self.run(logins, ratio, throttle=True))
+
+    def run(self, logins, ratio, throttle):
+        legit = Client(REMOTE_ADDR=LEGIT_IP)
+        attacker = Client(REMOTE_ADDR=ATTACK_IP)
+        attempt = iter(range(10 ** 9))
+
+        def one_round():
+            for _ in range(ratio):
+                n = next(attempt)
+                attacker.post('/login/', {'mobile': f"8{n:09d}", 'password': 'guess'})
+            legit.post('/login/', {'mobile': LEGIT_MOBILE, 'password': 'bench-pass'})
+            legit.logout()
+
+        # Budgets sized so the legitimate client never runs dry and the
+        # attacker (one IP, a new mobile every try) exhausts its IP bucket early
+        config = {'ENABLED': throttle, 'PER_MOBILE': (logins + 1, 1 / 60), 'PER_IP': (logins + ratio, 1 / 60)}
+        with override_settings(LOGIN_THROTTLE=config):
+            TokenBucket('login_ip', *config['PER_IP']).reset(ATTACK_IP)
+            TokenBucket('login_ip', *config['PER_IP']).reset(LEGIT_IP)
+            return timed(one_round, logins)
+
+    def report(self, label, result):
+        elapsed, per_second = result
+        self.stdout.write(f"  {label:<22} {elapsed:7.2f}s  {per_second:7.1f} legitimate logins/s")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.onboarding import import_users
+
+
+class Command(BaseCommand):
+    help = "Bulk-create doctor/patient accounts from a CSV (fullname, mobile, email, role, password)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--chunk-size', type=int, default=500, help="Rows per bulk insert.")
+        parser.add_argument('--workers', type=int, default=None, help="Password hashing processes (default: CPU count).")
+        parser.add_argument('--no-email', action='store_true', help="Do not queue welcome emails.")
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            self.stdout.write(f"  {stats.created} created, {len(stats.errors)} skipped ({stats.rows_per_second:.0f} rows/s)")
+
+        try:
+            stats = import_users(
+                options['csv_path'],
+                chunk_size=options['chunk_size'],
+                workers=options['workers'],
+                send_email=not options['no_email'],
+                progress=progress,
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, error in stats.errors:
+            self.stderr.write(f"Line {line}: {error}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.created} user(s), skipped {len(stats.errors)} in {stats.elapsed:.2f}s "
+            f"({stats.rows_per_second:.0f} rows/s)"
+        ))
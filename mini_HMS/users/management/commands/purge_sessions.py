@@ -0,0 +1,38 @@
+import time
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired database sessions in small batches. Unlike clearsessions, "
+        "no single DELETE holds the SQLite write lock long enough to stall bookings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_PURGE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        if not settings.SESSION_ENGINE.endswith(('.db', '.cached_db')):
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session rows; nothing to purge.")
+            return
+
+        now = timezone.now()
+        total = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:options['batch_size']]
+            )
+            if not keys:
+                break
+            with transaction.atomic():
+                deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+            total += deleted
+            self.stdout.write(f"  deleted {total} so far")
+            time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {total} expired session(s)."))
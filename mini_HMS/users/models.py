@@ -11,7 +11,31 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='patient')
     mobile = models.CharField(max_length=15, unique=True, null=True, blank=True)
-    
+
+    # --- DIRTY-FIELD TRACKING ---
+    # Lets users.signals skip the profile write when nothing changed.
+    TRACKED_FIELDS = ('role', 'mobile')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+
+    def _tracked_values(self):
+        return {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+
+    def get_dirty_fields(self):
+        """Tracked fields changed since the row was loaded or last saved."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(self.TRACKED_FIELDS)
+        return {name for name, value in self._tracked_values().items() if loaded[name] != value}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
     def __str__(self):
         return f"{self.user.username} - {self.role}"
 
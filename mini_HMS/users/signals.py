@@ -1,13 +1,51 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 from .models import Profile
+from mini_HMS.page_cache import bump_doctor_version
+
+def _profile_is_cached(user):
+    """True if user.profile is already in memory (no lazy SELECT needed)."""
+    return User._meta.get_field('profile').is_cached(user)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+    if not created:
+        return
+    if _profile_is_cached(instance):
+        # Caller attached a prepared Profile (see sign_up): insert it as-is
+        instance.profile.save()
+    else:
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, created, **kwargs):
+    # Only write a profile someone loaded and changed. Login's last_login
+    # update never touches it, so it no longer costs a SELECT + UPDATE.
+    if created or not _profile_is_cached(instance):
+        return
+    dirty = instance.profile.get_dirty_fields()
+    if dirty:
+        instance.profile.save(update_fields=dirty)
+
+# --- PAGE CACHE INVALIDATION ---
+# find_doctor and home fragments are keyed on a doctor version counter.
+# Only changes that can alter what those pages show bump it.
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_doctor_pages_for_user(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    # Login only touches last_login (and password when rehashing), which no cached page displays
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    if instance.is_doctor:
+        bump_doctor_version()
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_doctor_pages_for_profile(sender, instance, created=False, **kwargs):
+    # Dirty fields still hold the pre-save state here, so a doctor being
+    # switched to another role is caught too
+    if instance.role == 'doctor' or (not created and 'role' in instance.get_dirty_fields()):
+        bump_doctor_version()
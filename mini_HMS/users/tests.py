@@ -1,3 +1,291 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import threading
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mini_HMS.hashers import TunablePBKDF2PasswordHasher
+from mini_HMS.page_cache import get_doctor_version
+from mini_HMS.throttle import TokenBucket, check_throttle_cache, check_throttle_cache_deploy
+from .models import Profile
+
+
+def writes(queries, table=None):
+    """SQL statements that modify data, optionally only those touching `table`."""
+    statements = [q['sql'] for q in queries if q['sql'].split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+    if table:
+        statements = [sql for sql in statements if f'"{table}"' in sql]
+    return statements
+
+
+class SignupWriteTests(TestCase):
+    def signup(self, **overrides):
+        data = {
+            'fullname': 'Asha', 'mobile': '9876543210', 'email': 'asha@example.com',
+            'password': 'pw-12345', 'confirm_password': 'pw-12345', 'role': 'doctor',
+        }
+        data.update(overrides)
+        with mock.patch('users.views.trigger_email') as trigger_email:
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.post('/signup/', data)
+        return ctx, trigger_email
+
+    def test_signup_is_one_user_insert_and_one_profile_insert(self):
+        ctx, trigger_email = self.signup()
+
+        self.assertEqual(len(writes(ctx.captured_queries, 'auth_user')), 1)
+        self.assertEqual(len(writes(ctx.captured_queries, 'users_profile')), 1)
+        profile = Profile.objects.get(user__username='9876543210')
+        self.assertEqual((profile.role, profile.mobile), ('doctor', '9876543210'))
+        self.assertTrue(profile.user.check_password('pw-12345'))
+        trigger_email.assert_called_once()
+
+    def test_duplicate_signup_is_rejected_with_a_single_lookup(self):
+        self.signup()
+        ctx, trigger_email = self.signup(email='other@example.com')
+
+        self.assertEqual(writes(ctx.captured_queries, 'auth_user'), [])
+        self.assertEqual(len([q for q in ctx.captured_queries if '"auth_user"' in q['sql']]), 1)
+        trigger_email.assert_not_called()
+
+
+class LoginWriteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('9876543210', 'asha@example.com', 'pw-12345', first_name='Asha')
+
+    def test_login_only_updates_last_login(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post('/login/', {'mobile': '9876543210', 'password': 'pw-12345'})
+
+        user_writes = writes(ctx.captured_queries, 'auth_user')
+        self.assertEqual(len(user_writes), 1)
+        self.assertIn('"last_login"', user_writes[0])
+        self.assertEqual([q for q in ctx.captured_queries if '"users_profile"' in q['sql']], [])
+
+    def test_changed_profile_is_saved_with_the_user(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.profile.role = 'doctor'
+        user.save()
+
+        self.assertEqual(Profile.objects.get(user=user).role, 'doctor')
+
+    def test_unchanged_profile_is_not_written(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.profile  # load it
+        with CaptureQueriesContext(connection) as ctx:
+            user.save()
+
+        self.assertEqual(writes(ctx.captured_queries, 'users_profile'), [])
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('9876543210', 'asha@example.com', 'pw-12345', first_name='Asha')
+
+    @override_settings(LOGIN_THROTTLE={'ENABLED': True, 'PER_MOBILE': (1, 1 / 60), 'PER_IP': (30, 1)})
+    def test_throttled_login_never_reaches_authenticate_or_the_hasher(self):
+        self.client.post('/login/', {'mobile': '9876543210', 'password': 'wrong'})
+
+        with mock.patch('users.views.authenticate') as authenticate, \
+                mock.patch.object(TunablePBKDF2PasswordHasher, 'verify') as verify, \
+                mock.patch.object(TunablePBKDF2PasswordHasher, 'encode') as encode:
+            response = self.client.post('/login/', {'mobile': '9876543210', 'password': 'pw-12345'}, follow=True)
+
+        self.assertContains(response, 'Too many login attempts')
+        authenticate.assert_not_called()
+        verify.assert_not_called()
+        encode.assert_not_called()
+
+    @mock.patch('mini_HMS.throttle.time.time')
+    def test_budget_refills_gradually(self, now):
+        bucket = TokenBucket('test', 2, 1)  # two per two-second window
+        now.return_value = 1000.0
+        self.assertEqual([bucket.consume('x') for _ in range(3)], [True, True, False])
+
+        now.return_value = 1002.0
+        self.assertFalse(bucket.consume('x'))
+        self.assertEqual(bucket.wait_time('x'), 1.0)
+
+        now.return_value = 1003.0
+        self.assertTrue(bucket.consume('x'))
+        self.assertFalse(bucket.consume('x'))
+
+    def test_concurrent_consumers_never_over_admit(self):
+        bucket = TokenBucket('test', 5, 0.01)
+        start = threading.Barrier(20)
+        results = []
+
+        def attempt():
+            start.wait()
+            results.append(bucket.consume('shared'))
+
+        threads = [threading.Thread(target=attempt) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+
+    def test_contended_counts_are_exact_over_many_rounds(self):
+        # Real threads on the real cache: every round, 16 consumers race for
+        # a fresh 3-token budget, and exactly 3 must win
+        bucket = TokenBucket('test', 3, 0.001)
+        rounds, workers = 25, 16
+        start = threading.Barrier(workers)
+        admitted = [[] for _ in range(rounds)]
+
+        def attempt():
+            for i in range(rounds):
+                start.wait()
+                admitted[i].append(bucket.consume(f'round-{i}'))
+
+        threads = [threading.Thread(target=attempt) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([results.count(True) for results in admitted], [3] * rounds)
+
+    def test_checks_refuse_non_atomic_and_per_process_caches(self):
+        file_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/x'}}
+        redis_cache = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+
+        with override_settings(CACHES=file_cache):
+            self.assertEqual([e.id for e in check_throttle_cache(None)], ['mini_HMS.E002'])
+            with override_settings(LOGIN_THROTTLE={'ENABLED': False}, CALENDAR_API_THROTTLE={'ENABLED': False}):
+                self.assertEqual(check_throttle_cache(None), [])
+        with override_settings(CACHES=redis_cache):
+            self.assertEqual(check_throttle_cache(None) + check_throttle_cache_deploy(None), [])
+        # The test settings use locmem: fine for one process, not for a deployment
+        self.assertEqual(check_throttle_cache(None), [])
+        self.assertEqual([e.id for e in check_throttle_cache_deploy(None)], ['mini_HMS.E003'])
+
+
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('9876543210', 'asha@example.com', 'pw-12345', first_name='Asha')
+
+    @override_settings(LOGIN_THROTTLE={'ENABLED': False})
+    def test_every_session_and_message_profile_round_trips_a_login(self):
+        for session in settings.SESSION_PROFILES:
+            for storage in settings.MESSAGE_STORAGE_PROFILES:
+                with self.subTest(session=session, messages=storage), override_settings(
+                    SESSION_ENGINE=settings.SESSION_PROFILES[session],
+                    MESSAGE_STORAGE=settings.MESSAGE_STORAGE_PROFILES[storage],
+                ):
+                    self.client.logout()
+                    response = self.client.post('/login/', {'mobile': '9876543210', 'password': 'pw-12345'}, follow=True)
+
+                    self.assertContains(response, 'Welcome back, Asha!')
+                    self.assertEqual(self.client.get('/doctor/my-appointments/').status_code, 200)
+
+    def test_purge_sessions_deletes_only_expired_rows_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(minutes=1))
+        for i in range(2):
+            Session.objects.create(session_key=f'live{i}', session_data='', expire_date=now + timedelta(days=1))
+        out = io.StringIO()
+
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            call_command('purge_sessions', '--batch-size', '2', '--pause', '0', stdout=out)
+
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)), {'live0', 'live1'})
+        self.assertIn('Purged 5 expired session(s).', out.getvalue())
+        self.assertEqual(out.getvalue().count('so far'), 3)
+
+
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('9000000000', 'taken@example.com', 'pw')
+
+    def csv_file(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write('fullname,mobile,email,role,password\n')
+            f.writelines(','.join(row) + '\n' for row in rows)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_creates_users_and_profiles_in_batches_and_reports_duplicates(self):
+        path = self.csv_file(
+            [(f'User{i}', f'90000000{i:02d}', f'u{i}@example.com', 'doctor' if i == 1 else 'patient', f'pw-{i}') for i in range(1, 6)]
+            + [
+                ('Taken', '9000000000', 'new@example.com', 'patient', 'pw'),
+                ('Twice', '9000000001', 'twice@example.com', 'patient', 'pw'),
+            ]
+        )
+        version = get_doctor_version()
+        out, err = io.StringIO(), io.StringIO()
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_users', path, '--chunk-size', '2', '--workers', '1', '--no-email', stdout=out, stderr=err)
+
+        # Five valid rows in chunks of two: three INSERTs per table, not five
+        self.assertEqual(len(writes(ctx.captured_queries, 'auth_user')), 3)
+        self.assertEqual(len(writes(ctx.captured_queries, 'users_profile')), 3)
+        self.assertIn('Imported 5 user(s), skipped 2', out.getvalue())
+        self.assertEqual(err.getvalue().splitlines(), [
+            'Line 7: Mobile number already registered.',
+            'Line 8: Mobile number already registered.',
+        ])
+
+        user = User.objects.select_related('profile').get(username='9000000001')
+        self.assertTrue(user.check_password('pw-1'))
+        self.assertEqual((user.profile.role, user.profile.mobile), ('doctor', '9000000001'))
+        self.assertEqual((User.objects.count(), Profile.objects.count()), (6, 6))
+        self.assertEqual(get_doctor_version(), version + 1)
+
+
+class UserAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('9000000009', 'admin@example.com', 'pw'))
+
+    def changelist(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/auth/user/')
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    def add_users(self, start, count):
+        for i in range(start, start + count):
+            User.objects.create_user(f'91{i:08d}', f'u{i}@example.com', 'pw')
+
+    @mock.patch('mini_HMS.changelist.estimated_rows', return_value=1_000_000)
+    def test_roles_come_from_the_page_query_and_the_table_is_not_counted(self, estimate):
+        self.add_users(0, 3)
+        _, few = self.changelist()
+        self.add_users(3, 30)
+        response, many = self.changelist()
+
+        self.assertEqual(len(many), len(few))
+        self.assertFalse([q for q in many if 'FROM "users_profile"' in q['sql']])
+        self.assertFalse([q for q in many if 'COUNT(' in q['sql']])
+        self.assertContains(response, 'patient')
+
+    def test_search_is_a_username_range(self):
+        self.add_users(0, 3)
+        User.objects.create_user('9299999999', 'u91000000@example.com', 'pw')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/admin/auth/user/', {'q': '9100'})
+
+        self.assertEqual(response.context['cl'].result_count, 3)
+        page = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT "auth_user"') and '9100' in q['sql']]
+        self.assertIn('"username" >= \'9100\' AND "auth_user"."username" < \'9101\'', page[-1])
+        self.assertNotIn('LIKE', page[-1])
 
-# Create your tests here.
@@ -1,9 +1,36 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Q
 from .models import Profile
 from mini_HMS.utils import trigger_email
+from mini_HMS.throttle import TokenBucket
+from mini_HMS import metrics
+
+# --- LOGIN THROTTLING ---
+
+metrics.register("login.throttled")
+
+def _login_buckets():
+    config = settings.LOGIN_THROTTLE
+    return (
+        TokenBucket('login_mobile', *config['PER_MOBILE']),
+        TokenBucket('login_ip', *config['PER_IP']),
+    )
+
+def is_login_throttled(request, mobile):
+    if not settings.LOGIN_THROTTLE['ENABLED']:
+        return False
+    per_mobile, per_ip = _login_buckets()
+    # Charge both buckets on every attempt, allowed or not
+    allowed = per_ip.consume(request.META.get('REMOTE_ADDR', ''))
+    allowed = per_mobile.consume(mobile or '') and allowed
+    if not allowed:
+        metrics.incr("login.throttled")
+    return not allowed
 
 def sign_up(request):
     if request.method == 'POST':
@@ -29,38 +56,36 @@ def sign_up(request):
             messages.error(request, "Passwords do not match!")
             return redirect('home')
         
+        # One query for both uniqueness checks.
         # We check 'username' because that's where we will store the mobile number
-        if User.objects.filter(username=mobile).exists():
-            messages.error(request, "This mobile number is already registered! Please Login.")
-            return redirect('home')
-
-        # Check email uniqueness
-        if User.objects.filter(email=email).exists():
-            messages.error(request, "This email is already taken.")
+        taken = list(User.objects.filter(Q(username=mobile) | Q(email=email)).values_list('username', flat=True))
+        if taken:
+            if mobile in taken:
+                messages.error(request, "This mobile number is already registered! Please Login.")
+            else:
+                messages.error(request, "This email is already taken.")
             return redirect('home')
 
         # --- CREATION ---
         try:
-            # We treat the mobile number as the system's "username"
-            user = User.objects.create_user(username=mobile, email=email, password=password)
-            user.first_name = full_name
-            user.save()
-
-            # Update Profile
-            if hasattr(user, 'profile'):
-                user.profile.role = role
-                user.profile.mobile = mobile
-                user.profile.save()
-
-            # Trigger Welcome Email
-            trigger_email(
-                action="SIGNUP_WELCOME",
-                recipient_email=email,
-                data={
-                    "name": full_name,
-                    "role": role
-                }
-            )
+            with transaction.atomic():
+                # We treat the mobile number as the system's "username"
+                user = User(username=mobile, email=email, first_name=full_name)
+                user.set_password(password)
+                # The signal inserts this prepared profile, so the whole
+                # signup is exactly two INSERTs
+                user.profile = Profile(role=role, mobile=mobile)
+                user.save()
+
+                # Trigger Welcome Email once the account really exists
+                transaction.on_commit(lambda: trigger_email(
+                    action="SIGNUP_WELCOME",
+                    recipient_email=email,
+                    data={
+                        "name": full_name,
+                        "role": role
+                    }
+                ))
 
             messages.success(request, "Account created! Please login with your Mobile Number.")
             
@@ -76,6 +101,13 @@ def sign_in(request):
     if request.method == 'POST':
         mobile = request.POST.get('mobile') 
         password = request.POST.get('password')
+
+        # Rejected before authenticate(), so a credential-stuffing burst
+        # never reaches the (deliberately slow) password hasher
+        if is_login_throttled(request, mobile):
+            messages.error(request, "Too many login attempts. Please wait a minute and try again.")
+            return redirect('home')
+
         user = authenticate(request, username=mobile, password=password)
 
         if user is not None: